@@ -13,17 +13,64 @@ const DEFAULT_PYTHON = process.platform === 'win32' ? 'python' : 'python3';
 const PYTHON_BIN = process.env.PYTHON_BIN || DEFAULT_PYTHON;
 const ALLOWED_ORIGIN = process.env.DASHBOARD_ALLOWED_ORIGIN || '*';
 const ENDPOINT = '/api/christopher/analyze-dashboard';
+const CHART_DATA_MODES = new Set(['auto', 'raw', 'aggregated']);
+const AGGREGATION_MODES = new Set(['client', 'pushdown']);
+const CROSSTAB_CHARTS = new Set(['grouped_bar', 'heatmap']);
+// Separator between values of one segment (bento_service --segment 'Question=A||B')
+const SEGMENT_VALUE_SEP = '||';
+
+// {"Role": ["Manager"], "Rating": {"min": 4, "max": 5}} -> ['--segment', 'Role=Manager', ...]
+function segmentArgs(segments) {
+  if (segments === null || typeof segments !== 'object' || Array.isArray(segments)) {
+    throw new Error('segments must be an object of question -> value(s) or {min, max}');
+  }
+  const out = [];
+  for (const [question, cond] of Object.entries(segments)) {
+    if (cond !== null && typeof cond === 'object' && !Array.isArray(cond)) {
+      const { min, max } = cond;
+      if ((min !== undefined && !Number.isFinite(min)) || (max !== undefined && !Number.isFinite(max))) {
+        throw new Error(`segments["${question}"] min/max must be numbers`);
+      }
+      out.push('--segment', `${question}=${min ?? ''}..${max ?? ''}`);
+    } else {
+      const values = (Array.isArray(cond) ? cond : [cond]).map(String);
+      out.push('--segment', `${question}=${values.join(SEGMENT_VALUE_SEP)}`);
+    }
+  }
+  return out;
+}
+
+// [{"question": "Rating", "by": "Role", "chart": "heatmap"}, ...] -> ['--crosstab', 'Rating::Role::heatmap', ...]
+function crosstabArgs(crosstabs) {
+  if (!Array.isArray(crosstabs)) {
+    throw new Error('crosstabs must be an array of {question, by, chart?}');
+  }
+  const out = [];
+  for (const item of crosstabs) {
+    const { question, by, chart } = item || {};
+    if (typeof question !== 'string' || typeof by !== 'string' || !question || !by) {
+      throw new Error('each crosstab needs string question and by');
+    }
+    if (chart !== undefined && !CROSSTAB_CHARTS.has(chart)) {
+      throw new Error(`crosstab chart must be one of ${[...CROSSTAB_CHARTS].join(', ')}`);
+    }
+    out.push('--crosstab', chart ? `${question}::${by}::${chart}` : `${question}::${by}`);
+  }
+  return out;
+}
 
 const baseHeaders = {
   'Access-Control-Allow-Origin': ALLOWED_ORIGIN,
-  'Access-Control-Allow-Headers': 'content-type',
+  'Access-Control-Allow-Headers': 'content-type, if-none-match, if-modified-since',
   'Access-Control-Allow-Methods': 'POST, OPTIONS',
+  'Access-Control-Expose-Headers': 'ETag, Last-Modified',
 };
 
-function sendJson(res, statusCode, payload) {
+function sendJson(res, statusCode, payload, extraHeaders = {}) {
   const body = JSON.stringify(payload);
   res.writeHead(statusCode, {
     ...baseHeaders,
+    ...extraHeaders,
     'Content-Type': 'application/json',
     'Content-Length': Buffer.byteLength(body, 'utf8'),
   });
@@ -47,6 +94,37 @@ function handleAnalyze(req, res, body) {
   if (parsed.noLlm === true || parsed.no_llm === true) {
     args.push('--no-llm');
   }
+  const chartData = parsed.chartData || parsed.chart_data;
+  if (chartData !== undefined) {
+    if (!CHART_DATA_MODES.has(chartData)) {
+      return sendJson(res, 400, { error: `chartData must be one of ${[...CHART_DATA_MODES].join(', ')}` });
+    }
+    args.push('--chart-data', chartData);
+  }
+  const aggregation = parsed.aggregation;
+  if (aggregation !== undefined) {
+    if (!AGGREGATION_MODES.has(aggregation)) {
+      return sendJson(res, 400, { error: `aggregation must be one of ${[...AGGREGATION_MODES].join(', ')}` });
+    }
+    args.push('--aggregation', aggregation);
+  }
+  try {
+    if (parsed.segments !== undefined) {
+      args.push(...segmentArgs(parsed.segments));
+    }
+    if (parsed.crosstabs !== undefined) {
+      args.push(...crosstabArgs(parsed.crosstabs));
+    }
+  } catch (error) {
+    return sendJson(res, 400, { error: error.message });
+  }
+  // Conditional revalidation: bento_service probes Supabase and replies not_modified if unchanged
+  if (req.headers['if-none-match']) {
+    args.push('--if-none-match', req.headers['if-none-match']);
+  }
+  if (req.headers['if-modified-since']) {
+    args.push('--if-modified-since', req.headers['if-modified-since']);
+  }
 
   const child = spawn(PYTHON_BIN, args, {
     cwd: projectRoot,
@@ -84,12 +162,21 @@ function handleAnalyze(req, res, body) {
       if (!result.success) {
         return sendJson(res, 500, { error: result.error || 'Unknown python error' });
       }
+      const cacheHeaders = {};
+      if (result.etag) cacheHeaders.ETag = result.etag;
+      if (result.last_modified) cacheHeaders['Last-Modified'] = result.last_modified;
+      if (result.not_modified) {
+        res.writeHead(304, { ...baseHeaders, ...cacheHeaders });
+        return res.end();
+      }
       sendJson(res, 200, {
         html: result.html,
         title: result.title,
         description: result.description,
         questionCount: result.question_count,
-      });
+        cached: result.cached === true,
+        timings: result.timings,
+      }, cacheHeaders);
     } catch (error) {
       console.error('[dashboard-server] Failed to parse python output:', error, '\nRaw:', stdout);
       sendJson(res, 500, { error: 'Failed to parse python output', details: String(error) });
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: answer parsing (prefix fast path) and
+bundle_to_grouped_by_question (compiled coercers) vs the previous per-answer
+path (json.loads on every string + legacy_coerce_value). Fails if outputs
+differ, apart from the intended change that checkbox answers are split into
+options like multi_choice.
+
+Usage:
+  python bench_coercion.py              # 1M synthetic answer rows
+  python bench_coercion.py --n 200000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List
+
+import retrieve_supabase2 as r2
+
+QUESTION_TYPES = ["text", "number", "integer", "rating", "boolean", "choice", "multi_choice", "checkbox", "date", None]
+
+
+def legacy_parse_answer_payload(raw_answer: Any) -> Dict[str, Any]:
+    """_parse_answer_payload before the prefix fast path (reference)."""
+    if isinstance(raw_answer, dict):
+        return {"userName": raw_answer.get("userName"), "response": raw_answer.get("response")}
+    if isinstance(raw_answer, (int, float, bool)) or raw_answer is None:
+        return {"userName": None, "response": raw_answer}
+    if isinstance(raw_answer, str):
+        s = raw_answer.strip()
+        if not s:
+            return {"userName": None, "response": None}
+        try:
+            loaded = json.loads(s)
+            if isinstance(loaded, dict):
+                return {"userName": loaded.get("userName"), "response": loaded.get("response")}
+            return {"userName": None, "response": loaded}
+        except json.JSONDecodeError:
+            return {"userName": None, "response": s}
+    return {"userName": None, "response": raw_answer}
+
+
+def legacy_coerce_value(value_raw, q_type: str):
+    """retrieve_supabase2._coerce_value before compiled coercers (reference)."""
+    if value_raw is None:
+        return None
+    t = (q_type or "").strip().lower()
+
+    if t in {"multi_choice", "multichoice", "multi-select"}:
+        if isinstance(value_raw, list):
+            return value_raw
+        if isinstance(value_raw, str):
+            try:
+                j = json.loads(value_raw)
+                if isinstance(j, list):
+                    return j
+            except Exception:
+                pass
+            return [x.strip() for x in value_raw.split(",") if x.strip()]
+        return [value_raw]
+
+    if t in {"choice", "single_choice", "radio"}:
+        return value_raw if not isinstance(value_raw, str) else value_raw.strip()
+
+    if t in {"number", "float", "rating"}:
+        try:
+            return float(value_raw)
+        except Exception:
+            return value_raw
+
+    if t in {"integer", "int"}:
+        try:
+            return int(round(float(value_raw)))
+        except Exception:
+            return value_raw
+
+    if t in {"boolean", "bool"}:
+        if isinstance(value_raw, bool):
+            return value_raw
+        if isinstance(value_raw, (int, float)):
+            return bool(value_raw)
+        if isinstance(value_raw, str):
+            s = value_raw.strip().lower()
+            if s in {"true", "yes", "1", "y"}:
+                return True
+            if s in {"false", "no", "0", "n"}:
+                return False
+        return value_raw
+
+    # date/datetime/timestamp → keep as string; text default
+    if isinstance(value_raw, str):
+        return value_raw.strip()
+    return value_raw
+
+
+def parse_bundle(raw_bundle: Dict[str, Any], parse) -> Dict[str, Any]:
+    """The parsing step of fetch_form_bundle, with a pluggable payload parser."""
+    return {
+        "form": raw_bundle["form"],
+        "questions": [
+            {"question": qb["question"], "answers": [{**a, "parsed_answer": parse(a.get("answer"))} for a in qb["answers"]]}
+            for qb in raw_bundle["questions"]
+        ],
+    }
+
+
+def legacy_grouped(bundle: Dict[str, Any]) -> Dict[str, Any]:
+    """bundle_to_grouped_by_question as it was: _coerce_value per answer."""
+    grouped: List[Dict[str, Any]] = []
+    for qb in bundle["questions"]:
+        q = qb["question"]
+        # Intended change: checkbox answers are now split into options like multi_choice
+        q_type = "multi_choice" if q.get("type_answer") == "checkbox" else q.get("type_answer")
+        answers = []
+        for ans in qb["answers"]:
+            pa = ans.get("parsed_answer") or {}
+            answers.append(legacy_coerce_value(pa.get("response"), q_type))
+        grouped.append({
+            "question": q.get("question"),
+            "question_id": q.get("question_id"),
+            "type_answer": q.get("type_answer"),
+            "answers": answers,
+        })
+    form = bundle["form"]
+    return {"title": form.get("title"), "description": form.get("description"), "questions": grouped}
+
+
+def synthetic_value(q_type: Any, rng: random.Random) -> Any:
+    roll = rng.random()
+    if roll < 0.03:
+        return rng.choice(["", "  ", None])
+    if q_type in ("number", "integer", "rating"):
+        return rng.choice([str(round(rng.uniform(0, 100), 2)), str(rng.randint(1, 5)), "n/a", " 42 "])
+    if q_type == "boolean":
+        return rng.choice(["yes", "No", "true", "0", "maybe"])
+    if q_type in ("multi_choice", "checkbox"):
+        return rng.choice(['["red", "blue"]', "red, green", "blue", "[1, 2]"])
+    if q_type == "date":
+        return f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}"
+    words = ["great", "service", "slow", "delivery", "would", "recommend", "price", "support"]
+    return " ".join(rng.choice(words) for _ in range(rng.randint(1, 12)))
+
+
+def synthetic_answer(q_type: Any, rng: random.Random) -> Any:
+    value = synthetic_value(q_type, rng)
+    # About a third of rows use the {"userName", "response"} JSON envelope
+    if value is not None and rng.random() < 0.35:
+        return json.dumps({"userName": f"user{rng.randint(1, 5000)}", "response": value})
+    return value
+
+
+def build_bundle(n: int, rng: random.Random) -> Dict[str, Any]:
+    per_question = n // len(QUESTION_TYPES)
+    questions = []
+    for i, q_type in enumerate(QUESTION_TYPES):
+        answers = [{"answer_id": f"{i}-{j}", "answer": synthetic_answer(q_type, rng)} for j in range(per_question)]
+        questions.append({"question": {"question_id": str(i), "question": f"Q{i} ({q_type})", "type_answer": q_type}, "answers": answers})
+    return {"form": {"title": "bench", "description": None}, "questions": questions}
+
+
+def best_of(fn, bundle: Dict[str, Any], repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(bundle)
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def main(argv: None | list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark compiled answer coercion")
+    parser.add_argument("--n", type=int, default=1_000_000, help="Synthetic answer rows")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    bundle = build_bundle(args.n, random.Random(args.seed))
+    rows = sum(len(qb["answers"]) for qb in bundle["questions"])
+
+    legacy_parsed, t_parse_legacy = best_of(lambda b: parse_bundle(b, legacy_parse_answer_payload), bundle, args.repeat)
+    parsed, t_parse = best_of(lambda b: parse_bundle(b, r2._parse_answer_payload), bundle, args.repeat)
+    legacy, t_coerce_legacy = best_of(legacy_grouped, legacy_parsed, args.repeat)
+    current, t_coerce = best_of(r2.bundle_to_grouped_by_question, parsed, args.repeat)
+
+    identical = (
+        json.dumps(legacy_parsed, sort_keys=True) == json.dumps(parsed, sort_keys=True)
+        and json.dumps(legacy, sort_keys=True) == json.dumps(current, sort_keys=True)
+    )
+    total_legacy, total = t_parse_legacy + t_coerce_legacy, t_parse + t_coerce
+    print(f"rows={rows:,}  questions={len(bundle['questions'])}  (best of {args.repeat})")
+    print(f"  parse  : legacy {t_parse_legacy:7.3f}s  prefix fast path {t_parse:7.3f}s  ({t_parse_legacy / t_parse:.2f}x)")
+    print(f"  coerce : legacy {t_coerce_legacy:7.3f}s  compiled         {t_coerce:7.3f}s  ({t_coerce_legacy / t_coerce:.2f}x)")
+    print(f"  total  : legacy {total_legacy:7.3f}s  new              {total:7.3f}s  ({total_legacy / total:.2f}x)")
+    print(f"  identical output: {identical}")
+    if not identical:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: respondent table build, segment masks, crosstabs and filtered
+re-renders on a synthetic form. Also checks crosstab counts against a plain
+per-respondent Counter.
+
+Usage:
+  python bench_respondents.py                  # 100k respondents
+  python bench_respondents.py --n 500000 --repeat 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import respondents as rs
+
+ROLES = ["Manager", "Engineer", "Designer", "Sales", "Support", "Founder"]
+PLANS = ["Free", "Pro", "Team", "Enterprise"]
+TOOLS = ["Slack", "Notion", "Jira", "Figma", "GitHub", "Linear"]
+TYPES = {"q_role": "categorical", "q_plan": "categorical", "q_rating": "number", "q_spend": "number", "q_tools": "multi"}
+
+
+def synthetic_bundle(n: int, rng: random.Random) -> Dict[str, Any]:
+    questions = [
+        ("q_role", "Role", "radio", lambda: rng.choice(ROLES)),
+        ("q_plan", "Plan", "select", lambda: rng.choice(PLANS)),
+        ("q_rating", "Rating", "rating", lambda: str(rng.randint(1, 5))),
+        ("q_spend", "Monthly spend", "number", lambda: str(round(rng.lognormvariate(4, 1), 2))),
+        ("q_tools", "Tools", "checkbox", lambda: json.dumps(rng.sample(TOOLS, rng.randint(1, 3)))),
+    ]
+    out = []
+    for qid, label, type_answer, gen in questions:
+        answers = []
+        for j in range(n):
+            if rng.random() < 0.05:  # skipped question
+                continue
+            raw = json.dumps({"userName": f"user{j}", "response": gen()})
+            answers.append({"answer_id": f"{qid}-{j}", "answer": raw, "parsed_answer": json.loads(raw)})
+        out.append({"question": {"question_id": qid, "question": label, "type_answer": type_answer}, "answers": answers})
+    return {"form": {"title": "Benchmark", "description": ""}, "questions": out}
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> Tuple[Any, float]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def reference_crosstab(bundle: Dict[str, Any], row_qid: str, col_qid: str, keep: Optional[set]) -> Counter:
+    """Per-respondent dict join + Counter (correctness check only)."""
+    by_q = {
+        qb["question"]["question_id"]: {a["parsed_answer"]["userName"]: a["parsed_answer"]["response"] for a in qb["answers"]}
+        for qb in bundle["questions"]
+    }
+    rows, cols = by_q[row_qid], by_q[col_qid]
+    return Counter((rows[u], cols[u]) for u in rows if u in cols and (keep is None or u in keep))
+
+
+def main(argv: None | list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the respondent-aligned table")
+    parser.add_argument("--n", type=int, default=100_000, help="Synthetic respondents")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    bundle = synthetic_bundle(args.n, random.Random(args.seed))
+    table, t_build = best_of(lambda: rs.RespondentTable.from_bundle(bundle, types=TYPES), 1)
+    print(f"respondents={len(table):,}  build {t_build * 1000:8.1f}ms (once per fetch)  (best of {args.repeat} below)")
+
+    segment = rs.parse_segments(["Role=Manager||Founder", "Rating=4..5"])
+    mask, t_mask = best_of(lambda: table.mask(segment), args.repeat)
+    ct, t_ct = best_of(lambda: table.crosstab("Plan", "Role", mask), args.repeat)
+    _, t_multi = best_of(lambda: table.crosstab("Tools", "Plan", mask), args.repeat)
+    gs, t_gs = best_of(lambda: table.group_stats("Monthly spend", "Plan", mask), args.repeat)
+    grouped, t_grouped = best_of(lambda: table.grouped(mask), args.repeat)
+    print(f"  mask ({int(mask.sum()):,} match)   {t_mask * 1000:8.2f}ms")
+    print(f"  crosstab Plan x Role        {t_ct * 1000:8.2f}ms")
+    print(f"  crosstab Tools x Plan       {t_multi * 1000:8.2f}ms  (multi-select)")
+    print(f"  group means Spend by Plan   {t_gs * 1000:8.2f}ms  {dict(zip(gs.groups, gs.mean.round(1).tolist()))}")
+    print(f"  filtered answers, all Qs    {t_grouped * 1000:8.2f}ms")
+    print(f"  filtered re-render total    {(t_mask + t_ct + t_multi + t_gs + t_grouped) * 1000:8.2f}ms")
+
+    keep = {table.respondents[i] for i in mask.nonzero()[0]}
+    ref = reference_crosstab(bundle, "q_plan", "q_role", keep)
+    exact = all(ref[(r, c)] == int(ct.counts[i, j]) for i, r in enumerate(ct.rows) for j, c in enumerate(ct.cols))
+    print(f"  crosstab matches per-respondent reference: {exact}")
+    if not exact:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Accuracy / speed benchmark: sketches.py vs the exact bento paths.
+
+Usage:
+  python bench_sketches.py            # 1M synthetic answers
+  python bench_sketches.py --n 5000000 --shards 16
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Callable, Tuple
+
+import sketches as sk
+
+
+def timed(fn: Callable[[], Any]) -> Tuple[Any, float, float]:
+    """Return (result, seconds, peak MiB); memory is traced in a second run so it doesn't skew timing."""
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1 << 20)
+
+
+def bench_numeric(n: int, shards: int, rng: random.Random) -> None:
+    values = [rng.lognormvariate(3, 0.8) for _ in range(n)]
+    exact, t_exact, m_exact = timed(lambda: (statistics.median(values), statistics.pstdev(values)))
+    sketch, t_sketch, m_sketch = timed(lambda: sk.NumericSketch.from_values(values))
+
+    ordered = sorted(values)
+    rank_errors = []
+    for q in (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99):
+        est = sketch.kll.quantile(q)
+        rank_errors.append(abs(bisect.bisect_right(ordered, est) / n - q))
+
+    step = n // shards
+    merged = sk.NumericSketch()
+    for i in range(shards):
+        part = sk.NumericSketch.from_values(values[i * step:(i + 1) * step if i < shards - 1 else n])
+        merged.merge(sk.sketch_from_dict(json.loads(json.dumps(part.to_dict()))))
+    merged_err = abs(bisect.bisect_right(ordered, merged.kll.quantile(0.5)) / n - 0.5)
+
+    print(f"\nNumeric quantiles (n={n:,})")
+    print(f"  exact median/pstdev : {t_exact:7.3f}s  peak {m_exact:7.1f} MiB")
+    print(f"  NumericSketch (KLL) : {t_sketch:7.3f}s  peak {m_sketch:7.1f} MiB  size {len(json.dumps(sketch.to_dict())):,} B")
+    print(f"  max rank error      : {max(rank_errors):.4f}  (p01..p99)")
+    print(f"  stdev rel. error    : {abs(sketch.stats()['stdev'] - exact[1]) / exact[1]:.2e}")
+    print(f"  {shards}-shard merge rank error at median: {merged_err:.4f}")
+
+
+def bench_categories(n: int, shards: int, rng: random.Random, top_k: int = 20) -> None:
+    labels = [f"option-{int(rng.paretovariate(1.1))}" for _ in range(n)]
+    exact, t_exact, m_exact = timed(lambda: Counter(labels))
+    mg, t_mg, m_mg = timed(lambda: sk.MisraGries(capacity=50 * top_k).update_many(labels))
+    _, t_set, _ = timed(lambda: len(set(labels)))
+    hll, t_hll, m_hll = timed(lambda: sk.HyperLogLog().update_many(labels))
+
+    true_top = [k for k, _ in exact.most_common(top_k)]
+    est_top = [k for k, _ in mg.most_common(top_k)]
+    recall = len(set(true_top) & set(est_top)) / top_k
+    max_err = max(exact[k] - mg.counts.get(k, 0) for k in true_top)
+    distinct = len(exact)
+
+    step = n // shards
+    merged = sk.HyperLogLog()
+    for i in range(shards):
+        merged.merge(sk.HyperLogLog().update_many(labels[i * step:(i + 1) * step if i < shards - 1 else n]))
+
+    print(f"\nCategories (n={n:,}, distinct={distinct:,})")
+    print(f"  exact Counter       : {t_exact:7.3f}s  peak {m_exact:7.1f} MiB")
+    print(f"  MisraGries          : {t_mg:7.3f}s  peak {m_mg:7.1f} MiB  top-{top_k} recall {recall:.2f}  max undercount {max_err} (bound {mg.error_bound})")
+    print(f"  exact len(set)      : {t_set:7.3f}s")
+    print(f"  HyperLogLog (p=14)  : {t_hll:7.3f}s  peak {m_hll:7.1f} MiB  estimate {hll.estimate():,}  rel. error {abs(hll.estimate() - distinct) / distinct:.4f}")
+    print(f"  {shards}-shard merged HLL: {merged.estimate():,}")
+
+
+def main(argv: None | list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark sketches against exact aggregation")
+    parser.add_argument("--n", type=int, default=1_000_000, help="Synthetic answers per benchmark")
+    parser.add_argument("--shards", type=int, default=8, help="Partitions for the merge check")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    bench_numeric(args.n, args.shards, rng)
+    bench_categories(args.n, args.shards, rng)
+
+
+if __name__ == "__main__":
+    main()
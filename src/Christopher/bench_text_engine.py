@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: text_engine n-gram counting vs the previous per-answer path
+(regex tokenize + Counter). Also checks the engine's counts against an exact
+per-answer reference that applies the same stopword rules, and that chunked /
+multiprocess counting gives identical results.
+
+Usage:
+  python bench_text_engine.py              # 100k synthetic answers
+  python bench_text_engine.py --n 500000 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, Callable, List, Tuple
+
+import text_engine as te
+
+WORD_RE = re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9']+")
+
+VOCAB = (
+    "the delivery was slow and the support team did not answer my emails great price would recommend "
+    "app crashes often customer service is friendly checkout process confusing Livraison très rapide "
+    "équipe réactive prix élevé"
+).split()
+
+
+def legacy_ngram_counts(answers: List[Any], n: int, top_k: int) -> List[Tuple[str, int]]:
+    """bento.ngram_counts before text_engine (no stopwords)."""
+    c: Counter = Counter()
+    for a in answers:
+        tokens = [t.lower() for t in WORD_RE.findall(a if isinstance(a, str) else str(a))]
+        if n > 1:
+            tokens = [" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1)]
+        c.update(tokens)
+    return c.most_common(top_k)
+
+
+def reference_counts(answers: List[Any], n: int) -> Counter:
+    """Exact per-answer counts under the engine's stopword rules (correctness check only)."""
+    def dropped(w: str) -> bool:
+        return w in te.STOPWORDS or len(w.strip("'")) < 2
+    c: Counter = Counter()
+    for a in answers:
+        tokens = [t.lower() for t in WORD_RE.findall(a)]
+        for i in range(len(tokens) - n + 1):
+            gram = tokens[i:i + n]
+            if not any(dropped(w) for w in gram):
+                c[" ".join(gram)] += 1
+    return c
+
+
+def synthetic_answers(n: int, rng: random.Random) -> List[str]:
+    out = []
+    for _ in range(n):
+        words = [rng.choice(VOCAB) for _ in range(rng.randint(3, 25))]
+        if rng.random() < 0.1:
+            words.append(f"typo{rng.randint(1, 10**6)}")  # one-off terms, removed by min-df
+        out.append(" ".join(words) + rng.choice(["", ".", "!", " :)"]))
+    return out
+
+
+def best_of(fn: Callable[[], Any], repeat: int) -> Tuple[Any, float]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def main(argv: None | list[str] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized text engine")
+    parser.add_argument("--n", type=int, default=100_000, help="Synthetic answers")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=2, help="Processes for the chunked run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    answers = synthetic_answers(args.n, random.Random(args.seed))
+    ok = True
+    print(f"answers={len(answers):,}  (best of {args.repeat})")
+    for n in (1, 2):
+        _, t_legacy = best_of(lambda: legacy_ngram_counts(answers, n, 20), args.repeat)
+        stats, t_engine = best_of(lambda: te.term_stats(answers, n=n), args.repeat)
+        chunked, t_chunked = best_of(
+            lambda: te.term_stats(answers, n=n, chunk_size=max(1, len(answers) // 8), workers=args.workers), args.repeat
+        )
+        ref = reference_counts(answers, n)
+        exact = all(ref[t] == c for t, c in stats.top_counts(100))
+        same = stats.top_counts(100) == chunked.top_counts(100) and stats.key_phrases(20) == chunked.key_phrases(20)
+        ok = ok and exact and same
+        print(f"  n={n}: legacy {t_legacy:6.3f}s  engine {t_engine:6.3f}s ({t_legacy / t_engine:.2f}x)  "
+              f"chunked x{args.workers} {t_chunked:6.3f}s  exact={exact} chunked-identical={same}")
+        print(f"        legacy top: {[t for t, _ in legacy_ngram_counts(answers, n, 5)]}")
+        print(f"        engine top: {[t for t, _ in stats.top_counts(5)]}  key phrases: {[t for t, _, _ in stats.key_phrases(5)]}")
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
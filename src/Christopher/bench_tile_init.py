@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Browser benchmark: eager vs lazy (IntersectionObserver) tile initialization on
+a synthetic many-tile dashboard.
+
+For each mode the generated full page is loaded in headless Chromium and we
+record, from navigation start:
+  - tti_ms: end of the last long task (>50ms) before a 2s quiet window,
+    the Lighthouse-style time-to-interactive approximation
+  - tbt_ms: total blocking time (sum of long-task time beyond 50ms)
+  - plotted: tiles plotted by then (lazy only plots what is near the viewport)
+
+Usage:
+  pip install playwright && playwright install chromium
+  python bench_tile_init.py                     # 60 tiles, 3 runs per mode
+  python bench_tile_init.py --tiles 120 --answers 20000 --keep ./bench_pages
+
+Pages load Plotly from a local copy when one is found (--plotly-js, or the
+plotly.min.js bundled with the `plotly` Python package), so CDN latency does
+not end up in the numbers; otherwise from the CDN, which needs network access.
+Where playwright cannot download its browser, point --browser at an installed
+Chrome/Chromium.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    from playwright.sync_api import sync_playwright
+except Exception:
+    sync_playwright = None
+
+import bento
+
+# Collect long tasks from the very first script on the page
+LONGTASK_OBSERVER_JS = """
+window.__longtasks = [];
+new PerformanceObserver(function(list){
+  list.getEntries().forEach(function(e){ window.__longtasks.push([e.startTime, e.duration]); });
+}).observe({type: 'longtask', buffered: true});
+"""
+
+QUIET_WINDOW_MS = 2000
+PLOTLY_CDN_SRC = "https://cdn.plot.ly/plotly-2.35.2.min.js"
+
+
+def bundled_plotly_js() -> Optional[Path]:
+    try:
+        import plotly
+    except Exception:
+        return None
+    path = Path(plotly.__file__).resolve().parent / "package_data" / "plotly.min.js"
+    return path if path.exists() else None
+
+
+def synthetic_records(tiles: int, answers: int, rng: random.Random) -> List[bento.QuestionRecord]:
+    words = ["great", "service", "slow", "delivery", "would", "recommend", "price", "support", "team", "app"]
+    records = []
+    for i in range(tiles):
+        kind = i % 4
+        if kind == 0:
+            vals: List[Any] = [round(rng.gauss(50, 15), 2) for _ in range(answers)]
+            atype = "number"
+        elif kind == 1:
+            vals = [rng.choice(["Yes", "No", "Maybe", "Often", "Never"]) for _ in range(answers)]
+            atype = "categorical"
+        elif kind == 2:
+            vals = [[rng.choice(["red", "green", "blue", "black"]) for _ in range(rng.randint(1, 3))] for _ in range(answers)]
+            atype = "multi"
+        else:
+            vals = [" ".join(rng.choice(words) for _ in range(rng.randint(3, 12))) for _ in range(answers)]
+            atype = "text"
+        records.append(bento.QuestionRecord(label=f"Question {i + 1} ({atype})", answers=vals, answer_type=atype))
+    return records
+
+
+def build_pages(records: List[bento.QuestionRecord], chart_data: str, out_dir: Path, plotly_js: Optional[Path] = None) -> Dict[str, Path]:
+    specs = [bento.fallback_spec(r.label, r.answer_type) for r in records]
+    if plotly_js is not None:
+        shutil.copyfile(plotly_js, out_dir / "plotly.min.js")
+    pages = {}
+    for mode in bento.TILE_INIT_MODES:
+        t0 = time.perf_counter()
+        tiles_html, scripts_js = bento.build_tiles_html(
+            "Benchmark", "", records, specs, include_header=False, chart_data=chart_data, tile_init=mode
+        )
+        page = bento.html_full_page("Benchmark", f"{len(records)} tiles, {mode} init", tiles_html, scripts_js)
+        if plotly_js is not None:
+            page = page.replace(PLOTLY_CDN_SRC, "plotly.min.js")
+        path = out_dir / f"dashboard_{mode}.html"
+        path.write_text(page, encoding="utf-8")
+        print(f"  {mode:<5} page: {len(page) / 1024:8.1f} KiB, generated in {time.perf_counter() - t0:.3f}s")
+        pages[mode] = path
+    return pages
+
+
+def measure(browser: Any, path: Path, timeout_s: float) -> Dict[str, float]:
+    page = browser.new_page(viewport={"width": 1280, "height": 800})
+    page.add_init_script(LONGTASK_OBSERVER_JS)
+    page.goto(path.as_uri(), wait_until="load")
+    deadline = time.monotonic() + timeout_s
+    while True:
+        state = page.evaluate(
+            "() => ({now: performance.now(), tasks: window.__longtasks,"
+            " plotted: document.querySelectorAll('.js-plotly-plot').length})"
+        )
+        last_end = max((s + d for s, d in state["tasks"]), default=0.0)
+        if state["now"] - last_end >= QUIET_WINDOW_MS or time.monotonic() > deadline:
+            break
+        time.sleep(0.1)
+    dcl = page.evaluate("() => performance.getEntriesByType('navigation')[0].domContentLoadedEventEnd")
+    page.close()
+    return {
+        "tti_ms": max(last_end, dcl),
+        "tbt_ms": sum(max(0.0, d - 50) for _, d in state["tasks"]),
+        "plotted": state["plotted"],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark eager vs lazy dashboard tile initialization")
+    parser.add_argument("--tiles", type=int, default=60)
+    parser.add_argument("--answers", type=int, default=5000, help="Answers per question")
+    parser.add_argument("--chart-data", choices=("auto", "raw", "aggregated"), default="raw",
+                        help="raw makes numeric tiles bin in the browser (the expensive case)")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per page load, seconds")
+    parser.add_argument("--keep", type=Path, help="Keep the generated pages in this directory")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--plotly-js", type=Path, help="Local plotly.min.js (default: the plotly package's copy, else the CDN)")
+    parser.add_argument("--browser", help="Chrome/Chromium executable instead of playwright's download")
+    args = parser.parse_args(argv)
+
+    records = synthetic_records(args.tiles, args.answers, random.Random(args.seed))
+    out_dir = args.keep or Path(tempfile.mkdtemp(prefix="bento_bench_"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    print(f"tiles={args.tiles} answers/question={args.answers} chart_data={args.chart_data}")
+    plotly_js = args.plotly_js or bundled_plotly_js()
+    print(f"plotly.js: {plotly_js or PLOTLY_CDN_SRC}")
+    pages = build_pages(records, args.chart_data, out_dir, plotly_js)
+
+    if sync_playwright is None:
+        raise SystemExit("playwright is not installed: pip install playwright && playwright install chromium")
+
+    results: Dict[str, List[Dict[str, float]]] = {mode: [] for mode in pages}
+    with sync_playwright() as pw:
+        browser = pw.chromium.launch(executable_path=args.browser)
+        try:
+            for _ in range(args.runs):
+                for mode, path in pages.items():
+                    results[mode].append(measure(browser, path, args.timeout))
+        finally:
+            browser.close()
+
+    for mode, runs in results.items():
+        print(
+            f"  {mode:<5} tti={statistics.median(r['tti_ms'] for r in runs):8.0f}ms  "
+            f"tbt={statistics.median(r['tbt_ms'] for r in runs):8.0f}ms  "
+            f"plotted={int(statistics.median(r['plotted'] for r in runs))}/{args.tiles}  (median of {args.runs})"
+        )
+    eager, lazy = (statistics.median(r["tti_ms"] for r in results[m]) for m in ("eager", "lazy"))
+    if lazy:
+        print(f"  time-to-interactive: {eager / lazy:.2f}x faster with lazy init")
+
+
+if __name__ == "__main__":
+    main()
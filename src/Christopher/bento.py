@@ -18,10 +18,12 @@ Notes:
 """
 
 from __future__ import annotations
+import contextlib
+import hashlib
 import html
 import json
+import math
 import os
-import re
 import statistics
 import sys
 from collections import Counter
@@ -29,8 +31,18 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
+
 # ---- import your existing fetcher/transformer ----
 import retrieve_supabase2 as r2
+import respondents as rs
+import chart_aggregates as agg
+import columnar_export as cx
+import snapshot_store
+import sketches as sk
+import text_engine as te
+import text_themes as tt
+import timing
 
 # Optional OpenAI client (fallbacks if missing)
 try:
@@ -48,32 +60,137 @@ class QuestionRecord:
     label: str
     answers: List[Any]
     answer_type: str  # number | boolean | categorical | multi | text
-
-def detect_type(answers: List[Any]) -> str:
-    if not answers:
+    aggregates: Optional[Dict[str, Any]] = None  # set in pushdown mode (answers is then only a sample)
+    question_id: Optional[str] = None
+    declared_type: Optional[str] = None  # question.type_answer as stored in Supabase
+    figure: Optional[Dict[str, Any]] = None  # precomputed cross-question tile (crosstab / group means)
+    insight: Optional[str] = None
+    segment: Optional[str] = None  # set when answers are a respondent segment (hash of its filters)
+
+# question.type_answer values (form builder + coercers) that settle the chart type on their own
+DECLARED_TYPES = {
+    **dict.fromkeys(("number", "float", "integer", "int", "rating"), "number"),
+    **dict.fromkeys(("boolean", "bool"), "boolean"),
+    **dict.fromkeys(("checkbox", "multi_choice", "multichoice", "multi-select"), "multi"),
+    **dict.fromkeys(("radio", "choice", "single_choice", "select"), "categorical"),
+}
+DETECT_SAMPLE = 2000  # answers inspected by the heuristics
+TYPE_CACHE_MIN_ANSWERS = 20  # don't pin a type decided on a handful of answers
+TYPE_CACHE_PATH = Path(os.getenv(
+    "BENTO_TYPE_CACHE", str(Path(__file__).resolve().parent / ".render_cache" / "detected_types.json")
+))
+BOOL_WORDS = {"true", "false", "yes", "no", "1", "0", "y", "n"}
+
+# question_id -> {"declared": type_answer, "type": detected}; loaded lazily from TYPE_CACHE_PATH
+_type_cache: Optional[Dict[str, Dict[str, Any]]] = None
+_type_cache_dirty = False
+
+def _load_type_cache() -> Dict[str, Dict[str, Any]]:
+    global _type_cache
+    if _type_cache is None:
+        try:
+            _type_cache = json.loads(TYPE_CACHE_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _type_cache = {}
+    return _type_cache
+
+def persisted_render_state(question_ids: List[str]) -> Dict[str, Any]:
+    """Type-cache entries of these questions (part of render_cache's ETag)."""
+    cache = _load_type_cache()
+    return {qid: cache[qid] for qid in question_ids if qid in cache}
+
+def save_type_cache() -> None:
+    """Persist detections made in this process (atomic replace; no-op when nothing changed)."""
+    global _type_cache_dirty
+    if not _type_cache_dirty or _type_cache is None:
+        return
+    try:
+        TYPE_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        tmp = TYPE_CACHE_PATH.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(_type_cache), encoding="utf-8")
+        os.replace(tmp, TYPE_CACHE_PATH)
+        _type_cache_dirty = False
+    except OSError as exc:
+        print(f"⚠️ Could not save type cache ({exc})", file=sys.stderr)
+
+def detect_type(answers: List[Any], declared_type: Optional[str] = None, question_id: Optional[str] = None) -> str:
+    """Chart type for a question: the declared type_answer when it is decisive, else
+    heuristics over a bounded sample. Heuristic results are cached per question_id
+    and only recomputed when the declared type changes."""
+    global _type_cache_dirty
+    declared = (declared_type or "").strip().lower()
+    atype = DECLARED_TYPES.get(declared)
+    if atype is not None and atype != "categorical":
+        return atype
+    if question_id:
+        hit = _load_type_cache().get(question_id)
+        if hit is not None and hit.get("declared") == declared:
+            return hit["type"]
+
+    sample = sk.reservoir_sample(answers, DETECT_SAMPLE, seed=question_id or 0)
+    if atype == "categorical":
+        # single-choice columns sometimes hold JSON arrays (multi-select stored as "choice")
+        return "multi" if any(isinstance(a, (list, tuple)) for a in sample) else atype
+    atype = detect_type_from_sample(sample)
+    if question_id and len(answers) >= TYPE_CACHE_MIN_ANSWERS:
+        _load_type_cache()[question_id] = {"declared": declared, "type": atype}
+        _type_cache_dirty = True
+    return atype
+
+def detect_type_from_sample(sample: List[Any]) -> str:
+    """The number/boolean/categorical/text heuristics, each stopping as soon as it is decided."""
+    if not sample:
         return "text"
-    if any(isinstance(a, (list, tuple)) for a in answers):
+    if any(isinstance(a, (list, tuple)) for a in sample):
         return "multi"
-    nonempty = [a for a in answers if a is not None and a != ""]
-    # numeric heuristic
-    numeric_hits = 0
+    nonempty = [a for a in sample if a is not None and a != ""]
+    # numeric heuristic: decided once hits reach the bar or misses make it unreachable
+    need = max(3, int(0.6 * len(nonempty)))
+    max_misses = len(nonempty) - need
+    hits = misses = 0
     for a in nonempty:
         if isinstance(a, (int, float)):
-            numeric_hits += 1
-        elif isinstance(a, str):
+            hits += 1
+        else:
             try:
                 float(a.strip())
-                numeric_hits += 1
+                hits += 1
             except Exception:
-                pass
-    if nonempty and numeric_hits >= max(3, int(0.6 * len(nonempty))):
-        return "number"
+                misses += 1
+        if hits >= need:
+            return "number"
+        if misses > max_misses:
+            break
     lowers = [str(a).strip().lower() for a in nonempty]
-    bool_map = {"true", "false", "yes", "no", "1", "0", "y", "n"}
-    if lowers and all(v in bool_map for v in lowers):
+    if lowers and all(v in BOOL_WORDS for v in lowers):
         return "boolean"
-    uniq = len(set(lowers))
-    if 1 < uniq <= max(12, int(0.2 * len(nonempty))):
+    limit = max(12, int(0.2 * len(nonempty)))
+    seen = set()
+    for v in lowers:
+        seen.add(v)
+        if len(seen) > limit:
+            return "text"
+    return "categorical" if len(seen) > 1 else "text"
+
+
+def detect_type_from_aggregates(stats: Dict[str, Any]) -> str:
+    """detect_type() over the counts returned by the form_dashboard_aggregates RPC."""
+    atype = DECLARED_TYPES.get((stats.get("type_answer") or "").strip().lower())
+    if atype == "categorical":
+        return "multi" if stats.get("is_multi") else atype
+    if atype is not None:
+        return atype
+    nonempty = int(stats.get("nonempty") or 0)
+    if not int(stats.get("total") or 0):
+        return "text"
+    if stats.get("is_multi") and nonempty:
+        return "multi"
+    if nonempty and int(stats.get("numeric_count") or 0) >= max(3, int(0.6 * nonempty)):
+        return "number"
+    if nonempty and stats.get("all_boolean"):
+        return "boolean"
+    uniq = int(stats.get("distinct_count") or 0)
+    if 1 < uniq <= max(12, int(0.2 * nonempty)):
         return "categorical"
     return "text"
 
@@ -84,7 +201,7 @@ def detect_type(answers: List[Any]) -> str:
 
 @dataclass
 class ChartSpec:
-    chart_type: str  # histogram | box | violin | bar | bar_topk | text_ngrams
+    chart_type: str  # histogram | box | violin | bar | bar_topk | text_ngrams | text_themes | grouped_bar | heatmap
     title: str
     description: str
     size: str  # 1x1 | 2x1 | 2x2
@@ -98,9 +215,16 @@ class DashboardRender:
     description: str
     question_count: int
 
-ALLOWED_TYPES = {"histogram", "box", "violin", "bar", "bar_topk", "text_ngrams"}
+ALLOWED_TYPES = {"histogram", "box", "violin", "bar", "bar_topk", "text_ngrams", "text_themes"}
 ALLOWED_SIZES = {"1x1", "2x1", "2x2"}
 
+# Batch workers install a cross-process limiter here (see bento_batch.py)
+_llm_limiter: Any = contextlib.nullcontext()
+
+def configure_llm(limiter: Any = None) -> None:
+    global _llm_limiter
+    _llm_limiter = limiter or contextlib.nullcontext()
+
 def init_llm() -> Optional[OpenAI]:
     if OpenAI is None:
         return None
@@ -121,7 +245,8 @@ def plan_prompt(label: str, answer_type: str, answers: List[Any]) -> str:
         "- number: histogram (auto bins) or box/violin.\n"
         "- boolean/categorical: bar or bar_topk (set top_k; rest is 'Other').\n"
         "- multi (list answers): flatten, bar_topk.\n"
-        "- text: text_ngrams (ngram=1 or 2), top_k 15–30.\n"
+        "- text: text_ngrams (ngram=1 or 2), top_k 15–30; or text_themes (max_themes 3–10) to group\n"
+        "  longer free-text answers into themes.\n"
         "- size: 1x1, 2x1, or 2x2; concise description.\n\n"
         f"Question: {label}\n"
         f"Type: {answer_type}\n"
@@ -132,14 +257,15 @@ def ask_llm(client: Optional[OpenAI], label: str, answer_type: str, answers: Lis
     if client is None:
         return None
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.1,
-            messages=[
-                {"role": "system", "content": "You output only valid JSON — no prose."},
-                {"role": "user", "content": plan_prompt(label, answer_type, answers)},
-            ],
-        )
+        with timing.span("ask_llm", "llm", question=label), _llm_limiter:
+            resp = client.chat.completions.create(
+                model="gpt-4o-mini",
+                temperature=0.1,
+                messages=[
+                    {"role": "system", "content": "You output only valid JSON — no prose."},
+                    {"role": "user", "content": plan_prompt(label, answer_type, answers)},
+                ],
+            )
         text = resp.choices[0].message.content.strip()
         data = json.loads(text)
         return validate_spec(label, answer_type, data)
@@ -170,6 +296,9 @@ def validate_spec(label: str, answer_type: str, data: Dict[str, Any]) -> ChartSp
         top_k = max(5, min(50, top_k))
         ngram = int(params.get("ngram", 1))
         params = {"top_k": top_k, "ngram": (ngram if ct == "text_ngrams" and ngram in (1, 2) else 1)}
+    elif ct == "text_themes":
+        max_themes = int(params.get("max_themes", 8))
+        params = {"max_themes": max(2, min(10, max_themes))}
     else:
         params = {}
     return ChartSpec(ct, title, desc, size, params)
@@ -181,21 +310,13 @@ def fallback_spec(label: str, answer_type: str) -> ChartSpec:
         return ChartSpec("bar_topk", label, "Most frequent categories.", "2x1", {"top_k": 20, "ngram": 1})
     if answer_type == "multi":
         return ChartSpec("bar_topk", label, "Most selected options.", "2x1", {"top_k": 20, "ngram": 1})
-    return ChartSpec("text_ngrams", label, "Most frequent terms in responses.", "2x1", {"top_k": 20, "ngram": 1})
+    return ChartSpec("text_ngrams", label, "Key terms in responses (TF-IDF ranked).", "2x1", {"top_k": 20, "ngram": 1})
 
 
 # =========================
 # Data utils
 # =========================
 
-WORD_RE = re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9']+")
-
-def tokenize(text: str, n: int = 1) -> List[str]:
-    tokens = [t.lower() for t in WORD_RE.findall(text)]
-    if n == 1:
-        return tokens
-    return [" ".join(tokens[i:i+n]) for i in range(len(tokens)-n+1)]
-
 def flatten_multi(answers: List[Any]) -> List[str]:
     out: List[str] = []
     for a in answers:
@@ -205,6 +326,9 @@ def flatten_multi(answers: List[Any]) -> List[str]:
             out.append(str(a))
     return out
 
+# Answers already in memory are counted exactly; sketches (sketches.py) are only
+# used where answers stream (retrieve_supabase2.sketch_answers_for_question).
+
 def categorical_counts(answers: List[Any], top_k: int = 20) -> Tuple[List[str], List[int]]:
     vals = [str(a).strip() for a in answers if a is not None and str(a).strip() != ""]
     counts = Counter(vals)
@@ -216,14 +340,24 @@ def categorical_counts(answers: List[Any], top_k: int = 20) -> Tuple[List[str],
     return [k for k, _ in items] + ["Other"], [v for _, v in items] + [other]
 
 def ngram_counts(answers: List[Any], n: int = 1, top_k: int = 20) -> Tuple[List[str], List[int]]:
-    c = Counter()
-    for a in answers:
-        s = a if isinstance(a, str) else str(a)
-        for tok in tokenize(s, n=n):
-            c[tok] += 1
-    items = c.most_common(top_k)
+    """Most frequent n-grams (stopwords and rare one-offs removed, see text_engine)."""
+    items = te.term_stats(answers, n=n).top_counts(top_k)
     return [k for k, _ in items], [v for _, v in items]
 
+def key_phrase_counts(answers: List[Any], n: int = 1, top_k: int = 20) -> Tuple[List[str], List[int]]:
+    """n-grams ranked by TF-IDF (distinctive rather than merely frequent), with their counts."""
+    items = te.term_stats(answers, n=n).key_phrases(top_k)
+    return [k for k, _, _ in items], [c for _, c, _ in items]
+
+def top_values_counts(stats: Dict[str, Any], top_k: int = 20) -> Tuple[List[str], List[int]]:
+    """categorical_counts() from the RPC's exact top values + totals."""
+    items = stats.get("top_values") or []
+    if int(stats.get("item_distinct") or 0) <= top_k:
+        return [k for k, _ in items], [int(v) for _, v in items]
+    items = items[:top_k - 1]
+    other = int(stats.get("item_total") or 0) - sum(int(v) for _, v in items)
+    return [k for k, _ in items] + ["Other"], [int(v) for _, v in items] + [other]
+
 def numeric_stats(values: List[float]) -> Dict[str, Optional[float]]:
     if not values:
         return {"count": 0, "mean": None, "median": None, "stdev": None, "min": None, "max": None}
@@ -264,6 +398,20 @@ def tile_class(size: str) -> str:
     # You can map sizes to grid spans if needed; keeping 1x1 for now, your layout controls grid spans.
     return TILE_CLASS
 
+def insight_text_from_aggregates(stats: Dict[str, Any], atype: str) -> str:
+    if atype == "number":
+        s = stats.get("numeric") or {}
+        if not s.get("count"):
+            return "No data"
+        return f"n={s['count']} • mean={s['mean']:.2f} • median={s['median']:.2f} • min={s['min']} • max={s['max']}"
+    if atype in {"categorical", "boolean", "multi"}:
+        top = stats.get("top_values") or []
+        if not top:
+            return "No data"
+        return f"Top: “{top[0][0]}” ({top[0][1]}) • Unique={stats.get('item_distinct')} • Total={stats.get('item_total')}"
+    words = te.drop_stopword_grams((stats.get("ngrams") or {}).get("1") or [])
+    return f"Top term: “{words[0][0]}” ({words[0][1]})" if words else "No data"
+
 def insight_text(label: str, answers: List[Any], atype: str) -> str:
     if atype == "number":
         nums = []
@@ -280,63 +428,251 @@ def insight_text(label: str, answers: List[Any], atype: str) -> str:
             return "No data"
         top, cnt = Counter(vals).most_common(1)[0]
         return f"Top: “{top}” ({cnt}) • Unique={len(set(vals))} • Total={len(vals)}"
-    words, counts = ngram_counts(answers, n=1, top_k=1)
-    return f"Top term: “{words[0]}” ({counts[0]})" if words else "No data"
+    stats = te.term_stats(answers, n=1)
+    top = stats.top_counts(1)
+    if not top:
+        return "No data"
+    key = stats.key_phrases(1)[0][0]
+    text = f"Top term: “{top[0][0]}” ({top[0][1]})"
+    return text if key == top[0][0] else f"{text} • Key phrase: “{key}”"
+
+MARGIN = {"t": 10, "r": 10, "b": 40, "l": 40}
+MARGIN_LABELS = {"t": 10, "r": 10, "b": 60, "l": 40}
+
+def bar_figure(labels: List[Any], values: List[Any], y_title: str) -> Dict[str, Any]:
+    return {
+        "data": [{"x": labels, "y": values, "type": "bar"}],
+        "layout": {"xaxis": {"automargin": True}, "yaxis": {"title": y_title}, "margin": MARGIN_LABELS},
+    }
+
+def binned_layout(chart_type: str) -> Dict[str, Any]:
+    if chart_type in {"box", "violin"}:
+        return {"showlegend": False, "xaxis": {"visible": False}, "margin": MARGIN}
+    return {"xaxis": {"title": "Value"}, "yaxis": {"title": "Count"}, "bargap": 0, "margin": MARGIN}
 
-def render_trace_js(idx: int, label: str, answers: List[Any], atype: str, spec: ChartSpec) -> str:
-    el = f"chart-{idx}"
+def trace_figure(label: str, answers: List[Any], atype: str, spec: ChartSpec, chart_data: str = "auto") -> Dict[str, Any]:
+    """Plotly figure ({"data", "layout"}) for one tile, computed from the raw answers."""
     ct = spec.chart_type
 
     if atype == "number":
         nums = []
         for a in answers:
             try:
-                nums.append(float(a))
+                v = float(a)
             except Exception:
-                pass
-        nums_json = json.dumps(nums)
+                continue
+            if math.isfinite(v):  # NaN/Infinity are not valid JSON
+                nums.append(v)
+        if agg.use_aggregated(chart_data, len(nums)):
+            # Pre-binned traces: size independent of the number of answers
+            return {
+                "data": agg.numeric_traces(ct, nums, bins=int(spec.params.get("bins", 20))),
+                "layout": binned_layout(ct),
+            }
         if ct == "box":
-            return f"Plotly.newPlot('{el}', [{{y:{nums_json}, type:'box'}}], {{margin:{{t:10,r:10,b:40,l:40}}}});"
+            return {"data": [{"y": nums, "type": "box"}], "layout": {"margin": MARGIN}}
         if ct == "violin":
-            return f"Plotly.newPlot('{el}', [{{y:{nums_json}, type:'violin', points:'all'}}], {{margin:{{t:10,r:10,b:40,l:40}}}});"
-        bins = int(spec.params.get("bins", 20))
-        return (
-            f"Plotly.newPlot('{el}', [{{x:{nums_json}, type:'histogram', nbinsx:{bins}}}], "
-            f"{{xaxis:{{title:'Value'}}, yaxis:{{title:'Count'}}, margin:{{t:10,r:10,b:40,l:40}}}});"
-        )
+            return {"data": [{"y": nums, "type": "violin", "points": "all"}], "layout": {"margin": MARGIN}}
+        return {
+            "data": [{"x": nums, "type": "histogram", "nbinsx": int(spec.params.get("bins", 20))}],
+            "layout": {"xaxis": {"title": "Value"}, "yaxis": {"title": "Count"}, "margin": MARGIN},
+        }
 
     if atype in {"categorical", "boolean"}:
         labels, values = categorical_counts(answers, top_k=int(spec.params.get("top_k", 20)))
-        return (
-            f"Plotly.newPlot('{el}', [{{x:{json.dumps(labels)}, y:{json.dumps(values)}, type:'bar'}}], "
-            f"{{xaxis:{{automargin:true}}, yaxis:{{title:'Count'}}, margin:{{t:10,r:10,b:60,l:40}}}});"
-        )
+        return bar_figure(labels, values, "Count")
 
     if atype == "multi":
-        flat = flatten_multi(answers)
-        labels_, values_ = categorical_counts(flat, top_k=int(spec.params.get("top_k", 20)))
-        return (
-            f"Plotly.newPlot('{el}', [{{x:{json.dumps(labels_)}, y:{json.dumps(values_)}, type:'bar'}}], "
-            f"{{xaxis:{{automargin:true}}, yaxis:{{title:'Selections'}}, margin:{{t:10,r:10,b:60,l:40}}}});"
-        )
+        labels, values = categorical_counts(flatten_multi(answers), top_k=int(spec.params.get("top_k", 20)))
+        return bar_figure(labels, values, "Selections")
+
+    # text: phrases picked by TF-IDF, bars show how often each occurs
+    labels, values = key_phrase_counts(answers, n=int(spec.params.get("ngram", 1)), top_k=int(spec.params.get("top_k", 20)))
+    return bar_figure(labels, values, "Frequency")
+
+def themes_figure(themes: List[tt.Theme]) -> Dict[str, Any]:
+    """Horizontal bars of theme sizes, largest on top; hover shows representative answers."""
+    themes = list(reversed(themes))
+    return {
+        "data": [{
+            "type": "bar",
+            "orientation": "h",
+            "x": [t.size for t in themes],
+            "y": [t.label for t in themes],
+            "text": [f"{t.share:.0%}" for t in themes],
+            "textposition": "auto",
+            "hovertext": ["<br>".join(html.escape(e) for e in t.examples) for t in themes],
+            "hoverinfo": "x+text",
+        }],
+        "layout": {"xaxis": {"title": "Answers"}, "yaxis": {"automargin": True}, "margin": {"t": 10, "r": 10, "b": 40, "l": 10}},
+    }
+
+def themes_insight(themes: List[tt.Theme]) -> str:
+    top = themes[0]
+    return f"{len(themes)} themes • Largest: “{top.label}” ({top.share:.0%})"
+
+def aggregates_figure(stats: Dict[str, Any], atype: str, spec: ChartSpec) -> Dict[str, Any]:
+    """trace_figure() for pushdown mode: traces come from RPC aggregates, never raw answers."""
+    ct = spec.chart_type
+
+    if atype == "number":
+        s = stats.get("numeric") or {}
+        if not s.get("count"):
+            traces: List[Dict[str, Any]] = [{"x": [], "y": [], "type": "bar"}]
+        else:
+            counts = agg.bucket_counts(s.get("histogram") or [], int(s.get("bins") or 20))
+            if ct == "box":
+                traces = agg.box_traces_from_summary(s)
+            elif ct == "violin":
+                traces = agg.violin_traces_from_counts(s["min"], s["max"], counts, s)
+            else:
+                traces = agg.histogram_traces_from_counts(s["min"], s["max"], counts)
+        return {"data": traces, "layout": binned_layout(ct)}
+
+    if atype in {"categorical", "boolean", "multi"}:
+        labels, values = top_values_counts(stats, top_k=int(spec.params.get("top_k", 20)))
+        return bar_figure(labels, values, "Selections" if atype == "multi" else "Count")
 
-    # text
     n = int(spec.params.get("ngram", 1))
-    top_k = int(spec.params.get("top_k", 20))
-    labels__, values__ = ngram_counts(answers, n=n, top_k=top_k)
-    return (
-        f"Plotly.newPlot('{el}', [{{x:{json.dumps(labels__)}, y:{json.dumps(values__)}, type:'bar'}}], "
-        f"{{xaxis:{{automargin:true}}, yaxis:{{title:'Frequency'}}, margin:{{t:10,r:10,b:60,l:40}}}});"
-    )
+    items = te.drop_stopword_grams((stats.get("ngrams") or {}).get(str(n)) or [])[:int(spec.params.get("top_k", 20))]
+    return bar_figure([k for k, _ in items], [v for _, v in items], "Frequency")
+
+CROSS_CHART_TYPES = ("grouped_bar", "heatmap")
+HEATMAP_MIN_CELLS = 36  # above this many cells a grouped bar gets unreadable
+
+def grouped_bar_figure(ct: rs.Crosstab) -> Dict[str, Any]:
+    return {
+        "data": [
+            {"type": "bar", "name": col, "x": ct.rows, "y": ct.counts[:, j].tolist()}
+            for j, col in enumerate(ct.cols)
+        ],
+        "layout": {
+            "barmode": "group",
+            "xaxis": {"automargin": True},
+            "yaxis": {"title": "Respondents"},
+            "legend": {"title": {"text": ct.col_label}},
+            "margin": MARGIN_LABELS,
+        },
+    }
 
-def build_tiles_html(title: str, description: str, records: List[QuestionRecord], specs: List[ChartSpec], include_header: bool) -> Tuple[str, str]:
+def heatmap_figure(ct: rs.Crosstab) -> Dict[str, Any]:
+    return {
+        "data": [{
+            "type": "heatmap",
+            "z": ct.counts.tolist(),
+            "x": ct.cols,
+            "y": ct.rows,
+            "colorscale": "Blues",
+            "hovertemplate": "%{y} × %{x}: %{z}<extra></extra>",
+        }],
+        "layout": {"xaxis": {"automargin": True}, "yaxis": {"automargin": True}, "margin": MARGIN_LABELS},
+    }
+
+def group_means_figure(gs: rs.GroupStats) -> Dict[str, Any]:
+    fig = bar_figure(gs.groups, gs.mean.round(3).tolist(), f"Mean {gs.value_label}")
+    fig["data"][0].update({
+        "text": [f"n={c}" for c in gs.count.tolist()],
+        "customdata": gs.median.tolist(),
+        "hovertemplate": "%{x}: mean %{y}, median %{customdata} (%{text})<extra></extra>",
+    })
+    return fig
+
+def crosstab_record(
+    table: rs.RespondentTable,
+    question: str,
+    by: str,
+    mask: Any = None,
+    chart: Optional[str] = None,
+) -> QuestionRecord:
+    """One precomputed tile: mean of a numeric question per group, or a crosstab of two questions."""
+    col, by_col = table.column(question), table.column(by)
+    label = f"{col.label} × {by_col.label}"
+    if chart is not None and chart not in CROSS_CHART_TYPES:
+        raise ValueError(f"Crosstab chart must be one of {CROSS_CHART_TYPES}, got '{chart}'")
+    # Many-valued numbers read better as group means; ratings stay a crosstab
+    if chart is None and col.values is not None and np.unique(col.values[~np.isnan(col.values)]).size > rs.MAX_DISCRETE:
+        gs = table.group_stats(question, by, mask)
+        if not gs.groups:
+            return QuestionRecord(label=label, answers=[], answer_type="grouped_bar", figure=bar_figure([], [], "Mean"), insight="No data")
+        hi, lo = int(gs.mean.argmax()), int(gs.mean.argmin())
+        insight = (
+            f"Highest mean: “{gs.groups[hi]}” ({gs.mean[hi]:.2f}, n={gs.count[hi]}) • "
+            f"Lowest: “{gs.groups[lo]}” ({gs.mean[lo]:.2f}, n={gs.count[lo]})"
+        )
+        return QuestionRecord(label=label, answers=[], answer_type="grouped_bar", figure=group_means_figure(gs), insight=insight)
+    ct = table.crosstab(question, by, mask)
+    if chart is None:
+        chart = "heatmap" if len(ct.rows) * len(ct.cols) > HEATMAP_MIN_CELLS else "grouped_bar"
+    fig = heatmap_figure(ct) if chart == "heatmap" else grouped_bar_figure(ct)
+    if ct.n == 0:
+        insight = "No data"
+    else:
+        r, c, count = ct.top_cell()
+        insight = f"n={ct.n} respondents • Most common: “{r}” × “{c}” ({count})"
+    return QuestionRecord(label=label, answers=[], answer_type=chart, figure=fig, insight=insight)
+
+def figure_json(fig: Dict[str, Any]) -> str:
+    """Compact JSON that is safe inside <script type="application/json"> ("<" escaped)."""
+    return json.dumps(fig, separators=(",", ":"), ensure_ascii=False).replace("<", "\\u003c")
+
+TILE_INIT_MODES = ("lazy", "eager")
+
+# Shared by every tile on the page (and by several fragments on one page).
+# Lazy: tiles are plotted when they come within 200px of the viewport, one per
+# task so a screenful of charts never blocks input for long. Eager: plot all now.
+TILE_RUNTIME_JS = """
+(function(){
+  var eager = %EAGER%;
+  var B = window.BentoTiles = window.BentoTiles || {};
+  if (!B.plot) {
+    B.queue = [];
+    B.plot = function(el){
+      if (typeof el === 'string') el = document.getElementById(el);
+      if (!el) return Promise.resolve();
+      if (!el._bentoPlot) {
+        if (B.io) B.io.unobserve(el);
+        var fig = JSON.parse(document.getElementById(el.id + '-data').textContent);
+        el._bentoPlot = Plotly.newPlot(el, fig.data, fig.layout);
+      }
+      return el._bentoPlot;
+    };
+    B.drain = function(){
+      var el = B.queue.shift();
+      if (!el) { B.draining = false; return; }
+      B.plot(el);
+      setTimeout(B.drain, 0);
+    };
+    B.enqueue = function(el){
+      B.queue.push(el);
+      if (!B.draining) { B.draining = true; setTimeout(B.drain, 0); }
+    };
+    if ('IntersectionObserver' in window) {
+      B.io = new IntersectionObserver(function(entries){
+        entries.forEach(function(e){ if (e.isIntersecting) { B.io.unobserve(e.target); B.enqueue(e.target); } });
+      }, {rootMargin: '200px 0px'});
+    }
+  }
+  var els = document.querySelectorAll('[data-bento-chart]:not([data-bento-bound])');
+  for (var i = 0; i < els.length; i++) {
+    els[i].setAttribute('data-bento-bound', '');
+    if (eager) B.plot(els[i]);
+    else if (B.io) B.io.observe(els[i]);
+    else B.enqueue(els[i]);
+  }
+})();
+""".strip()
+
+def tile_runtime_js(tile_init: str = "lazy") -> str:
+    return TILE_RUNTIME_JS.replace("%EAGER%", "true" if tile_init == "eager" else "false")
+
+def build_tiles_html(title: str, description: str, records: List[QuestionRecord], specs: List[ChartSpec], include_header: bool, chart_data: str = "auto", tile_init: str = "lazy") -> Tuple[str, str]:
     """
     Returns (tiles_html, scripts_js)
-    - tiles_html: a set of themed tiles (no global CSS)
-    - scripts_js: the JS that initializes Plotly on each tile
+    - tiles_html: a set of themed tiles (no global CSS); each chart's figure sits
+      next to it in a <script type="application/json"> block
+    - scripts_js: the shared runtime that plots tiles (see TILE_RUNTIME_JS)
     """
     tiles = []
-    scripts = []
     if include_header:
         tiles.append(
             f'<div class="md:col-span-12"><h2 class="text-xl font-semibold">{html.escape(title or "")}</h2>'
@@ -346,7 +682,28 @@ def build_tiles_html(title: str, description: str, records: List[QuestionRecord]
     for i, (rec, spec) in enumerate(zip(records, specs)):
         t = html.escape(spec.title or rec.label)
         d = html.escape(spec.description or "")
-        ins = html.escape(insight_text(rec.label, rec.answers, rec.answer_type))
+        themes: List[tt.Theme] = []
+        if spec.chart_type == "text_themes" and rec.answer_type == "text" and rec.aggregates is None:
+            with timing.span("text_themes", question=rec.label, answers=len(rec.answers)):
+                # A segment gets its own stored model so it never replaces the full question's
+                theme_key = f"{rec.question_id}.{rec.segment}" if rec.question_id and rec.segment else rec.question_id
+                themes = tt.question_themes(theme_key, rec.answers, max_themes=int(spec.params.get("max_themes", 8)))
+            if len(themes) < 2:
+                themes = []  # one theme says nothing: show key-term bars instead
+        if rec.figure is not None:
+            # Cross-question tiles (crosstab / group means) arrive precomputed
+            ins = html.escape(rec.insight or "")
+            fig = rec.figure
+        elif themes:
+            ins = html.escape(themes_insight(themes))
+            fig = themes_figure(themes)
+        elif rec.aggregates is not None:
+            # Pushdown only has n-gram aggregates, so text_themes degrades to key-term bars
+            ins = html.escape(insight_text_from_aggregates(rec.aggregates, rec.answer_type))
+            fig = aggregates_figure(rec.aggregates, rec.answer_type, spec)
+        else:
+            ins = html.escape(insight_text(rec.label, rec.answers, rec.answer_type))
+            fig = trace_figure(rec.label, rec.answers, rec.answer_type, spec, chart_data=chart_data)
         chart_id = f"chart-{i}"
         tiles.append(
             f"""
@@ -358,19 +715,19 @@ def build_tiles_html(title: str, description: str, records: List[QuestionRecord]
     </div>
     <div class="{BODY_CLASS}">
       <p class="{DESC_CLASS}">{d}</p>
-      <div id="{chart_id}" class="w-full" style="height:280px"></div>
+      <div id="{chart_id}" data-bento-chart class="w-full" style="height:280px"></div>
+      <script type="application/json" id="{chart_id}-data">{figure_json(fig)}</script>
     </div>
     <div class="mt-3 flex items-center justify-between">
       <div class="text-xs text-muted-foreground">{ins}</div>
-      <button class="{BTN_CLASS}" onclick="(function(){{if(!window.Plotly)return;Plotly.toImage('{chart_id}',{{format:'png',height:600,width:1000}}).then(u=>{{let a=document.createElement('a');a.href=u;a.download='{t}'.replaceAll(' ','_')+'.png';a.click();}})}})()">Download PNG</button>
+      <button class="{BTN_CLASS}" onclick="(function(){{if(!window.Plotly)return;BentoTiles.plot('{chart_id}').then(()=>Plotly.toImage('{chart_id}',{{format:'png',height:600,width:1000}})).then(u=>{{let a=document.createElement('a');a.href=u;a.download='{t}'.replaceAll(' ','_')+'.png';a.click();}})}})()">Download PNG</button>
     </div>
   </div>
 </div>
 """.strip()
         )
-        scripts.append(render_trace_js(i, rec.label, rec.answers, rec.answer_type, spec))
 
-    return "\n".join(tiles), "\n".join(scripts)
+    return "\n".join(tiles), tile_runtime_js(tile_init)
 
 def html_full_page(title: str, description: str, tiles_html: str, scripts_js: str) -> str:
     # Full page includes Plotly CDN and a minimal dark bg, but still uses your classes.
@@ -405,7 +762,8 @@ def html_fragment(tiles_html: str, scripts_js: str) -> str:
     """
     Fragment to embed inside your page. It:
     - wraps tiles in a grid container using Tailwind utility classes
-    - loads Plotly only if not already present, then runs scripts
+    - loads Plotly only if not already present, then runs scripts (which only
+      bind tiles; plotting happens as they scroll into view)
     """
     loader = """
 <script>
@@ -431,53 +789,192 @@ def html_fragment(tiles_html: str, scripts_js: str) -> str:
 # Orchestration (one-shot)
 # =========================
 
-def load_grouped_from_retrieve(form_id: str) -> Tuple[str, str, List[QuestionRecord]]:
-    """Uses retrieve_supabase2.py to fetch bundle, convert to grouped, then adapt to records."""
-    config = r2.load_config()
-    bundle = r2.fetch_form_bundle(config, form_id)
-    grouped = r2.bundle_to_grouped_by_question(bundle)
+SNAPSHOT_MODES = ("sync", "offline")
+
+def fetch_bundle(form_id: str, snapshot: Optional[str] = None) -> Dict[str, Any]:
+    """retrieve_supabase2 bundle, either live or through the local snapshot store.
+
+    snapshot: "sync" delta-syncs the local SQLite snapshot and reads from it,
+    "offline" reads the snapshot without touching the network.
+    """
+    if snapshot in SNAPSHOT_MODES:
+        with timing.span("snapshot.load_bundle", offline=snapshot == "offline"):
+            return snapshot_store.load_bundle(form_id, offline=snapshot == "offline")
+    return r2.fetch_form_bundle(r2.load_config(), form_id)
+
+
+def records_from_bundle(bundle: Dict[str, Any]) -> Tuple[str, str, List[QuestionRecord]]:
+    with timing.span("bundle_to_grouped"):
+        grouped = r2.bundle_to_grouped_by_question(bundle)
     title = grouped.get("title") or ""
     description = grouped.get("description") or ""
     records: List[QuestionRecord] = []
     for q in grouped.get("questions", []):
         label = q.get("question")
         answers = q.get("answers") or []
-        atype = detect_type(answers)
-        records.append(QuestionRecord(label=label, answers=answers, answer_type=atype))
+        qid, declared = q.get("question_id"), q.get("type_answer")
+        with timing.span("detect_type", question=label, answers=len(answers)):
+            atype = detect_type(answers, declared, qid)
+        records.append(QuestionRecord(
+            label=label, answers=answers, answer_type=atype, question_id=qid, declared_type=declared
+        ))
+    return title, description, records
+
 
+def load_grouped_from_retrieve(form_id: str, snapshot: Optional[str] = None) -> Tuple[str, str, List[QuestionRecord]]:
+    """Uses retrieve_supabase2.py to fetch bundle, convert to grouped, then adapt to records."""
+    with timing.span("load_grouped_from_retrieve", form_id=form_id, snapshot=snapshot):
+        return records_from_bundle(fetch_bundle(form_id, snapshot))
+
+
+def load_segmented_from_retrieve(
+    form_id: str,
+    snapshot: Optional[str] = None,
+    segments: Optional[Dict[str, Any]] = None,
+    crosstabs: Optional[List[Tuple[str, str, Optional[str]]]] = None,
+) -> Tuple[str, str, List[QuestionRecord]]:
+    """Respondent-aligned variant: per-question records restricted to a segment, plus crosstab tiles.
+
+    Chart types are detected on the full form so a segment doesn't change them.
+    Only answers carrying a userName can be filtered; with no segment the
+    per-question records keep every answer.
+    """
+    with timing.span("load_grouped_from_retrieve", form_id=form_id, snapshot=snapshot):
+        bundle = fetch_bundle(form_id, snapshot)
+        title, description, records = records_from_bundle(bundle)
+    with timing.span("respondents.build"):
+        table = rs.RespondentTable.from_bundle(bundle, types={r.question_id: r.answer_type for r in records})
+    mask = None
+    if segments:
+        with timing.span("respondents.filter", filters=len(segments)):
+            mask = table.mask(segments)
+            segment_key = hashlib.sha256(rs.describe_segments(segments).encode("utf-8")).hexdigest()[:12]
+            for rec, col in zip(records, table.columns):
+                rec.answers = col.answers(mask)
+                rec.segment = segment_key
+        segment_note = f"Segment: {rs.describe_segments(segments)} ({int(mask.sum()):,} of {len(table):,} respondents)"
+        description = f"{description} • {segment_note}" if description else segment_note
+    for question, by, chart in crosstabs or []:
+        with timing.span("respondents.crosstab", question=question, by=by):
+            records.append(crosstab_record(table, question, by, mask, chart))
     return title, description, records
 
 
+def load_grouped_from_columnar(path: Path) -> Tuple[str, str, List[QuestionRecord]]:
+    """Records from a columnar_export.py export (memory-mapped), no network."""
+    grouped = cx.load_grouped(path)
+    records = [
+        QuestionRecord(
+            label=q.get("question"),
+            answers=q["answers"],
+            answer_type=detect_type(q["answers"], q.get("type_answer"), q.get("question_id")),
+            question_id=q.get("question_id"),
+            declared_type=q.get("type_answer"),
+        )
+        for q in grouped.get("questions", [])
+    ]
+    return grouped.get("title") or "", grouped.get("description") or "", records
+
+
+AGGREGATION_MODES = ("client", "pushdown")
+
+def load_aggregated_from_rpc(form_id: str) -> Tuple[str, str, List[QuestionRecord]]:
+    """Pushdown mode: per-question aggregates from the form_dashboard_aggregates RPC.
+
+    Each record's answers hold the top values only, as the LLM planning sample.
+    """
+    config = r2.load_config()
+    with timing.span("supabase.rpc", "supabase", function="form_dashboard_aggregates"):
+        bundle = r2.fetch_form_aggregates(config, form_id)
+    form = bundle.get("form", {})
+    records: List[QuestionRecord] = []
+    for stats in bundle.get("questions", []):
+        atype = detect_type_from_aggregates(stats)
+        if atype == "text":
+            sample = [k for k, _ in (stats.get("top_values") or [])[:30]]
+        else:
+            sample = [k for k, _ in stats.get("top_values") or []]
+        records.append(QuestionRecord(label=stats.get("question"), answers=sample, answer_type=atype, aggregates=stats))
+    return form.get("title") or "", form.get("description") or "", records
+
+
 def generate_dashboard(
     form_id: str,
     *,
     fragment: bool = False,
     use_llm: bool = True,
+    chart_data: str = "auto",
+    aggregation: str = "client",
+    llm_client: Optional[OpenAI] = None,
+    columnar: Optional[Path] = None,
+    snapshot: Optional[str] = None,
+    tile_init: str = "lazy",
+    segments: Optional[Dict[str, Any]] = None,
+    crosstabs: Optional[List[Tuple[str, str, Optional[str]]]] = None,
 ) -> DashboardRender:
-    """Render the dashboard HTML string along with handy metadata."""
-    title, description, records = load_grouped_from_retrieve(form_id)
+    """Render the dashboard HTML string along with handy metadata.
+
+    chart_data: "raw" embeds every numeric answer for client-side binning,
+    "aggregated" emits pre-binned traces, "auto" picks by answer count.
+    aggregation: "client" downloads every answer; "pushdown" has Postgres
+    aggregate via RPC (falls back to client if the function is unavailable).
+    llm_client: reuse an existing OpenAI client (batch workers) instead of creating one.
+    columnar: read answers from a columnar_export.py export instead of Supabase.
+    snapshot: "sync" / "offline" read through the local snapshot store (client aggregation).
+    tile_init: "lazy" plots tiles as they scroll into view, "eager" plots all on load.
+    segments: only count respondents matching these filters, e.g.
+    {"Role": ["Manager"], "Rating": {"min": 4}} (see respondents.parse_segments).
+    crosstabs: extra (question, by, chart or None) tiles, e.g. ("Rating", "Role", None).
+    Segments and crosstabs join answers per respondent, so they need the full
+    answers: client aggregation, no columnar export.
+    """
+    if segments or crosstabs:
+        if columnar is not None or aggregation == "pushdown":
+            raise ValueError("Segments and crosstabs need client aggregation from Supabase or a snapshot")
+        title, description, records = load_segmented_from_retrieve(
+            form_id, snapshot=snapshot, segments=segments, crosstabs=crosstabs
+        )
+    elif columnar is not None:
+        title, description, records = load_grouped_from_columnar(columnar)
+    elif aggregation == "pushdown":
+        try:
+            title, description, records = load_aggregated_from_rpc(form_id)
+        except Exception as exc:
+            print(f"⚠️ Pushdown aggregation unavailable ({exc}); falling back to client-side", file=sys.stderr)
+            title, description, records = load_grouped_from_retrieve(form_id, snapshot=snapshot)
+    else:
+        title, description, records = load_grouped_from_retrieve(form_id, snapshot=snapshot)
 
-    client = init_llm() if use_llm else None
+    save_type_cache()
+
+    client = (llm_client or init_llm()) if use_llm else None
     specs: List[ChartSpec] = []
     for rec in records:
+        if rec.figure is not None:
+            specs.append(ChartSpec(rec.answer_type, rec.label, "", "2x2" if rec.answer_type == "heatmap" else "2x1", {}))
+            continue
         spec = ask_llm(client, rec.label, rec.answer_type, rec.answers)
         if spec is None:
             spec = fallback_spec(rec.label, rec.answer_type)
         specs.append(spec)
 
-    tiles_html, scripts_js = build_tiles_html(
-        title,
-        description,
-        records,
-        specs,
-        include_header=not fragment,
-    )
+    with timing.span("build_tiles_html", tiles=len(records)):
+        tiles_html, scripts_js = build_tiles_html(
+            title,
+            description,
+            records,
+            specs,
+            include_header=not fragment,
+            chart_data=chart_data,
+            tile_init=tile_init,
+        )
 
-    rendered_html = (
-        html_fragment(tiles_html, scripts_js)
-        if fragment
-        else html_full_page(title, description, tiles_html, scripts_js)
-    )
+    with timing.span("assemble_html", fragment=fragment):
+        rendered_html = (
+            html_fragment(tiles_html, scripts_js)
+            if fragment
+            else html_full_page(title, description, tiles_html, scripts_js)
+        )
 
     return DashboardRender(
         html=rendered_html,
@@ -491,18 +988,54 @@ def generate_dashboard(
 def main(argv: Optional[List[str]] = None) -> None:
     import argparse
     p = argparse.ArgumentParser()
-    p.add_argument("--form-id", required=True, help="UUID of the form to render")
+    p.add_argument("--form-id", help="UUID of the form to render")
+    p.add_argument("--columnar", type=Path, help="Render from a columnar_export.py export instead of Supabase")
+    p.add_argument("--snapshot", choices=SNAPSHOT_MODES,
+                   help="Read answers via the local SQLite snapshot (sync: delta-sync first; offline: no network)")
     p.add_argument("--out", type=Path, help="Output path (HTML)")
     p.add_argument("--fragment", action="store_true", help="Emit themed tiles fragment (for in-page embedding)")
     p.add_argument("--no-llm", action="store_true", help="Force fallback (ignore LLM planning)")
     p.add_argument("--stdout", action="store_true", help="Write rendered HTML to stdout instead of a file")
+    p.add_argument("--chart-data", choices=agg.CHART_DATA_MODES, default="auto",
+                   help="Numeric charts: raw values, server-side aggregates, or auto by answer count")
+    p.add_argument("--aggregation", choices=AGGREGATION_MODES, default="client",
+                   help="client: fetch every answer; pushdown: aggregate in Postgres via RPC")
+    p.add_argument("--tile-init", choices=TILE_INIT_MODES, default="lazy",
+                   help="lazy: plot tiles as they scroll into view; eager: plot every tile on load")
+    p.add_argument("--segment", action="append", default=[], metavar="QUESTION=VALUE",
+                   help="Only count matching respondents: 'Role=Manager||Director' or 'Rating=4..5' (repeatable)")
+    p.add_argument("--crosstab", action="append", default=[], metavar="QUESTION::BY",
+                   help="Add a cross-question tile: 'Rating::Role', optionally '::heatmap' or '::grouped_bar' (repeatable)")
+    p.add_argument("--trace-file", type=Path, help="Write stage timings as a Chrome trace (chrome://tracing, Perfetto)")
     args = p.parse_args(argv)
+    if not args.form_id and not args.columnar:
+        p.error("--form-id is required unless --columnar is given")
+    if not args.form_id:
+        args.form_id = cx.read_manifest(args.columnar).get("form_id") or "export"
+    try:
+        segments = rs.parse_segments(args.segment)
+        crosstabs = rs.parse_crosstabs(args.crosstab)
+    except ValueError as exc:
+        p.error(str(exc))
+    if args.trace_file:
+        timing.enable()
+        timing.reset()
 
     render = generate_dashboard(
         args.form_id,
         fragment=args.fragment,
         use_llm=not args.no_llm,
+        chart_data=args.chart_data,
+        aggregation=args.aggregation,
+        columnar=args.columnar,
+        snapshot=args.snapshot,
+        tile_init=args.tile_init,
+        segments=segments,
+        crosstabs=crosstabs,
     )
+    if args.trace_file:
+        timing.write_chrome_trace(args.trace_file, process_name=f"bento {args.form_id}")
+        print(f"⏱️ Wrote trace: {args.trace_file}", file=sys.stderr)
 
     if args.stdout:
         output = render.html if render.html.endswith("\n") else f"{render.html}\n"
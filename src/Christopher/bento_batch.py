@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Render dashboards for many forms in one run, spread over a process pool.
+
+Usage:
+  # ids from a file (one per line, '#' comments allowed) → one HTML file per form
+  python bento_batch.py --form-ids forms.txt --out-dir ./dashboards
+
+  # ids from stdin → NDJSON payloads on stdout (same shape as bento_service.py)
+  cat forms.txt | python bento_batch.py --form-ids - --ndjson - --fragment
+
+Supabase and OpenAI calls from all workers go through shared limiters
+(max concurrent requests + minimum spacing), so the pool size only controls
+CPU parallelism. A per-form timing / failure summary goes to stderr and,
+with --summary, to a JSON file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import statistics
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TextIO
+
+import requests
+
+import bento
+import chart_aggregates as agg
+import retrieve_supabase2 as r2
+
+
+# =========================
+# Cross-process rate limiting
+# =========================
+
+class ProcessRateLimiter:
+    """Concurrency cap + minimum spacing between calls, shared by all pool workers.
+
+    Built on multiprocessing primitives, so it must reach workers through the
+    pool initializer (inherited), not as a task argument.
+    """
+
+    def __init__(self, max_concurrency: int, per_second: float):
+        self._slots = mp.BoundedSemaphore(max(1, max_concurrency))
+        self._next = mp.Value("d", 0.0)
+        self._interval = 1.0 / per_second if per_second > 0 else 0.0
+
+    def __enter__(self) -> "ProcessRateLimiter":
+        self._slots.acquire()
+        if self._interval:
+            # CLOCK_MONOTONIC is system-wide, so slots are comparable across processes
+            with self._next.get_lock():
+                now = time.monotonic()
+                slot = max(now, self._next.value)
+                self._next.value = slot + self._interval
+            if slot > now:
+                time.sleep(slot - now)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._slots.release()
+
+
+# =========================
+# Worker side
+# =========================
+
+_worker_llm_client = None
+
+
+def _init_worker(supabase_limiter: ProcessRateLimiter, llm_limiter: ProcessRateLimiter, use_llm: bool) -> None:
+    """Once per worker process: pooled HTTP session, shared limiters, one OpenAI client."""
+    global _worker_llm_client
+    r2.configure_http(requests.Session(), supabase_limiter)
+    bento.configure_llm(llm_limiter)
+    _worker_llm_client = bento.init_llm() if use_llm else None
+
+
+def render_one(form_id: str, options: Dict[str, Any], out_dir: Optional[str], submitted: float) -> Dict[str, Any]:
+    started = time.time()
+    result: Dict[str, Any] = {"form_id": form_id, "queued_s": round(started - submitted, 3)}
+    try:
+        render = bento.generate_dashboard(
+            form_id,
+            fragment=options["fragment"],
+            use_llm=options["use_llm"],
+            chart_data=options["chart_data"],
+            aggregation=options["aggregation"],
+            llm_client=_worker_llm_client,
+        )
+        payload = {
+            "success": True,
+            "title": render.title,
+            "description": render.description,
+            "question_count": render.question_count,
+            "fragment": options["fragment"],
+        }
+        if out_dir:
+            # Write here so large HTML isn't pickled back to the parent
+            name = f"dashboard_fragment_{form_id}.html" if options["fragment"] else f"dashboard_{form_id}.html"
+            path = Path(out_dir) / name
+            path.write_text(render.html, encoding="utf-8")
+            payload["path"] = str(path)
+        else:
+            payload["html"] = render.html
+        result.update(payload)
+    except Exception as exc:
+        result.update({"success": False, "error": str(exc), "traceback": traceback.format_exc(limit=3)})
+    result["elapsed_s"] = round(time.time() - started, 3)
+    return result
+
+
+# =========================
+# Parent side
+# =========================
+
+@dataclass
+class FormTiming:
+    form_id: str
+    success: bool
+    elapsed_s: float
+    queued_s: float
+    error: Optional[str] = None
+
+
+def read_form_ids(source: str) -> List[str]:
+    text = sys.stdin.read() if source == "-" else Path(source).read_text(encoding="utf-8")
+    seen: Dict[str, None] = {}
+    for line in text.splitlines():
+        form_id = line.split("#", 1)[0].strip()
+        if form_id:
+            seen.setdefault(form_id, None)
+    return list(seen)
+
+
+def summarize(timings: List[FormTiming], wall_s: float) -> Dict[str, Any]:
+    ok = [t.elapsed_s for t in timings if t.success]
+    ordered = sorted(ok)
+    def pct(p: float) -> Optional[float]:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else None
+    return {
+        "forms": len(timings),
+        "succeeded": len(ok),
+        "failed": len(timings) - len(ok),
+        "wall_s": round(wall_s, 3),
+        "render_s": {
+            "mean": round(statistics.fmean(ok), 3) if ok else None,
+            "p50": pct(0.5),
+            "p95": pct(0.95),
+            "max": ordered[-1] if ordered else None,
+        },
+        "slowest": [asdict(t) for t in sorted(timings, key=lambda t: t.elapsed_s, reverse=True)[:5]],
+        "failures": [asdict(t) for t in timings if not t.success],
+    }
+
+
+def print_summary(summary: Dict[str, Any], stream: TextIO = sys.stderr) -> None:
+    r = summary["render_s"]
+    print(
+        f"✅ {summary['succeeded']}/{summary['forms']} dashboards in {summary['wall_s']}s "
+        f"(render mean={r['mean']}s p50={r['p50']}s p95={r['p95']}s max={r['max']}s)",
+        file=stream,
+    )
+    for t in summary["slowest"]:
+        print(f"   ⏱️ {t['form_id']}: {t['elapsed_s']}s (queued {t['queued_s']}s)", file=stream)
+    for t in summary["failures"]:
+        print(f"   ❌ {t['form_id']}: {t['error']}", file=stream)
+
+
+def run_batch(
+    form_ids: List[str],
+    options: Dict[str, Any],
+    *,
+    out_dir: Optional[Path],
+    ndjson: Optional[TextIO],
+    workers: int,
+    supabase_limiter: ProcessRateLimiter,
+    llm_limiter: ProcessRateLimiter,
+) -> Dict[str, Any]:
+    if out_dir:
+        out_dir.mkdir(parents=True, exist_ok=True)
+    timings: List[FormTiming] = []
+    t0 = time.time()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(supabase_limiter, llm_limiter, options["use_llm"]),
+    ) as pool:
+        futures = [
+            pool.submit(render_one, form_id, options, str(out_dir) if out_dir else None, time.time())
+            for form_id in form_ids
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            timings.append(FormTiming(
+                form_id=result["form_id"],
+                success=result["success"],
+                elapsed_s=result["elapsed_s"],
+                queued_s=result["queued_s"],
+                error=result.get("error"),
+            ))
+            if ndjson is not None:
+                ndjson.write(json.dumps(result, ensure_ascii=False) + "\n")
+                ndjson.flush()
+    return summarize(timings, time.time() - t0)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Render Bento dashboards for many forms across a process pool")
+    p.add_argument("--form-ids", required=True, help="File with one form id per line, or '-' for stdin")
+    p.add_argument("--out-dir", type=Path, help="Write one HTML file per form into this directory")
+    p.add_argument("--ndjson", help="Write one JSON result per line to this file, or '-' for stdout")
+    p.add_argument("--summary", type=Path, help="Also write the timing/failure summary as JSON")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes (default: CPU count)")
+    p.add_argument("--fragment", action="store_true", help="Emit themed tiles fragments")
+    p.add_argument("--no-llm", action="store_true", help="Force fallback charts (skip OpenAI planning)")
+    p.add_argument("--chart-data", choices=agg.CHART_DATA_MODES, default="auto")
+    p.add_argument("--aggregation", choices=bento.AGGREGATION_MODES, default="client")
+    p.add_argument("--supabase-concurrency", type=int, default=8, help="Max in-flight Supabase requests across workers")
+    p.add_argument("--supabase-rps", type=float, default=20.0, help="Max Supabase requests per second across workers")
+    p.add_argument("--llm-concurrency", type=int, default=4, help="Max in-flight OpenAI requests across workers")
+    p.add_argument("--llm-rps", type=float, default=5.0, help="Max OpenAI requests per second across workers")
+    args = p.parse_args(argv)
+
+    if not args.out_dir and not args.ndjson:
+        p.error("Pass --out-dir and/or --ndjson")
+
+    form_ids = read_form_ids(args.form_ids)
+    if not form_ids:
+        raise SystemExit("No form ids provided. Aborting.")
+
+    options = {
+        "fragment": args.fragment,
+        "use_llm": not args.no_llm,
+        "chart_data": args.chart_data,
+        "aggregation": args.aggregation,
+    }
+    ndjson_stream: Optional[TextIO] = None
+    if args.ndjson == "-":
+        ndjson_stream = sys.stdout
+    elif args.ndjson:
+        ndjson_stream = open(args.ndjson, "w", encoding="utf-8")
+
+    try:
+        summary = run_batch(
+            form_ids,
+            options,
+            out_dir=args.out_dir,
+            ndjson=ndjson_stream,
+            workers=max(1, min(args.workers, len(form_ids))),
+            supabase_limiter=ProcessRateLimiter(args.supabase_concurrency, args.supabase_rps),
+            llm_limiter=ProcessRateLimiter(args.llm_concurrency, args.llm_rps),
+        )
+    finally:
+        if ndjson_stream is not None and ndjson_stream is not sys.stdout:
+            ndjson_stream.close()
+
+    print_summary(summary)
+    if args.summary:
+        args.summary.write_text(json.dumps(summary, indent=2), encoding="utf-8")
+    if summary["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,8 @@ from __future__ import annotations
 import argparse
 import json
 import sys
-from typing import Any, Dict
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 from pathlib import Path
 
@@ -13,7 +14,13 @@ SRC_DIR = CURRENT_DIR.parent
 if str(SRC_DIR) not in sys.path:
     sys.path.insert(0, str(SRC_DIR))
 
-from Christopher.bento import DashboardRender, generate_dashboard
+from Christopher.bento import AGGREGATION_MODES, SNAPSHOT_MODES, DashboardRender, generate_dashboard
+from Christopher.chart_aggregates import CHART_DATA_MODES
+from Christopher.respondents import parse_crosstabs, parse_segments
+from Christopher import render_cache
+
+# Flat import on purpose: bento and retrieve_supabase2 record spans into this module object
+import timing
 
 
 def render_to_payload(render: DashboardRender, fragment: bool) -> Dict[str, Any]:
@@ -27,18 +34,137 @@ def render_to_payload(render: DashboardRender, fragment: bool) -> Dict[str, Any]
     }
 
 
+def render_with_cache(
+    form_id: str,
+    *,
+    fragment: bool,
+    use_llm: bool,
+    chart_data: str,
+    aggregation: str,
+    snapshot: Optional[str] = None,
+    segments: Optional[Dict[str, Any]] = None,
+    crosstabs: Optional[List[Tuple[str, str, Optional[str]]]] = None,
+    if_none_match: Optional[str] = None,
+    if_modified_since: Optional[str] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """Serve from the render cache when the freshness probe says nothing changed.
+
+    Returns the usual payload plus etag/last_modified/cached, or
+    {"success": True, "not_modified": True, ...} when the caller's
+    If-None-Match / If-Modified-Since validators still hold.
+    """
+    def render() -> Dict[str, Any]:
+        with timing.span("generate_dashboard", form_id=form_id):
+            render = generate_dashboard(
+                form_id,
+                fragment=fragment,
+                use_llm=use_llm,
+                chart_data=chart_data,
+                aggregation=aggregation,
+                snapshot=snapshot,
+                segments=segments,
+                crosstabs=crosstabs,
+            )
+        return render_to_payload(render, fragment)
+
+    # The freshness probe needs the network, so offline renders bypass the cache
+    if not use_cache or snapshot == "offline":
+        return {**render(), "cached": False}
+
+    try:
+        with timing.span("render_cache.probe", "cache"):
+            fingerprint = render_cache.probe_fingerprint(form_id)
+            etag = render_cache.etag_for(fingerprint)
+    except Exception as exc:
+        print(f"⚠️ Freshness probe failed ({exc}); rendering without cache", file=sys.stderr)
+        return {**render(), "cached": False}
+
+    key = render_cache.options_key(
+        form_id, fragment=fragment, llm=use_llm, chart_data=chart_data, aggregation=aggregation, snapshot=snapshot,
+        segments=segments, crosstabs=crosstabs,
+    )
+    entry = render_cache.load(key)
+    fresh = entry is not None and entry.etag == etag
+
+    if fresh:
+        since = render_cache.parse_http_date(if_modified_since)
+        client_current = (
+            etag in [t.strip() for t in if_none_match.split(",")]
+            if if_none_match
+            else since is not None and int(entry.last_modified) <= since
+        )
+        headers = {"etag": etag, "last_modified": render_cache.http_date(entry.last_modified)}
+        if client_current:
+            return {"success": True, "not_modified": True, **headers}
+        return {**entry.payload, **headers, "cached": True}
+
+    payload = render()
+    # The render may have persisted type detections / theme models: key the entry on the state it leaves
+    etag = render_cache.etag_for(fingerprint)
+    now = time.time()
+    render_cache.save(key, render_cache.CachedRender(etag=etag, last_modified=now, created=now, payload=payload))
+    return {**payload, "etag": etag, "last_modified": render_cache.http_date(now), "cached": False}
+
+
 def main(argv: None | list[str] = None) -> None:
     parser = argparse.ArgumentParser(description="Generate Bento dashboard JSON payload")
     parser.add_argument("--form-id", required=True, help="UUID of the form to render")
     parser.add_argument("--fragment", action="store_true", help="Emit themed tiles fragment instead of full page")
     parser.add_argument("--no-llm", action="store_true", help="Force fallback charts (skip OpenAI planning)")
+    parser.add_argument(
+        "--chart-data",
+        choices=CHART_DATA_MODES,
+        default="auto",
+        help="Numeric charts: raw values, server-side aggregates, or auto by answer count",
+    )
+    parser.add_argument(
+        "--aggregation",
+        choices=AGGREGATION_MODES,
+        default="client",
+        help="client: fetch every answer; pushdown: aggregate in Postgres via RPC",
+    )
+    parser.add_argument(
+        "--snapshot",
+        choices=SNAPSHOT_MODES,
+        help="Read answers via the local SQLite snapshot (sync: delta-sync first; offline: no network)",
+    )
+    parser.add_argument(
+        "--segment",
+        action="append",
+        default=[],
+        help="Only count matching respondents: 'Role=Manager||Director' or 'Rating=4..5' (repeatable)",
+    )
+    parser.add_argument(
+        "--crosstab",
+        action="append",
+        default=[],
+        help="Add a cross-question tile: 'Rating::Role', optionally '::heatmap' or '::grouped_bar' (repeatable)",
+    )
+    parser.add_argument("--if-none-match", help="ETag from a previous payload; reply not_modified if unchanged")
+    parser.add_argument("--if-modified-since", help="HTTP date from a previous payload's last_modified")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the freshness probe and render cache")
+    parser.add_argument("--no-timings", action="store_true", help="Do not record stage timings (omits the timings key)")
+    parser.add_argument("--trace-file", type=Path, help="Also write stage timings as a Chrome trace JSON file")
     args = parser.parse_args(argv)
 
+    timing.enable(not args.no_timings)
+    timing.reset()
     try:
-        render = generate_dashboard(
+        segments = parse_segments(args.segment)
+        crosstabs = parse_crosstabs(args.crosstab)
+        payload = render_with_cache(
             args.form_id,
             fragment=args.fragment,
             use_llm=not args.no_llm,
+            chart_data=args.chart_data,
+            aggregation=args.aggregation,
+            snapshot=args.snapshot,
+            segments=segments,
+            crosstabs=crosstabs,
+            if_none_match=args.if_none_match,
+            if_modified_since=args.if_modified_since,
+            use_cache=not args.no_cache,
         )
     except Exception as exc:  # pragma: no cover - surfaced to caller
         payload = {"success": False, "error": str(exc)}
@@ -46,7 +172,12 @@ def main(argv: None | list[str] = None) -> None:
         sys.stdout.write("\n")
         sys.exit(1)
 
-    json.dump(render_to_payload(render, args.fragment), sys.stdout)
+    if timing.is_enabled():
+        payload["timings"] = timing.summary()
+        if args.trace_file:
+            timing.write_chrome_trace(args.trace_file, process_name=f"bento_service {args.form_id}")
+
+    json.dump(payload, sys.stdout)
     sys.stdout.write("\n")
 
 
@@ -0,0 +1,230 @@
+"""Server-side aggregation of numeric answers into compact Plotly traces.
+
+Raw mode embeds every answer in the generated JS and lets the browser bin it.
+The helpers here do the binning / quartiles / KDE in NumPy instead, so the
+emitted trace size depends on the number of bins, not the number of answers.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+# Above this many numeric answers, "auto" mode switches to aggregated traces.
+AGGREGATE_THRESHOLD = 2000
+MAX_OUTLIERS = 100
+KDE_GRID_POINTS = 128
+KDE_BINS = 512
+
+CHART_DATA_MODES = ("auto", "raw", "aggregated")
+
+
+def use_aggregated(mode: str, n_values: int) -> bool:
+    if mode == "aggregated":
+        return True
+    if mode == "raw":
+        return False
+    return n_values > AGGREGATE_THRESHOLD
+
+
+def _compact(arr: np.ndarray) -> List[float]:
+    """Round to 6 significant digits so the JSON stays short."""
+    return [float(f"{x:.6g}") for x in arr.tolist()]
+
+
+def _num(x: float) -> float:
+    return float(f"{float(x):.6g}")
+
+
+def as_array(values: Sequence[float]) -> np.ndarray:
+    arr = np.asarray(values, dtype=float)
+    return arr[np.isfinite(arr)]
+
+
+def histogram_traces(values: np.ndarray, bins: int) -> List[Dict[str, Any]]:
+    if values.size == 0:
+        return [{"x": [], "y": [], "type": "bar"}]
+    counts, edges = np.histogram(values, bins=bins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return [{
+        "x": _compact(centers),
+        "y": counts.tolist(),
+        "width": _compact(np.diff(edges)),
+        "type": "bar",
+        "hovertemplate": "%{x}: %{y}<extra></extra>",
+    }]
+
+
+def box_summary(values: np.ndarray) -> Dict[str, Any]:
+    """Tukey box statistics plus a capped sample of outliers."""
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    lo_fence, hi_fence = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    inside = values[(values >= lo_fence) & (values <= hi_fence)]
+    outliers = np.unique(values[(values < lo_fence) | (values > hi_fence)])
+    if outliers.size > MAX_OUTLIERS:
+        # Keep the extremes and an even spread in between
+        idx = np.linspace(0, outliers.size - 1, MAX_OUTLIERS).round().astype(int)
+        outliers = outliers[idx]
+    return {
+        "q1": _num(q1),
+        "median": _num(median),
+        "q3": _num(q3),
+        "lowerfence": _num(inside.min() if inside.size else q1),
+        "upperfence": _num(inside.max() if inside.size else q3),
+        "mean": _num(values.mean()),
+        "outliers": _compact(outliers),
+        "count": int(values.size),
+    }
+
+
+def _precomputed_box_trace(summary: Dict[str, Any], **extra: Any) -> Dict[str, Any]:
+    trace = {
+        "type": "box",
+        "q1": [summary["q1"]],
+        "median": [summary["median"]],
+        "q3": [summary["q3"]],
+        "lowerfence": [summary["lowerfence"]],
+        "upperfence": [summary["upperfence"]],
+        "mean": [summary["mean"]],
+        "x": [0],
+        "name": "",
+        "boxpoints": False,
+    }
+    trace.update(extra)
+    return trace
+
+
+def _outlier_trace(summary: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "scatter",
+        "mode": "markers",
+        "x": [0] * len(summary["outliers"]),
+        "y": summary["outliers"],
+        "marker": {"size": 4},
+        "name": "outliers",
+        "hoverinfo": "y",
+    }
+
+
+def box_traces(values: np.ndarray) -> List[Dict[str, Any]]:
+    if values.size == 0:
+        return [{"y": [], "type": "box"}]
+    summary = box_summary(values)
+    return [_precomputed_box_trace(summary), _outlier_trace(summary)]
+
+
+def kde_grid(values: np.ndarray, points: int = KDE_GRID_POINTS) -> Dict[str, List[float]]:
+    """Gaussian KDE (Scott bandwidth) via binning + convolution: O(n + bins), not O(n * grid).
+
+    Expects values with a nonzero spread; violin_traces handles constant input.
+    """
+    lo, hi = float(values.min()), float(values.max())
+    std = float(values.std())
+    bandwidth = 1.06 * std * values.size ** (-1 / 5) if std > 0 else max(abs(lo), 1.0) * 0.05
+    lo, hi = lo - 3 * bandwidth, hi + 3 * bandwidth
+    counts, edges = np.histogram(values, bins=KDE_BINS, range=(lo, hi))
+    step = edges[1] - edges[0]
+    # Kernel no longer than the bins, so mode="same" keeps len(density) == KDE_BINS
+    half = min(int(np.ceil(4 * bandwidth / step)), (KDE_BINS - 1) // 2)
+    offsets = np.arange(-half, half + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    density = np.convolve(counts, kernel, mode="same")
+    density /= density.sum() * step
+    centers = (edges[:-1] + edges[1:]) / 2
+    grid = np.linspace(lo, hi, points)
+    return {"grid": _compact(grid), "density": _compact(np.interp(grid, centers, density))}
+
+
+def violin_traces(values: np.ndarray) -> List[Dict[str, Any]]:
+    if values.size == 0:
+        return [{"y": [], "type": "violin"}]
+    summary = box_summary(values)
+    if values.min() == values.max():
+        # No spread to estimate a density from: the box (a line at the value) is the whole story
+        return [_precomputed_box_trace(summary, width=0.1), _outlier_trace(summary)]
+    kde = kde_grid(values)
+    density = np.asarray(kde["density"])
+    half_width = 0.4 * density / density.max() if density.max() > 0 else density
+    grid = kde["grid"]
+    outline = {
+        "type": "scatter",
+        "mode": "lines",
+        "x": _compact(np.concatenate([half_width, -half_width[::-1]])),
+        "y": grid + grid[::-1],
+        "fill": "toself",
+        "name": "density",
+        "hoverinfo": "skip",
+        "line": {"width": 1},
+    }
+    return [outline, _precomputed_box_trace(summary, width=0.1), _outlier_trace(summary)]
+
+
+# ---- Traces from aggregates computed elsewhere (e.g. the Postgres RPC) ----
+
+def bucket_counts(buckets: Sequence[Sequence[int]], bins: int) -> np.ndarray:
+    """[[bucket (1-based), count], ...] as returned by width_bucket → dense counts array."""
+    counts = np.zeros(bins, dtype=int)
+    for bucket, count in buckets or []:
+        counts[min(max(int(bucket), 1), bins) - 1] += int(count)
+    return counts
+
+
+def histogram_traces_from_counts(lo: float, hi: float, counts: np.ndarray) -> List[Dict[str, Any]]:
+    if hi <= lo:
+        # Single distinct value: one bar
+        return [{"x": [_num(lo)], "y": [int(counts.sum())], "type": "bar", "hovertemplate": "%{x}: %{y}<extra></extra>"}]
+    edges = np.linspace(lo, hi, counts.size + 1)
+    centers = (edges[:-1] + edges[1:]) / 2
+    return [{
+        "x": _compact(centers),
+        "y": counts.tolist(),
+        "width": _compact(np.diff(edges)),
+        "type": "bar",
+        "hovertemplate": "%{x}: %{y}<extra></extra>",
+    }]
+
+
+def _rounded_summary(summary: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: _num(summary[k]) for k in ("q1", "median", "q3", "lowerfence", "upperfence", "mean")}
+    out["outliers"] = _compact(np.asarray(summary.get("outliers") or [], dtype=float))
+    out["count"] = int(summary.get("count") or 0)
+    return out
+
+
+def box_traces_from_summary(summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+    summary = _rounded_summary(summary)
+    return [_precomputed_box_trace(summary), _outlier_trace(summary)]
+
+
+def violin_traces_from_counts(lo: float, hi: float, counts: np.ndarray, summary: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Violin outline approximated from histogram counts (smoothed), plus the box summary."""
+    summary = _rounded_summary(summary)
+    if hi <= lo or counts.sum() == 0:
+        return [_precomputed_box_trace(summary, width=0.1), _outlier_trace(summary)]
+    kernel = np.array([1.0, 2.0, 3.0, 2.0, 1.0])
+    density = np.convolve(counts.astype(float), kernel / kernel.sum(), mode="same")
+    half_width = 0.4 * density / density.max()
+    edges = np.linspace(lo, hi, counts.size + 1)
+    grid = _compact((edges[:-1] + edges[1:]) / 2)
+    outline = {
+        "type": "scatter",
+        "mode": "lines",
+        "x": _compact(np.concatenate([half_width, -half_width[::-1]])),
+        "y": grid + grid[::-1],
+        "fill": "toself",
+        "name": "density",
+        "hoverinfo": "skip",
+        "line": {"width": 1},
+    }
+    return [outline, _precomputed_box_trace(summary, width=0.1), _outlier_trace(summary)]
+
+
+def numeric_traces(chart_type: str, values: Sequence[float], bins: int = 20) -> List[Dict[str, Any]]:
+    arr = as_array(values)
+    if chart_type == "box":
+        return box_traces(arr)
+    if chart_type == "violin":
+        return violin_traces(arr)
+    return histogram_traces(arr, bins)
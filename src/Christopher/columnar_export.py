@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Typed columnar export of a form: one row per answer, written in streaming row
+groups and reloadable via memory-mapping.
+
+Usage:
+  # NumPy column directory (no extra dependencies)
+  python columnar_export.py --form-id <UUID> --out ./form_<UUID>.cols
+
+  # Parquet (requires pyarrow)
+  python columnar_export.py --form-id <UUID> --out ./form_<UUID>.parquet --format parquet
+
+Columns: question_id, answer_id, user_name, kind, value_num, value_text.
+`kind` says which value column holds the typed answer (after the same
+coercion as bundle_to_grouped_by_question):
+  0 null | 1 float | 2 int | 3 bool | 4 text | 5 JSON (lists, objects, big ints)
+
+"columnar" layout (a directory):
+  manifest.json                    form title/description, questions + row ranges
+  question_idx.i4 / kind.i1 / value_num.f8          fixed-width little-endian
+  <name>.offsets.i8 + <name>.utf8  strings (answer_id, user_name, value_text),
+                                   Arrow-style: n+1 offsets into one UTF-8 blob,
+  <name>.nulls.u1                  plus one null-flag byte per row
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import retrieve_supabase2 as r2
+
+# Optional Parquet support
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except Exception:  # pragma: no cover
+    pa = None  # type: ignore
+    pq = None  # type: ignore
+
+ROW_GROUP_SIZE = 50_000
+FORMATS = ("columnar", "parquet")
+MANIFEST_VERSION = 1
+
+KIND_NULL, KIND_FLOAT, KIND_INT, KIND_BOOL, KIND_TEXT, KIND_JSON = range(6)
+_MAX_EXACT_INT = 2 ** 53
+
+FIXED_COLUMNS = {"question_idx": "<i4", "kind": "i1", "value_num": "<f8"}
+STRING_COLUMNS = ("answer_id", "user_name", "value_text")
+
+
+# =========================
+# Encoding
+# =========================
+
+def encode_value(value: Any) -> Tuple[int, float, Optional[str]]:
+    """Typed answer → (kind, value_num, value_text)."""
+    if value is None:
+        return KIND_NULL, math.nan, None
+    if isinstance(value, bool):
+        return KIND_BOOL, float(value), None
+    if isinstance(value, float):
+        return KIND_FLOAT, value, None
+    if isinstance(value, int) and abs(value) <= _MAX_EXACT_INT:
+        return KIND_INT, float(value), None
+    if isinstance(value, str):
+        return KIND_TEXT, math.nan, value
+    return KIND_JSON, math.nan, json.dumps(value, ensure_ascii=False)
+
+
+def decode_value(kind: int, num: float, text: Optional[str]) -> Any:
+    if kind == KIND_FLOAT:
+        return num
+    if kind == KIND_INT:
+        return int(num)
+    if kind == KIND_BOOL:
+        return bool(num)
+    if kind == KIND_TEXT:
+        return text
+    if kind == KIND_JSON:
+        return json.loads(text)
+    return None
+
+
+def iter_answer_rows(config: r2.SupabaseConfig, questions: List[Dict[str, Any]], page_size: int = 1000) -> Iterable[Dict[str, Any]]:
+    """Stream typed rows question by question, page by page (never the whole form in memory)."""
+    for idx, q in enumerate(questions):
+        coerce = r2.compile_coercer(q.get("type_answer"))
+        for page in r2.iter_answer_pages_for_question(config, q["question_id"], page_size=page_size):
+            for a in page:
+                pa_ = r2._parse_answer_payload(a.get("answer"))
+                yield {
+                    "question_idx": idx,
+                    "answer_id": a.get("answer_id"),
+                    "user_name": pa_.get("userName"),
+                    "value": coerce(pa_.get("response")),
+                }
+
+
+def _chunks(rows: Iterable[Dict[str, Any]], size: int) -> Iterable[List[Dict[str, Any]]]:
+    chunk: List[Dict[str, Any]] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _row_group_arrays(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    encoded = [encode_value(r["value"]) for r in rows]
+    return {
+        "question_idx": np.fromiter((r["question_idx"] for r in rows), dtype="<i4", count=len(rows)),
+        "kind": np.fromiter((e[0] for e in encoded), dtype="i1", count=len(rows)),
+        "value_num": np.fromiter((e[1] for e in encoded), dtype="<f8", count=len(rows)),
+        "answer_id": [r["answer_id"] for r in rows],
+        "user_name": [None if r["user_name"] is None else str(r["user_name"]) for r in rows],
+        "value_text": [e[2] for e in encoded],
+    }
+
+
+# =========================
+# Writers
+# =========================
+
+class ColumnarDirWriter:
+    """Appends row groups to per-column files; strings as offsets + UTF-8 blob."""
+
+    def __init__(self, out_dir: Path):
+        self.out_dir = out_dir
+        out_dir.mkdir(parents=True, exist_ok=True)
+        self.rows = 0
+        self._fixed = {name: open(out_dir / f"{name}.{dt.lstrip('<')}", "wb") for name, dt in FIXED_COLUMNS.items()}
+        self._blobs = {name: open(out_dir / f"{name}.utf8", "wb") for name in STRING_COLUMNS}
+        self._offsets = {name: open(out_dir / f"{name}.offsets.i8", "wb") for name in STRING_COLUMNS}
+        self._nulls = {name: open(out_dir / f"{name}.nulls.u1", "wb") for name in STRING_COLUMNS}
+        self._blob_size = {name: 0 for name in STRING_COLUMNS}
+        for f in self._offsets.values():
+            f.write(np.zeros(1, dtype="<i8").tobytes())
+
+    def write_row_group(self, arrays: Dict[str, Any]) -> None:
+        for name, dt in FIXED_COLUMNS.items():
+            self._fixed[name].write(np.ascontiguousarray(arrays[name], dtype=dt).tobytes())
+        for name in STRING_COLUMNS:
+            values = arrays[name]
+            encoded = [b"" if v is None else v.encode("utf-8") for v in values]
+            self._nulls[name].write(np.fromiter((v is None for v in values), dtype="u1", count=len(values)).tobytes())
+            lengths = np.fromiter((len(b) for b in encoded), dtype="<i8", count=len(encoded))
+            offsets = self._blob_size[name] + np.cumsum(lengths)
+            self._offsets[name].write(offsets.tobytes())
+            self._blobs[name].write(b"".join(encoded))
+            self._blob_size[name] = int(offsets[-1]) if len(offsets) else self._blob_size[name]
+        self.rows += len(arrays["kind"])
+
+    def close(self, manifest: Dict[str, Any]) -> None:
+        for f in [*self._fixed.values(), *self._blobs.values(), *self._offsets.values(), *self._nulls.values()]:
+            f.close()
+        manifest = {**manifest, "version": MANIFEST_VERSION, "rows": self.rows}
+        (self.out_dir / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+class ParquetFileWriter:
+    def __init__(self, path: Path, question_ids: List[str]):
+        if pq is None:
+            raise RuntimeError("pyarrow is not installed; use --format columnar")
+        self.path = path
+        self.rows = 0
+        self._question_ids = pa.array(question_ids, type=pa.string())
+        self._schema = pa.schema([
+            ("question_id", pa.dictionary(pa.int32(), pa.string())),
+            ("answer_id", pa.string()),
+            ("user_name", pa.string()),
+            ("kind", pa.int8()),
+            ("value_num", pa.float64()),
+            ("value_text", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(str(path), self._schema)
+
+    def write_row_group(self, arrays: Dict[str, Any]) -> None:
+        table = pa.table({
+            "question_id": pa.DictionaryArray.from_arrays(pa.array(arrays["question_idx"], type=pa.int32()), self._question_ids),
+            "answer_id": pa.array(arrays["answer_id"], type=pa.string()),
+            "user_name": pa.array(arrays["user_name"], type=pa.string()),
+            "kind": pa.array(arrays["kind"], type=pa.int8()),
+            "value_num": pa.array(arrays["value_num"], type=pa.float64()),
+            "value_text": pa.array(arrays["value_text"], type=pa.string()),
+        }, schema=self._schema)
+        self._writer.write_table(table)  # one call = one row group
+        self.rows += table.num_rows
+
+    def close(self, manifest: Dict[str, Any]) -> None:
+        self._writer.close()
+        # Parquet footers are immutable once written; keep the manifest alongside
+        manifest = {**manifest, "version": MANIFEST_VERSION, "rows": self.rows}
+        Path(f"{self.path}.manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def export_form(
+    config: r2.SupabaseConfig,
+    form_id: str,
+    out_path: Path,
+    fmt: str = "columnar",
+    row_group_size: int = ROW_GROUP_SIZE,
+    page_size: int = 1000,
+) -> Dict[str, Any]:
+    form = r2.fetch_form_by_id(config, form_id)
+    questions = [q for q in r2.fetch_questions_for_form(config, form_id, page_size=page_size) if q.get("question_id")]
+    question_ids = [q["question_id"] for q in questions]
+    writer = ParquetFileWriter(out_path, question_ids) if fmt == "parquet" else ColumnarDirWriter(out_path)
+
+    # Rows arrive grouped by question, so each question is one contiguous range
+    counts = [0] * len(questions)
+    for chunk in _chunks(iter_answer_rows(config, questions, page_size=page_size), row_group_size):
+        arrays = _row_group_arrays(chunk)
+        for idx, n in zip(*np.unique(arrays["question_idx"], return_counts=True)):
+            counts[int(idx)] += int(n)
+        writer.write_row_group(arrays)
+
+    starts = np.concatenate([[0], np.cumsum(counts)]).astype(int).tolist()
+    manifest = {
+        "form_id": form_id,
+        "title": form.get("title"),
+        "description": form.get("description"),
+        "exported_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "questions": [
+            {
+                "question_id": q["question_id"],
+                "question": q.get("question"),
+                "type_answer": q.get("type_answer"),
+                "rows": [starts[i], starts[i + 1]],
+            }
+            for i, q in enumerate(questions)
+        ],
+    }
+    writer.close(manifest)
+    return {**manifest, "rows": writer.rows}
+
+
+# =========================
+# Memory-mapped reader
+# =========================
+
+class ColumnarTable:
+    """Read side of a column directory; every column is an np.memmap (no upfront parsing)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.manifest = read_manifest(path)
+        self.num_rows = int(self.manifest["rows"])
+        self.columns = {
+            name: self._memmap(path / f"{name}.{dt.lstrip('<')}", dt, self.num_rows)
+            for name, dt in FIXED_COLUMNS.items()
+        }
+        self._offsets = {name: self._memmap(path / f"{name}.offsets.i8", "<i8", self.num_rows + 1) for name in STRING_COLUMNS}
+        self._blobs = {name: self._memmap(path / f"{name}.utf8", "u1", None) for name in STRING_COLUMNS}
+        self._nulls = {name: self._memmap(path / f"{name}.nulls.u1", "u1", self.num_rows) for name in STRING_COLUMNS}
+
+    @staticmethod
+    def _memmap(path: Path, dtype: str, count: Optional[int]) -> np.ndarray:
+        if count == 0 or path.stat().st_size == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(count,) if count is not None else None)
+
+    def strings(self, name: str, start: int, end: int) -> List[Optional[str]]:
+        offsets = np.asarray(self._offsets[name][start:end + 1])
+        if end <= start:
+            return []
+        raw = bytes(self._blobs[name][offsets[0]:offsets[-1]])
+        rel = (offsets - offsets[0]).tolist()
+        text = raw.decode("utf-8")
+        if len(text) == len(raw):
+            # Pure ASCII: byte offsets are character offsets, slice the decoded str
+            out: List[Optional[str]] = [text[a:b] for a, b in zip(rel, rel[1:])]
+        else:
+            out = [raw[a:b].decode("utf-8") for a, b in zip(rel, rel[1:])]
+        for i in np.flatnonzero(self._nulls[name][start:end]).tolist():
+            out[i] = None
+        return out
+
+    def typed_values(self, start: int, end: int) -> List[Any]:
+        kinds = np.asarray(self.columns["kind"][start:end])
+        nums = np.asarray(self.columns["value_num"][start:end])
+        # Start from the float column (one vectorized conversion), then patch other kinds by mask
+        out: List[Any] = nums.tolist()
+        for i in np.flatnonzero(kinds == KIND_NULL).tolist():
+            out[i] = None
+        for i in np.flatnonzero(kinds == KIND_INT).tolist():
+            out[i] = int(out[i])
+        for i in np.flatnonzero(kinds == KIND_BOOL).tolist():
+            out[i] = bool(out[i])
+        text_idx = np.flatnonzero(kinds == KIND_TEXT).tolist()
+        json_idx = np.flatnonzero(kinds == KIND_JSON).tolist()
+        if text_idx or json_idx:
+            texts = self.strings("value_text", start, end)
+            for i in text_idx:
+                out[i] = texts[i]
+            for i in json_idx:
+                out[i] = json.loads(texts[i])
+        return out
+
+
+def _parquet_table(path: Path):
+    if pq is None:
+        raise RuntimeError("pyarrow is not installed; cannot read Parquet exports")
+    return pq.read_table(str(path), memory_map=True)
+
+
+def read_manifest(path: Path) -> Dict[str, Any]:
+    path = Path(path)
+    manifest_path = path / "manifest.json" if path.is_dir() else Path(f"{path}.manifest.json")
+    return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+
+def load_grouped(path: Path) -> Dict[str, Any]:
+    """Same shape as bundle_to_grouped_by_question, from a columnar or Parquet export."""
+    path = Path(path)
+    if path.is_dir():
+        table = ColumnarTable(path)
+        manifest = table.manifest
+        values = lambda a, b: table.typed_values(a, b)
+    else:
+        manifest = read_manifest(path)
+        pt = _parquet_table(path)
+        kinds = pt.column("kind").to_numpy()
+        nums = pt.column("value_num").to_numpy()
+        texts = pt.column("value_text")
+        values = lambda a, b: [
+            decode_value(k, n, t)
+            for k, n, t in zip(kinds[a:b].tolist(), nums[a:b].tolist(), texts.slice(a, b - a).to_pylist())
+        ]
+    questions = [
+        {
+            "question": q.get("question"),
+            "question_id": q.get("question_id"),
+            "type_answer": q.get("type_answer"),
+            "answers": values(*q["rows"]),
+        }
+        for q in manifest.get("questions", [])
+    ]
+    return {"title": manifest.get("title"), "description": manifest.get("description"), "questions": questions}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Export a form as a typed columnar file (one row per answer)")
+    p.add_argument("--form-id", required=True, help="UUID of the form to export")
+    p.add_argument("--out", type=Path, help="Output directory (columnar) or file (parquet)")
+    p.add_argument("--format", choices=FORMATS, default="columnar")
+    p.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    args = p.parse_args(argv)
+
+    suffix = ".parquet" if args.format == "parquet" else ".cols"
+    out_path = args.out or (Path.cwd() / f"form_{args.form_id}{suffix}")
+    summary = export_form(r2.load_config(), args.form_id, out_path, fmt=args.format, row_group_size=args.row_group_size)
+    print(f"✅ Exported {summary['rows']} answers ({len(summary['questions'])} questions) to {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Disk cache for rendered dashboards, revalidated with a cheap freshness probe.
+
+One entry per render options (form_id, fragment, chart_data, aggregation, llm).
+Each entry stores the ETag of the data it was rendered from:
+sha256(form + questions fingerprint, answer count, highest answer_id, renderer
+version, persisted render state). A request whose probe yields the same ETag
+is served from disk, skipping the full answer fetch, LLM planning and rendering.
+
+The renderer version hashes the source of every loaded module from this
+directory. Modules that keep state across renders (bento's type cache, the
+text_themes models) expose persisted_render_state(question_ids), which is
+folded into the ETag too.
+
+The answer table has no updated_at column, so in-place edits of an answer do
+not change the probe; RENDER_CACHE_MAX_AGE bounds how long that can go unseen.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import retrieve_supabase2 as r2
+
+CURRENT_DIR = Path(__file__).resolve().parent
+RENDER_CACHE_DIR = Path(os.getenv("BENTO_RENDER_CACHE_DIR", str(CURRENT_DIR / ".render_cache")))
+RENDER_CACHE_MAX_AGE = float(os.getenv("BENTO_RENDER_CACHE_MAX_AGE", 24 * 3600))
+
+
+@dataclass
+class CachedRender:
+    etag: str
+    last_modified: float  # unix time the underlying data was first rendered
+    created: float
+    payload: Dict[str, Any]
+
+
+def _local_modules() -> Dict[Path, Any]:
+    """Loaded modules whose source lives under CURRENT_DIR, by file (a module
+    imported both as `bento` and `Christopher.bento` counts once)."""
+    found: Dict[Path, Any] = {}
+    for module in list(sys.modules.values()):
+        file = getattr(module, "__file__", None)
+        if not file:
+            continue
+        path = Path(file).resolve()
+        if path.suffix == ".py" and CURRENT_DIR in path.parents:
+            found.setdefault(path, module)
+    return dict(sorted(found.items()))
+
+
+def renderer_version() -> str:
+    """Short content hash of the loaded local modules; changes whenever one is edited."""
+    h = hashlib.sha256()
+    for path in _local_modules():
+        h.update(str(path.relative_to(CURRENT_DIR)).encode("utf-8"))
+        h.update(path.read_bytes())
+    return h.hexdigest()[:12]
+
+
+def render_state(question_ids: List[str]) -> str:
+    """Short hash of what the local modules persisted for these questions."""
+    h = hashlib.sha256()
+    for path, module in _local_modules().items():
+        hook = getattr(module, "persisted_render_state", None)
+        if callable(hook):
+            h.update(json.dumps([path.name, hook(question_ids)], sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()[:12]
+
+
+def options_key(form_id: str, **options: Any) -> str:
+    raw = json.dumps([form_id, options], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def probe_fingerprint(form_id: str) -> Dict[str, Any]:
+    """The form's current data in brief: three small REST calls, no answer rows."""
+    config = r2.load_config()
+    form = r2.fetch_form_by_id(config, form_id)
+    questions = r2.fetch_questions_for_form(config, form_id)
+    question_ids = [q["question_id"] for q in questions if q.get("question_id")]
+    count, top_answer_id = r2.count_answers_for_questions(config, question_ids)
+    return {
+        "form": [form.get("title"), form.get("description")],
+        "questions": [[q.get("question_id"), q.get("question"), q.get("type_answer")] for q in questions],
+        "answers": [count, top_answer_id],
+    }
+
+
+def etag_for(fingerprint: Dict[str, Any]) -> str:
+    """ETag of a probe_fingerprint() with the current renderer version and persisted state.
+
+    Rendering can persist state (new type detections, theme models), so callers
+    recompute this after a render and store the entry under the new value.
+    """
+    question_ids = [q[0] for q in fingerprint["questions"] if q[0]]
+    full = {**fingerprint, "renderer": renderer_version(), "state": render_state(question_ids)}
+    digest = hashlib.sha256(json.dumps(full, sort_keys=True).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def probe_etag(form_id: str) -> str:
+    return etag_for(probe_fingerprint(form_id))
+
+
+def http_date(ts: float) -> str:
+    return formatdate(ts, usegmt=True)
+
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _entry_path(key: str) -> Path:
+    return RENDER_CACHE_DIR / f"{key}.json"
+
+
+def load(key: str) -> Optional[CachedRender]:
+    path = _entry_path(key)
+    try:
+        entry = CachedRender(**json.loads(path.read_text(encoding="utf-8")))
+    except (OSError, ValueError, TypeError):
+        return None
+    if time.time() - entry.created > RENDER_CACHE_MAX_AGE:
+        return None
+    return entry
+
+
+def save(key: str, entry: CachedRender) -> None:
+    RENDER_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _entry_path(key)
+    # Write then rename so concurrent service processes never read a partial file
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(asdict(entry)), encoding="utf-8")
+    os.replace(tmp, path)
@@ -0,0 +1,382 @@
+"""Respondent-aligned answers: one row per respondent, one column per question.
+
+Built from a fetch_form_bundle() bundle by joining answers on the
+{"userName": ..., "response": ...} envelope. Columns are dictionary-encoded:
+  - categorical / boolean / text: int32 codes into `categories` (-1 = no answer)
+  - number: float64 values (NaN = no answer)
+  - multi: CSR indicator matrix, respondents x options
+Any column can be viewed as a sparse one-hot indicator (numbers are binned),
+so a crosstab of two columns over a respondent mask is one sparse product,
+and segment filters are boolean masks.
+
+Answers without a userName cannot be aligned: they are counted per column
+(`unkeyed`) and left out of the table (unfiltered per-question charts still
+include them). If a respondent answered a question twice, the last answer wins.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from scipy import sparse
+
+import retrieve_supabase2 as r2
+
+TOP_K = 12          # categories kept per crosstab axis (the rest become "Other")
+NUMBER_BINS = 8     # bins for numeric columns used as a crosstab axis
+MAX_DISCRETE = 12   # numeric columns with at most this many distinct values (ratings) stay discrete
+VALUE_SEP = "||"    # between values in a --segment argument (as in question |OPTIONS:)
+
+Filter = Union[Sequence[Any], Dict[str, float], Any]
+
+
+def _label(value: Any) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, bool) or value is None:
+        return math.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+@dataclass
+class Column:
+    question_id: str
+    label: str
+    type_answer: Optional[str]
+    kind: str  # number | boolean | categorical | multi | text
+    categories: List[Any]                         # typed values, code -> value
+    codes: Optional[np.ndarray] = None            # categorical / boolean / text
+    values: Optional[np.ndarray] = None           # number
+    members: Optional[sparse.csr_matrix] = None   # multi
+    answered: Optional[np.ndarray] = None         # multi: respondent gave an answer (possibly empty)
+    unkeyed: int = 0
+
+    def present(self) -> np.ndarray:
+        if self.values is not None:
+            return ~np.isnan(self.values)
+        if self.codes is not None:
+            return self.codes >= 0
+        return self.answered
+
+    def indicator(self, bins: int = NUMBER_BINS) -> Tuple[sparse.csr_matrix, List[str]]:
+        """(respondents x groups one-hot, group labels); numbers are binned on the full column."""
+        if self.members is not None:
+            return self.members, [_label(c) for c in self.categories]
+        if self.codes is not None:
+            codes, labels = self.codes, [_label(c) for c in self.categories]
+        else:
+            codes, labels = self._binned(bins)
+        rows = np.flatnonzero(codes >= 0)
+        data = np.ones(len(rows), dtype=np.int32)
+        return sparse.csr_matrix((data, (rows, codes[rows])), shape=(len(codes), len(labels))), labels
+
+    def _binned(self, bins: int) -> Tuple[np.ndarray, List[str]]:
+        v = self.values
+        ok = ~np.isnan(v)
+        codes = np.full(len(v), -1, dtype=np.int32)
+        if not ok.any():
+            return codes, []
+        distinct = np.unique(v[ok])
+        if len(distinct) <= MAX_DISCRETE:
+            codes[ok] = np.searchsorted(distinct, v[ok])
+            return codes, [_label(float(d)) for d in distinct]
+        edges = np.linspace(distinct[0], distinct[-1], bins + 1)
+        codes[ok] = np.clip(np.searchsorted(edges, v[ok], side="right") - 1, 0, bins - 1)
+        return codes, [f"{edges[i]:.4g}–{edges[i + 1]:.4g}" for i in range(bins)]
+
+    def answers(self, mask: Optional[np.ndarray] = None) -> List[Any]:
+        """Typed answers of the selected respondents (same values as bundle_to_grouped_by_question)."""
+        if self.values is not None:
+            v = self.values if mask is None else self.values[mask]
+            return v[~np.isnan(v)].tolist()
+        if self.codes is not None:
+            c = self.codes if mask is None else self.codes[mask]
+            return np.asarray(self.categories, dtype=object)[c[c >= 0]].tolist()
+        sel = np.flatnonzero(self.answered if mask is None else self.answered & mask)
+        m = self.members[sel]
+        cats = self.categories
+        return [[cats[j] for j in m.indices[m.indptr[i]:m.indptr[i + 1]]] for i in range(len(sel))]
+
+
+@dataclass
+class Crosstab:
+    row_label: str
+    col_label: str
+    rows: List[str]
+    cols: List[str]
+    counts: np.ndarray  # len(rows) x len(cols)
+    n: int              # respondents in the mask who answered both
+
+    def top_cell(self) -> Tuple[str, str, int]:
+        i, j = np.unravel_index(int(self.counts.argmax()), self.counts.shape)
+        return self.rows[i], self.cols[j], int(self.counts[i, j])
+
+
+@dataclass
+class GroupStats:
+    value_label: str
+    by_label: str
+    groups: List[str]
+    count: np.ndarray
+    mean: np.ndarray
+    median: np.ndarray
+
+
+def _collapse(counts: np.ndarray, labels: List[str], axis: int, top_k: int, ordered: bool) -> Tuple[np.ndarray, List[str]]:
+    """Keep the top_k groups by total along `axis` (natural order kept for ordered axes); sum the rest into Other."""
+    totals = counts.sum(axis=1 - axis)
+    if len(labels) <= top_k:
+        keep = np.flatnonzero(totals > 0) if len(labels) else np.arange(0)
+        return counts.take(keep, axis=axis), [labels[i] for i in keep]
+    keep = np.argsort(-totals, kind="stable")[:top_k - 1]
+    keep = np.sort(keep) if ordered else keep
+    rest = np.setdiff1d(np.arange(len(labels)), keep)
+    other = counts.take(rest, axis=axis).sum(axis=axis, keepdims=True)
+    return np.concatenate([counts.take(keep, axis=axis), other], axis=axis), [labels[i] for i in keep] + ["Other"]
+
+
+class RespondentTable:
+    def __init__(self, form: Dict[str, Any], respondents: List[str], columns: List[Column]):
+        self.form = form
+        self.respondents = respondents
+        self.columns = columns
+        self._by_ref: Dict[str, Column] = {}
+        for c in columns:
+            self._by_ref.setdefault(c.label, c)
+        for c in columns:
+            self._by_ref[c.question_id] = c
+
+    def __len__(self) -> int:
+        return len(self.respondents)
+
+    @classmethod
+    def from_bundle(cls, bundle: Dict[str, Any], types: Optional[Dict[str, str]] = None) -> "RespondentTable":
+        """types: question_id -> bento answer type; inferred from the values when missing."""
+        types = types or {}
+        index: Dict[str, int] = {}
+        staged = []
+        for qb in bundle.get("questions", []):
+            q = qb.get("question", {})
+            parsed = [ans.get("parsed_answer") or {} for ans in qb.get("answers", [])]
+            values = r2.coerce_answers([p.get("response") for p in parsed], q.get("type_answer"))
+            rows: List[int] = []
+            vals: List[Any] = []
+            unkeyed = 0
+            for p, v in zip(parsed, values):
+                key = p.get("userName")
+                if key is None or key == "":
+                    unkeyed += 1
+                    continue
+                rows.append(index.setdefault(str(key), len(index)))
+                vals.append(v)
+            staged.append((q, np.asarray(rows, dtype=np.int64), vals, unkeyed))
+
+        n = len(index)
+        columns = [
+            _build_column(q, rows, vals, unkeyed, n, types.get(q.get("question_id")))
+            for q, rows, vals, unkeyed in staged
+        ]
+        return cls(bundle.get("form", {}), list(index), columns)
+
+    def column(self, ref: str) -> Column:
+        try:
+            return self._by_ref[ref]
+        except KeyError:
+            raise KeyError(f"No question '{ref}' (use a question_id or the exact question text)") from None
+
+    def mask(self, filters: Optional[Dict[str, Filter]] = None) -> np.ndarray:
+        """Respondents matching every filter: {question: [values]} or {question: {"min": x, "max": y}}."""
+        m = np.ones(len(self), dtype=bool)
+        for ref, cond in (filters or {}).items():
+            col = self.column(ref)
+            if isinstance(cond, dict):
+                v = col.values if col.values is not None else np.full(len(self), np.nan)
+                lo, hi = cond.get("min"), cond.get("max")
+                with np.errstate(invalid="ignore"):
+                    m &= ~np.isnan(v) & (v >= (-np.inf if lo is None else lo)) & (v <= (np.inf if hi is None else hi))
+                continue
+            wanted = {_label(x) for x in (cond if isinstance(cond, (list, tuple, set)) else [cond])}
+            if col.values is not None:
+                targets = [f for f in (_to_float(x) for x in wanted) if not math.isnan(f)]
+                m &= np.isin(col.values, targets)
+                continue
+            allowed = [i for i, c in enumerate(col.categories) if _label(c) in wanted]
+            if col.codes is not None:
+                m &= np.isin(col.codes, allowed)
+            else:
+                m &= np.asarray(col.members[:, allowed].sum(axis=1)).ravel() > 0
+        return m
+
+    def crosstab(
+        self,
+        row_ref: str,
+        col_ref: str,
+        mask: Optional[np.ndarray] = None,
+        top_k: int = TOP_K,
+        bins: int = NUMBER_BINS,
+    ) -> Crosstab:
+        rc, cc = self.column(row_ref), self.column(col_ref)
+        A, rows = rc.indicator(bins)
+        B, cols = cc.indicator(bins)
+        if mask is not None:
+            A, B = A[mask], B[mask]
+        counts = np.asarray((A.T @ B).todense(), dtype=np.int64)
+        both = (np.asarray(A.sum(axis=1)).ravel() > 0) & (np.asarray(B.sum(axis=1)).ravel() > 0)
+        counts, rows = _collapse(counts, rows, 0, top_k, ordered=rc.values is not None)
+        counts, cols = _collapse(counts, cols, 1, top_k, ordered=cc.values is not None)
+        return Crosstab(rc.label, cc.label, rows, cols, counts, int(both.sum()))
+
+    def group_stats(self, value_ref: str, by_ref: str, mask: Optional[np.ndarray] = None, top_k: int = TOP_K) -> GroupStats:
+        """count / mean / median of a numeric question per group of another question."""
+        vc, bc = self.column(value_ref), self.column(by_ref)
+        if vc.values is None:
+            raise ValueError(f"'{vc.label}' is not numeric")
+        B, groups = bc.indicator()
+        ok = ~np.isnan(vc.values) if mask is None else mask & ~np.isnan(vc.values)
+        B = B[ok].tocsc()
+        v = vc.values[ok]
+        count = np.asarray(B.sum(axis=0)).ravel()
+        order = np.argsort(-count, kind="stable")[:top_k]
+        order = order[count[order] > 0]
+        means, medians = [], []
+        for g in order:
+            vals = v[B.indices[B.indptr[g]:B.indptr[g + 1]]]
+            means.append(float(vals.mean()))
+            medians.append(float(np.median(vals)))
+        return GroupStats(
+            vc.label, bc.label, [groups[g] for g in order], count[order], np.array(means), np.array(medians)
+        )
+
+    def grouped(self, mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """bundle_to_grouped_by_question() shape, restricted to the selected respondents."""
+        return {
+            "title": self.form.get("title"),
+            "description": self.form.get("description"),
+            "questions": [
+                {"question": c.label, "question_id": c.question_id, "type_answer": c.type_answer, "answers": c.answers(mask)}
+                for c in self.columns
+            ],
+        }
+
+
+def _infer_kind(vals: List[Any]) -> str:
+    present = [v for v in vals if v is not None and v != ""]
+    if any(isinstance(v, (list, tuple)) for v in present):
+        return "multi"
+    if present and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in present):
+        return "number"
+    return "categorical"
+
+
+def _build_column(q: Dict[str, Any], rows: np.ndarray, vals: List[Any], unkeyed: int, n: int, kind: Optional[str]) -> Column:
+    kind = kind or _infer_kind(vals)
+    col = Column(
+        question_id=q.get("question_id"),
+        label=q.get("question") or "",
+        type_answer=q.get("type_answer"),
+        kind=kind,
+        categories=[],
+        unkeyed=unkeyed,
+    )
+    if kind == "number":
+        col.values = np.full(n, np.nan)
+        col.values[rows] = np.fromiter((_to_float(v) for v in vals), dtype=float, count=len(vals))
+        return col
+    if kind == "multi":
+        index: Dict[str, int] = {}
+        r: List[int] = []
+        c: List[int] = []
+        answered = np.zeros(n, dtype=bool)
+        for row, v in zip(rows.tolist(), vals):
+            if v is None or v == "":
+                continue
+            answered[row] = True
+            for item in (v if isinstance(v, (list, tuple)) else [v]):
+                if item is None or item == "":
+                    continue
+                r.append(row)
+                c.append(index.setdefault(str(item), len(index)))
+        members = sparse.csr_matrix((np.ones(len(r), dtype=np.int32), (r, c)), shape=(n, len(index)))
+        members.sum_duplicates()
+        members.data[:] = 1
+        col.members, col.answered, col.categories = members, answered, list(index)
+        return col
+    # categorical / boolean / text: dictionary-encode on the label, keep the first typed value
+    index = {}
+    categories: List[Any] = []
+    codes = np.full(n, -1, dtype=np.int32)
+    codes_in = np.empty(len(vals), dtype=np.int32)
+    for i, v in enumerate(vals):
+        if v is None or (isinstance(v, str) and not v.strip()):
+            codes_in[i] = -1
+            continue
+        key = _label(v).strip() if isinstance(v, str) else _label(v)
+        code = index.get(key)
+        if code is None:
+            code = index[key] = len(categories)
+            categories.append(v.strip() if isinstance(v, str) else v)
+        codes_in[i] = code
+    present = codes_in >= 0
+    codes[rows[present]] = codes_in[present]
+    col.codes, col.categories = codes, categories
+    return col
+
+
+# =========================
+# Argument parsing (bento.py / bento_service.py)
+# =========================
+
+_RANGE_RE = re.compile(r"^\s*(-?\d+(?:\.\d+)?)?\s*\.\.\s*(-?\d+(?:\.\d+)?)?\s*$")
+
+
+def parse_segments(items: Iterable[str]) -> Dict[str, Filter]:
+    """["Role=Manager||Director", "Rating=3..5"] -> {"Role": ["Manager", "Director"], "Rating": {"min": 3, "max": 5}}"""
+    filters: Dict[str, Filter] = {}
+    for item in items:
+        ref, sep, raw = item.partition("=")
+        if not sep or not ref.strip():
+            raise ValueError(f"Segment '{item}' must look like 'Question=Value' or 'Question=min..max'")
+        rng = _RANGE_RE.match(raw)
+        if rng and (rng.group(1) or rng.group(2)):
+            bounds: Dict[str, float] = {}
+            if rng.group(1):
+                bounds["min"] = float(rng.group(1))
+            if rng.group(2):
+                bounds["max"] = float(rng.group(2))
+            filters[ref.strip()] = bounds
+        else:
+            filters[ref.strip()] = [v.strip() for v in raw.split(VALUE_SEP)]
+    return filters
+
+
+def parse_crosstabs(items: Iterable[str]) -> List[Tuple[str, str, Optional[str]]]:
+    """["Rating::Role", "Plan::Country::heatmap"] -> [(question, by, chart or None), ...]"""
+    out = []
+    for item in items:
+        parts = [p.strip() for p in item.split("::")]
+        if len(parts) not in (2, 3) or not all(parts):
+            raise ValueError(f"Crosstab '{item}' must look like 'Question::By' or 'Question::By::heatmap'")
+        out.append((parts[0], parts[1], parts[2] if len(parts) == 3 else None))
+    return out
+
+
+def describe_segments(filters: Dict[str, Filter]) -> str:
+    parts = []
+    for ref, cond in filters.items():
+        if isinstance(cond, dict):
+            lo, hi = cond.get("min"), cond.get("max")
+            parts.append(f"{ref} in {'' if lo is None else _label(lo)}..{'' if hi is None else _label(hi)}")
+        else:
+            parts.append(f"{ref} = {' / '.join(_label(v) for v in (cond if isinstance(cond, (list, tuple, set)) else [cond]))}")
+    return "; ".join(parts)
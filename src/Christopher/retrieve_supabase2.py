@@ -2,17 +2,23 @@
 
 from __future__ import annotations
 
+import contextlib
 import json
+import math
 import os
 import sys
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import requests
 from dotenv import load_dotenv
 
+import sketches as sk
+import timing
+
 
 # ------------------------------
 # Config
@@ -46,6 +52,17 @@ def load_config() -> SupabaseConfig:
 # REST helpers (with optional pagination)
 # ------------------------------
 
+# Shared HTTP state: batch workers install a pooled Session and a rate limiter
+_http: Any = requests
+_limiter: Any = contextlib.nullcontext()
+
+
+def configure_http(session: Optional[requests.Session] = None, limiter: Any = None) -> None:
+    """Route every Supabase call through `session` and the `limiter` context manager."""
+    global _http, _limiter
+    _http = session or requests
+    _limiter = limiter or contextlib.nullcontext()
+
 
 def _endpoint(config: SupabaseConfig, table: str) -> str:
     return f"{config.url.rstrip('/')}/rest/v1/{table}"
@@ -74,7 +91,8 @@ def _get_with_retries(
     last_err = None
     for i in range(retries):
         try:
-            resp = requests.get(url, headers=h, params=params, timeout=30)
+            with _limiter:
+                resp = _http.get(url, headers=h, params=params, timeout=30)
             if resp.status_code in (200, 206):
                 return resp
             if resp.status_code >= 500:
@@ -88,6 +106,32 @@ def _get_with_retries(
     raise RuntimeError(f"Supabase request failed after retries: {last_err}")
 
 
+def _post_with_retries(
+    url: str,
+    headers: Dict[str, str],
+    payload: Dict[str, Any],
+    retries: int = 3,
+) -> requests.Response:
+    h = {**headers, "Content-Type": "application/json"}
+    last_err = None
+    for i in range(retries):
+        try:
+            with _limiter:
+                resp = _http.post(url, headers=h, json=payload, timeout=60)
+            if resp.status_code >= 500:
+                last_err = f"HTTP {resp.status_code}: {resp.text[:200]}"
+                time.sleep(0.6 * (i + 1))
+                continue
+            if resp.status_code >= 400:
+                # 4xx won't improve on retry (e.g. 404 when the function isn't deployed)
+                raise RuntimeError(f"Supabase RPC failed (HTTP {resp.status_code}): {resp.text[:200]}")
+            return resp
+        except requests.RequestException as e:
+            last_err = e
+            time.sleep(0.6 * (i + 1))
+    raise RuntimeError(f"Supabase request failed after retries: {last_err}")
+
+
 def _rest_get_all(
     config: SupabaseConfig,
     table: str,
@@ -100,25 +144,43 @@ def _rest_get_all(
     headers = _headers(config)
 
     if not use_range:
-        resp = _get_with_retries(url, headers, params, range_hdr=None, use_range=False)
-        data = resp.json()
+        with timing.span("supabase.request", "supabase", table=table):
+            resp = _get_with_retries(url, headers, params, range_hdr=None, use_range=False)
+            data = resp.json()
         if not isinstance(data, list):
             raise RuntimeError(f"Unexpected response from {table}: {data}")
         return data
 
     out: List[Dict[str, Any]] = []
+    for chunk in _rest_iter_pages(config, table, params, page_size=page_size):
+        out.extend(chunk)
+    return out
+
+
+def _rest_iter_pages(
+    config: SupabaseConfig,
+    table: str,
+    params: Dict[str, Any],
+    page_size: int = 1000,
+) -> Iterator[List[Dict[str, Any]]]:
+    """Yield Range-paged chunks of rows, so callers can stream instead of buffering."""
+    url = _endpoint(config, table)
+    headers = _headers(config)
     start = 0
     while True:
         end = start + page_size - 1
-        resp = _get_with_retries(url, headers, params, range_hdr=f"{start}-{end}", use_range=True)
-        chunk = resp.json()
+        with timing.span("supabase.page", "supabase", table=table, start=start) as sp:
+            resp = _get_with_retries(url, headers, params, range_hdr=f"{start}-{end}", use_range=True)
+            chunk = resp.json()
+            if sp is not None:
+                sp.args["rows"] = len(chunk) if isinstance(chunk, list) else 0
         if not isinstance(chunk, list):
             raise RuntimeError(f"Unexpected response from {table}: {chunk}")
-        out.extend(chunk)
+        if chunk:
+            yield chunk
         if len(chunk) < page_size:
             break
         start += page_size
-    return out
 
 
 # ------------------------------
@@ -126,6 +188,14 @@ def _rest_get_all(
 # ------------------------------
 
 
+# A stripped string can only be JSON if it starts with one of these; bare
+# literals are matched exactly. Everything else skips json.loads entirely.
+_JSON_START = frozenset('{["-0123456789')
+_JSON_LITERALS = {"true": True, "false": False, "null": None, "NaN": float("nan"), "Infinity": float("inf")}
+# On an already-stripped string, raw_decode + full-length check == json.loads minus its whitespace regexes
+_raw_decode = json.JSONDecoder().raw_decode
+
+
 def _parse_answer_payload(raw_answer: Any) -> Dict[str, Any]:
     """Normalize 'answer' field to {'userName': ..., 'response': ...}."""
     if isinstance(raw_answer, dict):
@@ -136,8 +206,12 @@ def _parse_answer_payload(raw_answer: Any) -> Dict[str, Any]:
         s = raw_answer.strip()
         if not s:
             return {"userName": None, "response": None}
+        if s[0] not in _JSON_START:
+            return {"userName": None, "response": _JSON_LITERALS.get(s, s)}
         try:
-            loaded = json.loads(s)
+            loaded, end = _raw_decode(s)
+            if end != len(s):
+                return {"userName": None, "response": s}
             if isinstance(loaded, dict):
                 return {"userName": loaded.get("userName"), "response": loaded.get("response")}
             return {"userName": None, "response": loaded}
@@ -146,62 +220,94 @@ def _parse_answer_payload(raw_answer: Any) -> Dict[str, Any]:
     return {"userName": None, "response": raw_answer}
 
 
-def _coerce_value(value_raw, q_type: str):
-    """
-    Convert raw string/primitive into a typed python value based on question type.
-    Keeps arrays for multi-choice; leaves date/datetime as ISO strings.
-    """
+# ------------------------------
+# Coercion compiler: resolve type_answer once per question
+# ------------------------------
+
+# One converter per type, so the per-answer work is a single call with no
+# type-string normalisation or set lookups. Matches the former per-answer
+# _coerce_value (kept in bench_coercion.py as legacy_coerce_value), except that
+# "checkbox" is now split into options like multi_choice, as bento.DECLARED_TYPES
+# and the form_dashboard_aggregates RPC already treat it.
+
+def _coerce_multi(value_raw):
     if value_raw is None:
         return None
-    t = (q_type or "").strip().lower()
-
-    if t in {"multi_choice", "multichoice", "multi-select"}:
-        if isinstance(value_raw, list):
-            return value_raw
-        if isinstance(value_raw, str):
+    if isinstance(value_raw, list):
+        return value_raw
+    if isinstance(value_raw, str):
+        if value_raw.lstrip()[:1] == "[":
             try:
                 j = json.loads(value_raw)
                 if isinstance(j, list):
                     return j
             except Exception:
                 pass
-            return [x.strip() for x in value_raw.split(",") if x.strip()]
-        return [value_raw]
+        return [x.strip() for x in value_raw.split(",") if x.strip()]
+    return [value_raw]
 
-    if t in {"choice", "single_choice", "radio"}:
-        return value_raw if not isinstance(value_raw, str) else value_raw.strip()
 
-    if t in {"number", "float", "rating"}:
-        try:
-            return float(value_raw)
-        except Exception:
-            return value_raw
+def _coerce_choice(value_raw):
+    return value_raw.strip() if isinstance(value_raw, str) else value_raw
 
-    if t in {"integer", "int"}:
-        try:
-            return int(round(float(value_raw)))
-        except Exception:
-            return value_raw
-
-    if t in {"boolean", "bool"}:
-        if isinstance(value_raw, bool):
-            return value_raw
-        if isinstance(value_raw, (int, float)):
-            return bool(value_raw)
-        if isinstance(value_raw, str):
-            s = value_raw.strip().lower()
-            if s in {"true", "yes", "1", "y"}:
-                return True
-            if s in {"false", "no", "0", "n"}:
-                return False
+
+def _coerce_number(value_raw):
+    if value_raw is None:
+        return None
+    try:
+        return float(value_raw)
+    except Exception:
+        return value_raw
+
+
+def _coerce_integer(value_raw):
+    if value_raw is None:
+        return None
+    try:
+        return int(round(float(value_raw)))
+    except Exception:
         return value_raw
 
-    # date/datetime/timestamp → keep as string; text default
+
+_BOOL_STRINGS = {"true": True, "yes": True, "1": True, "y": True, "false": False, "no": False, "0": False, "n": False}
+
+
+def _coerce_boolean(value_raw):
+    if value_raw is None or isinstance(value_raw, bool):
+        return value_raw
+    if isinstance(value_raw, (int, float)):
+        return bool(value_raw)
     if isinstance(value_raw, str):
-        return value_raw.strip()
+        return _BOOL_STRINGS.get(value_raw.strip().lower(), value_raw)
     return value_raw
 
 
+_COERCERS: Dict[str, Callable[[Any], Any]] = {
+    **dict.fromkeys(("checkbox", "multi_choice", "multichoice", "multi-select"), _coerce_multi),
+    **dict.fromkeys(("choice", "single_choice", "radio"), _coerce_choice),
+    **dict.fromkeys(("number", "float", "rating"), _coerce_number),
+    **dict.fromkeys(("integer", "int"), _coerce_integer),
+    **dict.fromkeys(("boolean", "bool"), _coerce_boolean),
+}
+
+
+@lru_cache(maxsize=None)
+def compile_coercer(q_type: Optional[str]) -> Callable[[Any], Any]:
+    """Per-answer converter for a question type (date/datetime/text → strip strings)."""
+    return _COERCERS.get((q_type or "").strip().lower(), _coerce_choice)
+
+
+def coerce_answers(values: List[Any], q_type: Optional[str]) -> List[Any]:
+    """Coerce a question's answers in one pass; numeric columns try a bulk float() first."""
+    coerce = compile_coercer(q_type)
+    if coerce is _coerce_number:
+        try:
+            return [float(v) for v in values]
+        except Exception:
+            pass  # mixed column (None / non-numeric text): fall back per value
+    return [coerce(v) for v in values]
+
+
 # ------------------------------
 # Domain fetchers (use your column names)
 # ------------------------------
@@ -230,18 +336,119 @@ def fetch_answers_for_question(config: SupabaseConfig, question_id: str, page_si
     return _rest_get_all(config, config.answers_table, params, page_size=page_size, use_range=True)
 
 
-def fetch_form_bundle(config: SupabaseConfig, form_id: str, page_size: int = 1000) -> Dict[str, Any]:
+def count_answers_for_questions(config: SupabaseConfig, question_ids: List[str]) -> Tuple[int, Optional[str]]:
+    """
+    Cheap freshness probe: (answer count, highest answer_id) across the given
+    questions in one request (`Prefer: count=exact`, limit=1) instead of
+    downloading the rows.
+    """
+    if not question_ids:
+        return 0, None
+    headers = {**_headers(config), "Prefer": "count=exact"}
+    params = {
+        "select": "answer_id",
+        "question_id": f"in.({','.join(question_ids)})",
+        "order": "answer_id.desc",
+        "limit": 1,
+    }
+    resp = _get_with_retries(_endpoint(config, config.answers_table), headers, params, use_range=False)
+    # Content-Range: 0-0/1234  (or */0 when empty)
+    total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+    rows = resp.json()
+    top = rows[0].get("answer_id") if isinstance(rows, list) and rows else None
+    return (int(total) if total.isdigit() else len(rows)), top
+
+
+def call_rpc(config: SupabaseConfig, function: str, params: Dict[str, Any]) -> Any:
+    """POST /rest/v1/rpc/<function> (PostgREST) and return the decoded JSON result."""
+    url = f"{config.url.rstrip('/')}/rest/v1/rpc/{function}"
+    return _post_with_retries(url, _headers(config), params).json()
+
+
+def fetch_form_aggregates(config: SupabaseConfig, form_id: str, bins: int = 20, top_k: int = 50) -> Dict[str, Any]:
+    """
+    Push-down variant of fetch_form_bundle: Postgres computes per-question
+    counts, percentiles, histogram buckets and top-k values
+    (supabase/migrations/*form_dashboard_aggregates*), so the payload size
+    depends on the number of questions, not answers.
+    """
     form_record = fetch_form_by_id(config, form_id)
-    questions = fetch_questions_for_form(config, form_id, page_size=page_size)
+    questions = call_rpc(
+        config,
+        "form_dashboard_aggregates",
+        {"p_form_id": form_id, "p_bins": bins, "p_top_k": top_k},
+    )
+    if not isinstance(questions, list):
+        raise RuntimeError(f"Unexpected response from form_dashboard_aggregates: {questions}")
+    return {"form": form_record, "questions": questions}
+
+
+def iter_answer_pages_for_question(config: SupabaseConfig, question_id: str, page_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+    params = {"question_id": f"eq.{question_id}", "order": "answer_id.asc"}
+    return _rest_iter_pages(config, config.answers_table, params, page_size=page_size)
 
-    question_bundles: List[Dict[str, Any]] = []
-    for q in questions:
-        q_id = q.get("question_id")
-        if not q_id:
+
+def sketch_answers_for_question(config: SupabaseConfig, question: Dict[str, Any], page_size: int = 1000) -> Dict[str, Any]:
+    """
+    Bounded-memory summary of one question's answers: each page is sketched on
+    its own and merged (sketches.py), so at most one page is held at a time.
+    Numeric types get a NumericSketch, everything else Misra-Gries top values
+    plus a HyperLogLog distinct count (multi-choice options counted one by one).
+    """
+    coerce = compile_coercer(question.get("type_answer"))
+    numeric = coerce in (_coerce_number, _coerce_integer)
+    total = sk.NumericSketch() if numeric else sk.MisraGries()
+    distinct = None if numeric else sk.HyperLogLog()
+    for page in iter_answer_pages_for_question(config, question["question_id"], page_size=page_size):
+        values = [coerce(_parse_answer_payload(a.get("answer")).get("response")) for a in page]
+        if numeric:
+            nums = [float(v) for v in values if isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)]
+            total.merge(sk.NumericSketch.from_values(nums))
             continue
-        raw_answers = fetch_answers_for_question(config, q_id, page_size=page_size)
-        parsed = [{**a, "parsed_answer": _parse_answer_payload(a.get("answer"))} for a in raw_answers]
-        question_bundles.append({"question": q, "answers": parsed})
+        items = []
+        for v in values:
+            for item in (v if isinstance(v, list) else [v]):
+                if item is not None and str(item).strip() != "":
+                    items.append(str(item).strip())
+        total.merge(sk.MisraGries().update_many(items))
+        distinct.merge(sk.HyperLogLog().update_many(items))
+    out = {"numeric" if numeric else "top_values": total.to_dict()}
+    if distinct is not None:
+        out["distinct"] = distinct.to_dict()
+    return out
+
+
+def fetch_form_sketches(config: SupabaseConfig, form_id: str, page_size: int = 1000) -> Dict[str, Any]:
+    """fetch_form_bundle() for forms too large to hold: per-question sketches instead of answers."""
+    with timing.span("fetch_form_sketches", form_id=form_id):
+        form_record = fetch_form_by_id(config, form_id)
+        questions = fetch_questions_for_form(config, form_id, page_size=page_size)
+        out = []
+        for q in questions:
+            if not q.get("question_id"):
+                continue
+            with timing.span(f"supabase.{config.answers_table}", "supabase", question_id=q["question_id"]):
+                out.append({"question": q, "sketches": sketch_answers_for_question(config, q, page_size=page_size)})
+    return {"form": form_record, "questions": out}
+
+
+def fetch_form_bundle(config: SupabaseConfig, form_id: str, page_size: int = 1000) -> Dict[str, Any]:
+    with timing.span("fetch_form_bundle", form_id=form_id):
+        with timing.span(f"supabase.{config.forms_table}", "supabase"):
+            form_record = fetch_form_by_id(config, form_id)
+        with timing.span(f"supabase.{config.questions_table}", "supabase"):
+            questions = fetch_questions_for_form(config, form_id, page_size=page_size)
+
+        question_bundles: List[Dict[str, Any]] = []
+        for q in questions:
+            q_id = q.get("question_id")
+            if not q_id:
+                continue
+            with timing.span(f"supabase.{config.answers_table}", "supabase", question_id=q_id):
+                raw_answers = fetch_answers_for_question(config, q_id, page_size=page_size)
+            with timing.span("parse_answers", question_id=q_id, rows=len(raw_answers)):
+                parsed = [{**a, "parsed_answer": _parse_answer_payload(a.get("answer"))} for a in raw_answers]
+            question_bundles.append({"question": q, "answers": parsed})
 
     return {"form": form_record, "questions": question_bundles}
 
@@ -258,7 +465,7 @@ def bundle_to_grouped_by_question(bundle: Dict[str, Any]) -> Dict[str, Any]:
       "title": "...",
       "description": "...",
       "questions": [
-        { "question": "Label", "answers": [ <typed>, <typed>, ... ] },
+        { "question": "Label", "question_id": "...", "type_answer": "...", "answers": [ <typed>, ... ] },
         ...
       ]
     }
@@ -273,14 +480,15 @@ def bundle_to_grouped_by_question(bundle: Dict[str, Any]) -> Dict[str, Any]:
         label = q.get("question")
         q_type = q.get("type_answer")
 
-        answers_list: List[Any] = []
-        for ans in qb.get("answers", []):
-            pa = ans.get("parsed_answer") or {}
-            value_raw = pa.get("response")
-            value = _coerce_value(value_raw, q_type)
-            answers_list.append(value)
+        raw_values = [(ans.get("parsed_answer") or {}).get("response") for ans in qb.get("answers", [])]
+        answers_list = coerce_answers(raw_values, q_type)
 
-        grouped.append({"question": label, "answers": answers_list})
+        grouped.append({
+            "question": label,
+            "question_id": q.get("question_id"),
+            "type_answer": q_type,
+            "answers": answers_list,
+        })
 
     return {"title": title, "description": description, "questions": grouped}
 
@@ -308,14 +516,16 @@ def save_grouped_output(config: SupabaseConfig, form_id: str, output_path: Path)
 # ------------------------------
 
 
-def parse_argv(argv: List[str]) -> Tuple[Optional[str], Optional[str]]:
+def parse_argv(argv: List[str]) -> Tuple[Optional[str], Optional[str], bool]:
     """
     Flags:
       --form-id <id>
       --out <file>
+      --sketches   per-question sketches instead of answers (bounded memory)
     """
     form_id: Optional[str] = None
     out: Optional[str] = None
+    sketches = False
     i = 0
     while i < len(argv):
         tok = argv[i]
@@ -323,14 +533,16 @@ def parse_argv(argv: List[str]) -> Tuple[Optional[str], Optional[str]]:
             form_id = argv[i + 1]; i += 2
         elif tok == "--out" and i + 1 < len(argv):
             out = argv[i + 1]; i += 2
+        elif tok == "--sketches":
+            sketches = True; i += 1
         else:
             i += 1
-    return form_id, out
+    return form_id, out, sketches
 
 
 def main() -> None:
     config = load_config()
-    form_id, out = parse_argv(sys.argv[1:])
+    form_id, out, sketches = parse_argv(sys.argv[1:])
 
     if not form_id:
         try:
@@ -346,6 +558,10 @@ def main() -> None:
     out_path = Path(out) if out else default_output_path(form_id)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
+    if sketches:
+        out_path.write_text(json.dumps(fetch_form_sketches(config, form_id), indent=2))
+        print(f"✅ Saved per-question sketches to {out_path}")
+        return
     saved = save_grouped_output(config, form_id, out_path)
     print(f"✅ Saved grouped output to {saved}")
 
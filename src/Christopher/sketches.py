@@ -0,0 +1,364 @@
+"""Bounded-memory, mergeable summaries for very large answer sets.
+
+- KLLSketch: numeric quantiles (rank error ~1.7/k with high probability)
+- NumericSketch: count / mean / stdev / min / max + KLL quantiles
+- MisraGries: heavy hitters for categories and n-grams (counts undershoot by
+  at most `error_bound`)
+- HyperLogLog: distinct count (relative error ~1.04/sqrt(2**p))
+- reservoir_sample: uniform fixed-size sample of a list or stream
+
+Every sketch has `merge()` and `to_dict()` / `from_dict()` (JSON-safe), so
+partial aggregates can be persisted and combined across pages or workers.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import math
+import random
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 8192
+
+
+def _chunks(values: Iterable[Any], size: int = CHUNK_SIZE) -> Iterator[List[Any]]:
+    it = iter(values)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# =========================
+# Quantiles (KLL)
+# =========================
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang, Liberty 2016), streaming variant."""
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: int = 0):
+        self.k = k
+        self.c = c
+        self.n = 0
+        self.compactors: List[List[float]] = [[]]
+        self._rng = random.Random(seed)
+        self._size = 0
+        self._max_size = self._capacity(0)
+
+    def _capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return int(math.ceil(self.k * self.c ** depth)) + 1
+
+    def _grow(self) -> None:
+        self.compactors.append([])
+        self._max_size = sum(self._capacity(h) for h in range(len(self.compactors)))
+
+    def _compress(self) -> None:
+        while self._size >= self._max_size:
+            for h, buf in enumerate(self.compactors):
+                if len(buf) >= self._capacity(h):
+                    if h + 1 >= len(self.compactors):
+                        self._grow()
+                    buf.sort()
+                    keep_last = buf.pop() if len(buf) % 2 else None
+                    offset = self._rng.randint(0, 1)
+                    self.compactors[h + 1].extend(buf[offset::2])
+                    self.compactors[h] = [keep_last] if keep_last is not None else []
+                    break
+            self._size = sum(len(b) for b in self.compactors)
+
+    def update(self, x: float) -> None:
+        self.compactors[0].append(x)
+        self.n += 1
+        self._size += 1
+        if self._size >= self._max_size:
+            self._compress()
+
+    def update_many(self, values: Iterable[float]) -> None:
+        for chunk in _chunks(values):
+            self.compactors[0].extend(chunk)
+            self.n += len(chunk)
+            self._size += len(chunk)
+            self._compress()
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        while len(self.compactors) < len(other.compactors):
+            self._grow()
+        for h, buf in enumerate(other.compactors):
+            self.compactors[h].extend(buf)
+        self.n += other.n
+        self._size = sum(len(b) for b in self.compactors)
+        self._compress()
+        return self
+
+    def _weighted(self) -> List[Tuple[float, int]]:
+        items = [(x, 1 << h) for h, buf in enumerate(self.compactors) for x in buf]
+        items.sort()
+        return items
+
+    def quantiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        items = self._weighted()
+        if not items:
+            return [None for _ in qs]
+        total = sum(w for _, w in items)
+        out: List[Optional[float]] = []
+        for q in qs:
+            target = q * total
+            acc = 0
+            value = items[-1][0]
+            for x, w in items:
+                acc += w
+                if acc >= target:
+                    value = x
+                    break
+            out.append(value)
+        return out
+
+    def quantile(self, q: float) -> Optional[float]:
+        return self.quantiles([q])[0]
+
+    def rank(self, x: float) -> float:
+        """Approximate fraction of values <= x."""
+        items = self._weighted()
+        total = sum(w for _, w in items)
+        return sum(w for v, w in items if v <= x) / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": "kll", "k": self.k, "c": self.c, "n": self.n, "compactors": self.compactors}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+        sketch = cls(k=data["k"], c=data["c"])
+        sketch.compactors = [list(b) for b in data["compactors"]] or [[]]
+        sketch.n = data["n"]
+        sketch._size = sum(len(b) for b in sketch.compactors)
+        sketch._max_size = sum(sketch._capacity(h) for h in range(len(sketch.compactors)))
+        return sketch
+
+
+class NumericSketch:
+    """Moments + extremes (exact) with KLL quantiles (approximate)."""
+
+    def __init__(self, k: int = 200):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.kll = KLLSketch(k=k)
+
+    def _merge_moments(self, count: int, mean: float, m2: float, lo: float, hi: float) -> None:
+        if count == 0:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def update_many(self, values: Iterable[float]) -> "NumericSketch":
+        for chunk in _chunks(values):
+            chunk_mean = math.fsum(chunk) / len(chunk)
+            chunk_m2 = math.fsum((x - chunk_mean) ** 2 for x in chunk)
+            self._merge_moments(len(chunk), chunk_mean, chunk_m2, min(chunk), max(chunk))
+            self.kll.update_many(chunk)
+        return self
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], k: int = 200) -> "NumericSketch":
+        return cls(k=k).update_many(values)
+
+    def merge(self, other: "NumericSketch") -> "NumericSketch":
+        if other.count:
+            self._merge_moments(other.count, other.mean, other.m2, other.min, other.max)
+            self.kll.merge(other.kll)
+        return self
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """Same keys as bento.numeric_stats (median is approximate)."""
+        if not self.count:
+            return {"count": 0, "mean": None, "median": None, "stdev": None, "min": None, "max": None}
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "median": self.kll.quantile(0.5),
+            "stdev": math.sqrt(self.m2 / self.count) if self.count > 1 else 0.0,
+            "min": self.min,
+            "max": self.max,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": "numeric",
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min,
+            "max": self.max,
+            "kll": self.kll.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "NumericSketch":
+        sketch = cls()
+        sketch.count, sketch.mean, sketch.m2 = data["count"], data["mean"], data["m2"]
+        sketch.min, sketch.max = data["min"], data["max"]
+        sketch.kll = KLLSketch.from_dict(data["kll"])
+        return sketch
+
+
+# =========================
+# Heavy hitters (Misra-Gries)
+# =========================
+
+class MisraGries:
+    """Misra-Gries frequent items with the mergeable-summaries merge rule.
+
+    Each reported count undershoots the true count by at most `error_bound`
+    (<= n / (capacity + 1)); any item with frequency above that is retained.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.n = 0
+        self.error_bound = 0
+
+    def _absorb(self, counts: Dict[str, int]) -> None:
+        merged = Counter(self.counts)
+        merged.update(counts)
+        if len(merged) > self.capacity:
+            cut = sorted(merged.values(), reverse=True)[self.capacity]
+            self.error_bound += cut
+            merged = Counter({k: v - cut for k, v in merged.items() if v > cut})
+        self.counts = dict(merged)
+
+    def update_many(self, items: Iterable[str]) -> "MisraGries":
+        # Count a chunk exactly (C speed), then fold it in
+        for chunk in _chunks(items, CHUNK_SIZE * 8):
+            self.n += len(chunk)
+            self._absorb(Counter(chunk))
+        return self
+
+    def merge(self, other: "MisraGries") -> "MisraGries":
+        self.n += other.n
+        self.error_bound += other.error_bound
+        self._absorb(other.counts)
+        return self
+
+    def most_common(self, k: int) -> List[Tuple[str, int]]:
+        return Counter(self.counts).most_common(k)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": "misra_gries", "capacity": self.capacity, "n": self.n, "error_bound": self.error_bound, "counts": self.counts}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MisraGries":
+        sketch = cls(capacity=data["capacity"])
+        sketch.n, sketch.error_bound = data["n"], data["error_bound"]
+        sketch.counts = dict(data["counts"])
+        return sketch
+
+
+# =========================
+# Distinct counts (HyperLogLog)
+# =========================
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    def __init__(self, p: int = 14):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def update_many(self, items: Iterable[str]) -> "HyperLogLog":
+        p, regs = self.p, self.registers
+        low_bits = 64 - p
+        low_mask = (1 << low_bits) - 1
+        for chunk in _chunks(items, CHUNK_SIZE * 8):
+            # Repeated answers are common; hash each distinct value once per chunk
+            for value in set(chunk):
+                h = _hash64(value)
+                idx = h >> low_bits
+                rank = low_bits - (h & low_mask).bit_length() + 1
+                if rank > regs[idx]:
+                    regs[idx] = rank
+        return self
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def estimate(self) -> int:
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * math.log(m / zeros)))
+        return int(round(raw))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"kind": "hll", "p": self.p, "registers": base64.b64encode(bytes(self.registers)).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(p=data["p"])
+        sketch.registers = bytearray(base64.b64decode(data["registers"]))
+        return sketch
+
+
+# =========================
+# Sampling
+# =========================
+
+def reservoir_sample(values: Iterable[Any], k: int, seed: Any = 0) -> List[Any]:
+    """Uniform sample of at most k items, in input order; deterministic for a given seed.
+
+    Sequences are sampled by index (O(k)); other iterables stream through
+    Algorithm L (Li 1994), which skips ahead instead of drawing per item.
+    """
+    rng = random.Random(seed)
+    if isinstance(values, (list, tuple)):
+        if len(values) <= k:
+            return list(values)
+        return [values[i] for i in sorted(rng.sample(range(len(values)), k))]
+    it = iter(values)
+    reservoir = list(islice(it, k))
+    if len(reservoir) < k or k <= 0:
+        return reservoir
+    positions = list(range(k))
+    w = math.exp(math.log(rng.random()) / k)
+    i = k - 1
+    while True:
+        skip = int(math.log(rng.random()) / math.log(1 - w))
+        i += skip + 1
+        item = next(islice(it, skip, None), _END)
+        if item is _END:
+            break
+        slot = rng.randrange(k)
+        reservoir[slot], positions[slot] = item, i
+        w *= math.exp(math.log(rng.random()) / k)
+    return [item for _, item in sorted(zip(positions, reservoir), key=lambda p: p[0])]
+
+
+_END = object()
+
+
+_KINDS = {"kll": KLLSketch, "numeric": NumericSketch, "misra_gries": MisraGries, "hll": HyperLogLog}
+
+
+def sketch_from_dict(data: Dict[str, Any]):
+    """Rebuild any sketch from its to_dict() form."""
+    return _KINDS[data["kind"]].from_dict(data)
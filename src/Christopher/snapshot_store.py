@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Local SQLite snapshot of Supabase forms (form, questions, answers) with delta sync.
+
+Usage:
+  python snapshot_store.py --form-id <UUID>            # sync (delta after the first run)
+  python snapshot_store.py --form-id <UUID> --full     # drop local answers and re-download
+  python snapshot_store.py --list                      # forms in the snapshot
+
+Sync per question:
+  1. pull rows with answer_id > stored watermark (order=answer_id.asc, paged)
+  2. compare the local count with the remote count (Prefer: count=exact)
+  3. only if they differ, reconcile by answer_id alone: fetch the missing rows,
+     delete the ones gone remotely
+
+Step 3 exists because answer_id is a random uuid, so a new answer can sort below
+the watermark. In-place edits of an existing answer are not detected (there is
+no updated_at column); use --full to refresh those.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import retrieve_supabase2 as r2
+
+CURRENT_DIR = Path(__file__).resolve().parent
+SNAPSHOT_DB = Path(os.getenv("BENTO_SNAPSHOT_DB", str(CURRENT_DIR / ".snapshots.sqlite3")))
+ID_BATCH = 100  # answer_id=in.(...) list size, keeps URLs short
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forms (
+  form_id TEXT PRIMARY KEY,
+  title TEXT,
+  description TEXT,
+  record TEXT NOT NULL,
+  synced_at REAL
+);
+CREATE TABLE IF NOT EXISTS questions (
+  question_id TEXT PRIMARY KEY,
+  form_id TEXT NOT NULL,
+  record TEXT NOT NULL,
+  watermark TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_questions_form ON questions(form_id);
+CREATE TABLE IF NOT EXISTS answers (
+  answer_id TEXT PRIMARY KEY,
+  question_id TEXT NOT NULL,
+  record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_answers_question ON answers(question_id, answer_id);
+"""
+
+
+class SnapshotStore:
+    def __init__(self, path: Path = SNAPSHOT_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # ---- writes ----
+
+    def upsert_form(self, form: Dict[str, Any]) -> None:
+        self._conn.execute(
+            "INSERT INTO forms (form_id, title, description, record) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(form_id) DO UPDATE SET title=excluded.title, description=excluded.description, record=excluded.record",
+            (form["form_id"], form.get("title"), form.get("description"), json.dumps(form)),
+        )
+
+    def replace_questions(self, form_id: str, questions: List[Dict[str, Any]]) -> None:
+        """Upsert current questions; drop removed ones with their answers. Watermarks survive."""
+        keep = {q["question_id"] for q in questions}
+        stale = [
+            row[0] for row in self._conn.execute("SELECT question_id FROM questions WHERE form_id = ?", (form_id,))
+            if row[0] not in keep
+        ]
+        for qid in stale:
+            self._conn.execute("DELETE FROM answers WHERE question_id = ?", (qid,))
+            self._conn.execute("DELETE FROM questions WHERE question_id = ?", (qid,))
+        self._conn.executemany(
+            "INSERT INTO questions (question_id, form_id, record) VALUES (?, ?, ?) "
+            "ON CONFLICT(question_id) DO UPDATE SET form_id=excluded.form_id, record=excluded.record",
+            [(q["question_id"], form_id, json.dumps(q)) for q in questions],
+        )
+
+    def insert_answers(self, rows: Iterable[Dict[str, Any]]) -> int:
+        cur = self._conn.executemany(
+            "INSERT OR REPLACE INTO answers (answer_id, question_id, record) VALUES (?, ?, ?)",
+            [(a["answer_id"], a["question_id"], json.dumps(a)) for a in rows],
+        )
+        return cur.rowcount
+
+    def delete_answers(self, answer_ids: List[str]) -> None:
+        self._conn.executemany("DELETE FROM answers WHERE answer_id = ?", [(a,) for a in answer_ids])
+
+    def clear_answers(self, form_id: str) -> None:
+        self._conn.execute(
+            "DELETE FROM answers WHERE question_id IN (SELECT question_id FROM questions WHERE form_id = ?)", (form_id,)
+        )
+        self._conn.execute("UPDATE questions SET watermark = NULL WHERE form_id = ?", (form_id,))
+
+    def refresh_watermark(self, question_id: str) -> None:
+        self._conn.execute(
+            "UPDATE questions SET watermark = (SELECT MAX(answer_id) FROM answers WHERE question_id = ?) WHERE question_id = ?",
+            (question_id, question_id),
+        )
+
+    def mark_synced(self, form_id: str) -> None:
+        self._conn.execute("UPDATE forms SET synced_at = ? WHERE form_id = ?", (time.time(), form_id))
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    # ---- reads ----
+
+    def watermark(self, question_id: str) -> Optional[str]:
+        row = self._conn.execute("SELECT watermark FROM questions WHERE question_id = ?", (question_id,)).fetchone()
+        return row[0] if row else None
+
+    def answer_count(self, question_id: str) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM answers WHERE question_id = ?", (question_id,)).fetchone()[0]
+
+    def answer_ids(self, question_id: str) -> List[str]:
+        return [r[0] for r in self._conn.execute("SELECT answer_id FROM answers WHERE question_id = ?", (question_id,))]
+
+    def forms(self) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT f.form_id, f.title, f.synced_at, "
+            "(SELECT COUNT(*) FROM answers a JOIN questions q USING (question_id) WHERE q.form_id = f.form_id) "
+            "FROM forms f ORDER BY f.synced_at DESC"
+        ).fetchall()
+        return [{"form_id": r[0], "title": r[1], "synced_at": r[2], "answers": r[3]} for r in rows]
+
+    def load_bundle(self, form_id: str) -> Dict[str, Any]:
+        """Same shape (and ordering) as retrieve_supabase2.fetch_form_bundle, from local data."""
+        row = self._conn.execute("SELECT record FROM forms WHERE form_id = ?", (form_id,)).fetchone()
+        if row is None:
+            raise ValueError(f"Form '{form_id}' is not in the local snapshot ({self.path}). Sync it first.")
+        questions = [
+            json.loads(r[0])
+            for r in self._conn.execute("SELECT record FROM questions WHERE form_id = ? ORDER BY question_id", (form_id,))
+        ]
+        bundles = []
+        for q in questions:
+            answers = [
+                json.loads(r[0])
+                for r in self._conn.execute(
+                    "SELECT record FROM answers WHERE question_id = ? ORDER BY answer_id", (q["question_id"],)
+                )
+            ]
+            parsed = [{**a, "parsed_answer": r2._parse_answer_payload(a.get("answer"))} for a in answers]
+            bundles.append({"question": q, "answers": parsed})
+        return {"form": json.loads(row[0]), "questions": bundles}
+
+
+# =========================
+# Sync
+# =========================
+
+def _fetch_answers_by_ids(config: r2.SupabaseConfig, answer_ids: List[str]) -> List[Dict[str, Any]]:
+    out: List[Dict[str, Any]] = []
+    for i in range(0, len(answer_ids), ID_BATCH):
+        batch = answer_ids[i:i + ID_BATCH]
+        out.extend(r2._rest_get_all(
+            config, config.answers_table, {"answer_id": f"in.({','.join(batch)})"}, use_range=False
+        ))
+    return out
+
+
+def _remote_answer_ids(config: r2.SupabaseConfig, question_id: str, page_size: int) -> List[str]:
+    params = {"select": "answer_id", "question_id": f"eq.{question_id}", "order": "answer_id.asc"}
+    return [a["answer_id"] for a in r2._rest_get_all(config, config.answers_table, params, page_size=page_size)]
+
+
+def sync_form(
+    store: SnapshotStore,
+    config: r2.SupabaseConfig,
+    form_id: str,
+    full: bool = False,
+    page_size: int = 1000,
+) -> Dict[str, Any]:
+    """Bring the local snapshot of one form up to date; returns per-run counters."""
+    t0 = time.time()
+    stats = {"form_id": form_id, "questions": 0, "pulled": 0, "reconciled": 0, "deleted": 0}
+
+    form = r2.fetch_form_by_id(config, form_id)
+    questions = [q for q in r2.fetch_questions_for_form(config, form_id, page_size=page_size) if q.get("question_id")]
+    store.upsert_form(form)
+    store.replace_questions(form_id, questions)
+    if full:
+        store.clear_answers(form_id)
+    stats["questions"] = len(questions)
+
+    for q in questions:
+        qid = q["question_id"]
+        params = {"question_id": f"eq.{qid}", "order": "answer_id.asc"}
+        wm = store.watermark(qid)
+        if wm:
+            params["answer_id"] = f"gt.{wm}"
+        for page in r2._rest_iter_pages(config, config.answers_table, params, page_size=page_size):
+            stats["pulled"] += store.insert_answers(page)
+
+        remote_count, _ = r2.count_answers_for_questions(config, [qid])
+        if remote_count != store.answer_count(qid):
+            # Inserts below the watermark or deletions: diff by id only
+            remote_ids = _remote_answer_ids(config, qid, page_size)
+            local_ids = set(store.answer_ids(qid))
+            missing = [a for a in remote_ids if a not in local_ids]
+            gone = list(local_ids - set(remote_ids))
+            stats["reconciled"] += store.insert_answers(_fetch_answers_by_ids(config, missing))
+            store.delete_answers(gone)
+            stats["deleted"] += len(gone)
+
+        store.refresh_watermark(qid)
+        store.commit()  # per question, so an interrupted sync keeps its progress
+
+    store.mark_synced(form_id)
+    store.commit()
+    stats["elapsed_s"] = round(time.time() - t0, 3)
+    return stats
+
+
+def load_bundle(form_id: str, offline: bool = False, db_path: Path = SNAPSHOT_DB) -> Dict[str, Any]:
+    """fetch_form_bundle replacement: delta-sync then read locally, or read only (offline)."""
+    store = SnapshotStore(db_path)
+    try:
+        if not offline:
+            sync_form(store, r2.load_config(), form_id)
+        return store.load_bundle(form_id)
+    finally:
+        store.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    p = argparse.ArgumentParser(description="Sync Supabase forms into a local SQLite snapshot")
+    p.add_argument("--form-id", action="append", default=[], help="Form to sync (repeatable)")
+    p.add_argument("--db", type=Path, default=SNAPSHOT_DB, help="Snapshot database path")
+    p.add_argument("--full", action="store_true", help="Re-download all answers instead of a delta")
+    p.add_argument("--list", action="store_true", help="List forms in the snapshot")
+    args = p.parse_args(argv)
+
+    store = SnapshotStore(args.db)
+    try:
+        if args.list:
+            for f in store.forms():
+                synced = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(f["synced_at"])) if f["synced_at"] else "never"
+                print(f"{f['form_id']}  {f['answers']:>8} answers  synced {synced}  {f['title'] or ''}")
+            return
+        if not args.form_id:
+            p.error("--form-id is required unless --list is given")
+        config = r2.load_config()
+        for form_id in args.form_id:
+            s = sync_form(store, config, form_id, full=args.full)
+            print(
+                f"✅ {form_id}: {s['questions']} questions, {s['pulled']} new, "
+                f"{s['reconciled']} reconciled, {s['deleted']} deleted in {s['elapsed_s']}s"
+            )
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+"""Vectorized n-gram counting and TF-IDF key phrases for free-text answers.
+
+The corpus is tokenized in one pass over the concatenated answers: lower(),
+Latin-1 encode, one bytes.translate() that blanks every non-word byte, split().
+Answers are joined with a record-separator token, so document boundaries fall
+out of the token stream. Tokens are vocab-indexed once; n-grams become int64
+keys built with NumPy, and the document x term counts live in a scipy.sparse
+CSR matrix.
+
+- term_stats(): counts + document frequency per n-gram, stopwords and
+  min/max document frequency applied; mergeable, so large corpora can be
+  processed in chunks (optionally across processes)
+- TermStats.top_counts() / key_phrases(): frequency and TF-IDF rankings
+- count_matrix() / tfidf_matrix(): per-answer vectors (theme clustering)
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+SEP = "\x1e"  # record separator between answers (not whitespace for bytes.split)
+# Word characters as in the old per-answer regex [A-Za-zÀ-ÖØ-öø-ÿ0-9']; every
+# other byte (and any non-Latin-1 character, encoded as '?') becomes a space.
+_WORD_BYTES = (
+    set(b"abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'")
+    | set(range(0xC0, 0xD7)) | set(range(0xD8, 0xF7)) | set(range(0xF8, 0x100))
+    | {ord(SEP)}
+)
+_BLANK_NON_WORD = bytes(b if b in _WORD_BYTES else 0x20 for b in range(256))
+_SEP_TOKEN = SEP.encode("latin-1")
+
+CHUNK_SIZE = 50_000  # answers per chunk for chunked / multiprocess counting
+TEXT_WORKERS = int(os.getenv("BENTO_TEXT_WORKERS", "1"))
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being below
+between both but by can can't cannot could couldn't did didn't do does doesn't doing don't down during each few
+for from further get got had hadn't has hasn't have haven't having he he'd he'll he's her here here's hers herself
+him himself his how how's i i'd i'll i'm i've if in into is isn't it it's its itself just let's like me more most
+much mustn't my myself no nor not now of off on once only or other ought our ours ourselves out over own really
+same shan't she she'd she'll she's should shouldn't so some such than that that's the their theirs them themselves
+then there there's these they they'd they'll they're they've this those through to too under until up us very
+was wasn't we we'd we'll we're we've were weren't what what's when when's where where's which while who who's
+whom why why's will with won't would wouldn't yes you you'd you'll you're you've your yours yourself yourselves
+au aux avec ce ces c'est dans de des du elle en et eux il ils je j'ai la le les leur lui ma mais me même mes moi
+mon ne nos notre nous on ou où par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre
+vous y été être avoir est sont très plus aussi bien fait faire comme tout tous cette cet ça ai as avons avez ont
+""".split())
+
+
+def default_min_df(n_docs: int) -> int:
+    """Default minimum document frequency: keep everything on small forms, drop one-off typos on large ones."""
+    return 1 if n_docs < 100 else 2
+
+
+@dataclass
+class TermStats:
+    """Per-term totals for one corpus (or a merge of several chunks)."""
+
+    terms: List[str]
+    counts: np.ndarray  # total occurrences
+    df: np.ndarray      # answers containing the term
+    n_docs: int
+
+    @classmethod
+    def empty(cls) -> "TermStats":
+        return cls([], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), 0)
+
+    def merge(self, other: "TermStats") -> "TermStats":
+        index: Dict[str, int] = {t: i for i, t in enumerate(self.terms)}
+        terms = list(self.terms)
+        extra = [t for t in other.terms if t not in index]
+        for t in extra:
+            index[t] = len(terms)
+            terms.append(t)
+        counts = np.zeros(len(terms), dtype=np.int64)
+        df = np.zeros(len(terms), dtype=np.int64)
+        counts[: len(self.terms)] = self.counts
+        df[: len(self.terms)] = self.df
+        pos = np.fromiter((index[t] for t in other.terms), dtype=np.int64, count=len(other.terms))
+        np.add.at(counts, pos, other.counts)
+        np.add.at(df, pos, other.df)
+        return TermStats(terms, counts, df, self.n_docs + other.n_docs)
+
+    def filtered(self, min_df: Optional[int] = None, max_df: float = 1.0) -> "TermStats":
+        min_df = default_min_df(self.n_docs) if min_df is None else min_df
+        keep = (self.df >= min_df) & (self.df <= max(1, int(max_df * self.n_docs)))
+        idx = np.flatnonzero(keep)
+        return TermStats([self.terms[i] for i in idx], self.counts[idx], self.df[idx], self.n_docs)
+
+    def idf(self) -> np.ndarray:
+        """Smoothed idf: ln((1 + N) / (1 + df)) + 1."""
+        return np.log((1 + self.n_docs) / (1 + self.df)) + 1.0
+
+    def top_counts(self, top_k: int = 20) -> List[Tuple[str, int]]:
+        order = _top_indices(self.counts, top_k, tiebreak=self.terms)
+        return [(self.terms[i], int(self.counts[i])) for i in order]
+
+    def key_phrases(self, top_k: int = 20) -> List[Tuple[str, int, float]]:
+        """(term, count, score) ranked by sublinear tf x idf over the whole corpus."""
+        if not self.terms:
+            return []
+        scores = (1.0 + np.log(self.counts)) * self.idf()
+        order = _top_indices(scores, top_k, tiebreak=self.terms)
+        return [(self.terms[i], int(self.counts[i]), round(float(scores[i]), 4)) for i in order]
+
+
+def _top_indices(values: np.ndarray, top_k: int, tiebreak: Sequence[str]) -> List[int]:
+    if len(values) == 0 or top_k <= 0:
+        return []
+    if len(values) > top_k * 4:
+        cand = np.argpartition(-values, top_k - 1)[:top_k]
+        # include every candidate tied with the k-th value so ties break deterministically
+        cand = np.flatnonzero(values >= values[cand].min())
+    else:
+        cand = np.arange(len(values))
+    return sorted(cand.tolist(), key=lambda i: (-values[i], tiebreak[i]))[:top_k]
+
+
+# =========================
+# Tokenization + counting
+# =========================
+
+def _as_text(answer: Any) -> str:
+    if answer is None:
+        return ""
+    if isinstance(answer, (list, tuple)):
+        return " ".join(str(a) for a in answer if a is not None)
+    return answer if isinstance(answer, str) else str(answer)
+
+
+def tokenize_corpus(answers: Sequence[Any]) -> List[bytes]:
+    """Latin-1 tokens of all answers, with _SEP_TOKEN between consecutive answers."""
+    joiner = f" {SEP} "
+    if all(type(a) is str for a in answers):
+        text = joiner.join(answers)
+        if text.count(SEP) != max(0, len(answers) - 1):  # an answer contained the separator itself
+            text = joiner.join(a.replace(SEP, " ") for a in answers)
+    else:
+        text = joiner.join(_as_text(a).replace(SEP, " ") for a in answers)
+    text = text.lower()
+    return text.encode("latin-1", "replace").translate(_BLANK_NON_WORD).split()
+
+
+def _encode(answers: Sequence[Any], stopwords: Iterable[str]) -> Tuple[np.ndarray, np.ndarray, List[str], np.ndarray]:
+    """One pass over the corpus -> (token ids, answer index per token, vocab, stopword mask over vocab)."""
+    tokens = tokenize_corpus(answers)
+    vocab: Dict[bytes, Any] = {_SEP_TOKEN: None}
+    vocab.update(dict.fromkeys(tokens))
+    for i, t in enumerate(vocab):
+        vocab[t] = i
+    ids = np.fromiter(map(vocab.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+    is_sep = ids == 0
+    doc = np.cumsum(is_sep)
+    keep = ~is_sep
+    terms = [t.decode("latin-1") for t in vocab]
+    stop = set(stopwords)
+    # The separator, stopwords, and 1-char tokens ("a", "'", "5") never start or join a phrase
+    drop = np.fromiter((t in stop or len(t.strip("'")) < 2 for t in terms), dtype=bool, count=len(terms))
+    drop[0] = True
+    return ids[keep], doc[keep], terms, drop
+
+
+def _ngram_keys(ids: np.ndarray, doc: np.ndarray, drop: np.ndarray, vocab_size: int, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """int64 key per n-gram (base-vocab_size digits) and its answer index; skips stopwords and answer boundaries."""
+    if n == 1:
+        ok = ~drop[ids]
+        return ids[ok], doc[ok]
+    if len(ids) < n:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    if vocab_size ** n >= 2 ** 63:
+        raise ValueError(f"Vocabulary too large for {n}-gram keys")
+    m = len(ids) - n + 1
+    ok = doc[:m] == doc[n - 1:]
+    keys = np.zeros(m, dtype=np.int64)
+    for j in range(n):
+        w = ids[j:j + m]
+        ok &= ~drop[w]
+        keys = keys * vocab_size + w
+    return keys[ok], doc[:m][ok]
+
+
+def _decode(key: int, vocab: List[str], n: int) -> str:
+    parts = []
+    for _ in range(n):
+        key, w = divmod(key, len(vocab))
+        parts.append(vocab[w])
+    return " ".join(reversed(parts))
+
+
+def count_matrix(
+    answers: Sequence[Any],
+    n: int = 1,
+    stopwords: Iterable[str] = STOPWORDS,
+) -> Tuple[sparse.csr_matrix, List[str]]:
+    """Answers x n-grams count matrix (CSR, int32) and the column terms."""
+    ids, doc, vocab, drop = _encode(answers, stopwords)
+    keys, rows = _ngram_keys(ids, doc, drop, len(vocab), n)
+    uniq, cols = np.unique(keys, return_inverse=True)
+    X = sparse.csr_matrix(
+        (np.ones(len(cols), dtype=np.int32), (rows, cols)), shape=(len(answers), len(uniq))
+    )
+    X.sum_duplicates()
+    return X, [_decode(int(k), vocab, n) for k in uniq]
+
+
+def idf_weights(X: sparse.csr_matrix) -> np.ndarray:
+    """Smoothed idf per column of a count matrix, as in TermStats.idf()."""
+    df = np.bincount(X.indices, minlength=X.shape[1])
+    return (np.log((1 + X.shape[0]) / (1 + df)) + 1.0).astype(np.float32)
+
+
+def tfidf_matrix(X: sparse.csr_matrix, idf: Optional[np.ndarray] = None, sublinear_tf: bool = True) -> sparse.csr_matrix:
+    """Row-normalized (l2) TF-IDF from a count matrix; empty answers stay all-zero rows.
+
+    idf: weights fitted on another corpus (e.g. a saved theme model); computed from X if omitted.
+    """
+    X = X.astype(np.float32, copy=True)
+    if sublinear_tf:
+        np.log1p(X.data, out=X.data)
+    X.data *= (idf_weights(X) if idf is None else idf)[X.indices]
+    norms = np.sqrt(np.asarray(X.multiply(X).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    X.data /= np.repeat(norms, np.diff(X.indptr)).astype(np.float32)
+    return X
+
+
+def _chunk_stats(args: Tuple[Sequence[Any], int, frozenset]) -> TermStats:
+    answers, n, stopwords = args
+    X, terms = count_matrix(answers, n=n, stopwords=stopwords)
+    counts = np.asarray(X.sum(axis=0)).ravel().astype(np.int64)
+    df = np.bincount(X.indices, minlength=X.shape[1]).astype(np.int64)
+    return TermStats(terms, counts, df, len(answers))
+
+
+def term_stats(
+    answers: Sequence[Any],
+    n: int = 1,
+    *,
+    stopwords: Iterable[str] = STOPWORDS,
+    min_df: Optional[int] = None,
+    max_df: float = 1.0,
+    chunk_size: int = CHUNK_SIZE,
+    workers: Optional[int] = None,
+) -> TermStats:
+    """Filtered n-gram stats. Corpora above chunk_size are counted chunk by chunk
+    (bounded peak memory) and, with workers > 1, in a process pool."""
+    answers = [a for a in answers if a is not None and a != ""]
+    stop = frozenset(stopwords)
+    workers = TEXT_WORKERS if workers is None else workers
+    if len(answers) <= chunk_size:
+        stats = _chunk_stats((answers, n, stop))
+    else:
+        jobs = [(answers[i:i + chunk_size], n, stop) for i in range(0, len(answers), chunk_size)]
+        stats = TermStats.empty()
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+                for part in pool.map(_chunk_stats, jobs):
+                    stats = stats.merge(part)
+        else:
+            for job in jobs:
+                stats = stats.merge(_chunk_stats(job))
+    return stats.filtered(min_df=min_df, max_df=max_df)
+
+
+def drop_stopword_grams(items: Iterable[Tuple[str, Any]], stopwords: Iterable[str] = STOPWORDS) -> List[Tuple[str, Any]]:
+    """Filter precomputed (gram, count) pairs (e.g. from the pushdown RPC) with the same rules."""
+    stop = set(stopwords)
+    return [
+        (g, c) for g, c in items
+        if not any(w in stop or len(w.strip("'")) < 2 for w in str(g).split())
+    ]
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Offline theme clustering of free-text answers (no external service).
+
+TF-IDF vectors from text_engine -> spherical mini-batch k-means (cosine),
+with k picked by silhouette score on a sample. ThemeModel.partial_fit() folds
+new answers into fitted centers, and to_dict() / from_dict() persist a model
+(JSON-safe). question_themes() keeps one model per question on disk and only
+folds in the answers added since the previous render.
+
+Usage:
+  python text_themes.py --form-id <UUID>                       # every text question
+  python text_themes.py --form-id <UUID> --snapshot offline --max-themes 6 --json
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import sys
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+import text_engine as te
+
+MAX_FEATURES = 5000       # vocabulary kept for clustering (highest document frequency)
+MIN_ANSWERS = 20          # below this, themes are not meaningful
+SELECTION_SAMPLE = 3000   # rows used to choose k
+SILHOUETTE_SAMPLE = 1500
+BATCH_SIZE = 1024
+REFIT_GROWTH = 2.0        # refit (new vocabulary and k) once a question has this many times the answers it was fitted on
+THEME_MODEL_DIR = Path(os.getenv(
+    "BENTO_THEME_MODEL_DIR", str(Path(__file__).resolve().parent / ".render_cache" / "themes")
+))
+
+
+@dataclass
+class Theme:
+    label: str
+    size: int
+    share: float
+    terms: List[str] = field(default_factory=list)
+    examples: List[str] = field(default_factory=list)
+
+
+# =========================
+# Spherical mini-batch k-means
+# =========================
+
+def _normalize_rows(C: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(C, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return C / norms
+
+
+def _assign(X: sparse.csr_matrix, centers: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Nearest center by cosine (rows and centers are unit length) -> (labels, similarity)."""
+    sims = np.asarray(X @ centers.T)
+    labels = sims.argmax(axis=1)
+    return labels, sims[np.arange(len(labels)), labels]
+
+
+def _cluster_sums(X: sparse.csr_matrix, labels: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    onehot = sparse.csr_matrix((np.ones(len(labels), dtype=np.float32), (labels, np.arange(len(labels)))), shape=(k, X.shape[0]))
+    return (onehot @ X).toarray(), np.bincount(labels, minlength=k)
+
+
+def _kmeans_pp(X: sparse.csr_matrix, k: int, rng: np.random.Generator) -> np.ndarray:
+    """k-means++ seeding with cosine distance."""
+    centers = np.zeros((k, X.shape[1]), dtype=np.float32)
+    centers[0] = X[rng.integers(X.shape[0])].toarray()
+    closest = 1.0 - np.asarray(X @ centers[0]).ravel()
+    for j in range(1, k):
+        weights = np.clip(closest, 0, None) ** 2
+        total = weights.sum()
+        idx = rng.choice(X.shape[0], p=weights / total) if total > 0 else rng.integers(X.shape[0])
+        centers[j] = X[idx].toarray()
+        closest = np.minimum(closest, 1.0 - np.asarray(X @ centers[j]).ravel())
+    return centers
+
+
+def _minibatch_step(X: sparse.csr_matrix, centers: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """One mini-batch update: each center moves to the running mean of everything assigned to it."""
+    labels, _ = _assign(X, centers)
+    sums, n = _cluster_sums(X, labels, len(centers))
+    total = counts + n
+    moved = n > 0
+    centers[moved] = (centers[moved] * counts[moved, None] + sums[moved]) / total[moved, None]
+    counts += n
+    return _normalize_rows(centers)
+
+
+def _lloyd(X: sparse.csr_matrix, centers: np.ndarray, max_iter: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """Full-batch refinement; returns (centers, cluster sizes)."""
+    counts = np.zeros(len(centers), dtype=np.float64)
+    for _ in range(max_iter):
+        labels, _ = _assign(X, centers)
+        sums, counts = _cluster_sums(X, labels, len(centers))
+        new = centers.copy()
+        new[counts > 0] = sums[counts > 0]
+        new = _normalize_rows(new)
+        if np.allclose(new, centers, atol=1e-4):
+            centers = new
+            break
+        centers = new
+    return centers, counts.astype(np.float64)
+
+
+def _silhouette(X: sparse.csr_matrix, labels: np.ndarray, k: int) -> float:
+    """Mean silhouette with cosine distance (X rows unit length)."""
+    D = 1.0 - np.asarray((X @ X.T).todense(), dtype=np.float64)
+    onehot = np.zeros((len(labels), k))
+    onehot[np.arange(len(labels)), labels] = 1.0
+    sums = D @ onehot
+    sizes = onehot.sum(axis=0)
+    if np.count_nonzero(sizes) < 2:
+        return 0.0  # undefined for a single cluster (e.g. identical answers)
+    own = sizes[labels]
+    a = sums[np.arange(len(labels)), labels] / np.maximum(own - 1, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_other = sums / sizes
+    mean_other[np.arange(len(labels)), labels] = np.inf
+    mean_other[:, sizes == 0] = np.inf
+    b = mean_other.min(axis=1)
+    s = np.where(own > 1, (b - a) / np.maximum(np.maximum(a, b), 1e-12), 0.0)
+    return float(s.mean())
+
+
+# =========================
+# Model
+# =========================
+
+class ThemeModel:
+    """Fitted vocabulary + idf + unit-length centers; supports incremental partial_fit()."""
+
+    def __init__(self, terms: List[str], idf: np.ndarray, centers: np.ndarray, counts: np.ndarray, seed: int = 0):
+        self.terms = terms
+        self.idf = np.asarray(idf, dtype=np.float32)
+        self.centers = np.asarray(centers, dtype=np.float32)
+        self.counts = np.asarray(counts, dtype=np.float64)
+        self._index = {t: i for i, t in enumerate(terms)}
+        self._rng = np.random.default_rng(seed)
+
+    @property
+    def k(self) -> int:
+        return len(self.centers)
+
+    @classmethod
+    def fit(
+        cls,
+        answers: Sequence[Any],
+        *,
+        max_themes: int = 8,
+        k: Optional[int] = None,
+        max_features: int = MAX_FEATURES,
+        batch_size: int = BATCH_SIZE,
+        epochs: int = 2,
+        seed: int = 0,
+    ) -> Optional["ThemeModel"]:
+        """Fit on a corpus; None when there are too few non-empty answers to cluster."""
+        rng = np.random.default_rng(seed)
+        X, terms, idf = _vectorize_fit(answers, max_features)
+        X = X[X.getnnz(axis=1) > 0]
+        if X.shape[0] < MIN_ANSWERS or not terms:
+            return None
+        if k is None:
+            k = choose_k(X, max_themes, rng)
+        k = max(2, min(k, X.shape[0]))
+        centers = _kmeans_pp(X, k, rng)
+        counts = np.zeros(k, dtype=np.float64)
+        for _ in range(epochs):
+            order = rng.permutation(X.shape[0])
+            for start in range(0, len(order), batch_size):
+                centers = _minibatch_step(X[order[start:start + batch_size]], centers, counts)
+        centers, counts = _lloyd(X, centers)
+        return cls(terms, idf, centers, counts, seed=seed)
+
+    def transform(self, answers: Sequence[Any]) -> sparse.csr_matrix:
+        """TF-IDF rows in this model's vocabulary (unknown terms ignored)."""
+        X, terms = te.count_matrix(answers, n=1)
+        colmap = np.fromiter((self._index.get(t, -1) for t in terms), dtype=np.int64, count=len(terms))
+        coo = X.tocoo()
+        cols = colmap[coo.col]
+        ok = cols >= 0
+        X = sparse.csr_matrix((coo.data[ok], (coo.row[ok], cols[ok])), shape=(X.shape[0], len(self.terms)))
+        return te.tfidf_matrix(X, idf=self.idf)
+
+    def partial_fit(self, answers: Sequence[Any], batch_size: int = BATCH_SIZE) -> "ThemeModel":
+        """Fold new answers into the centers (mini-batch updates; vocabulary stays fixed)."""
+        X = self.transform(answers)
+        X = X[X.getnnz(axis=1) > 0]
+        for start in range(0, X.shape[0], batch_size):
+            self.centers = _minibatch_step(X[start:start + batch_size], self.centers, self.counts)
+        return self
+
+    def predict(self, answers: Sequence[Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """(labels, cosine similarity to the center); label -1 for answers with no known terms."""
+        X = self.transform(answers)
+        labels, sims = _assign(X, self.centers)
+        empty = X.getnnz(axis=1) == 0
+        labels[empty] = -1
+        sims[empty] = 0.0
+        return labels, sims
+
+    def themes(self, answers: Sequence[Any], top_terms: int = 5, examples: int = 3) -> List[Theme]:
+        texts = [te._as_text(a) for a in answers]
+        labels, sims = self.predict(texts)
+        clustered = int((labels >= 0).sum())
+        out: List[Theme] = []
+        for j in range(self.k):
+            members = np.flatnonzero(labels == j)
+            if len(members) == 0:
+                continue
+            words = [self.terms[i] for i in np.argsort(-self.centers[j])[:top_terms] if self.centers[j, i] > 0]
+            picked: List[str] = []
+            for i in members[np.argsort(-sims[members])]:
+                text = " ".join(texts[i].split())
+                if text and text not in picked:
+                    picked.append(text if len(text) <= 160 else text[:157] + "…")
+                if len(picked) == examples:
+                    break
+            out.append(Theme(
+                label=" / ".join(words[:3]),
+                size=len(members),
+                share=round(len(members) / clustered, 4),
+                terms=words,
+                examples=picked,
+            ))
+        return sorted(out, key=lambda t: -t.size)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "kind": "themes",
+            "terms": self.terms,
+            "idf": self.idf.tolist(),
+            "centers": self.centers.tolist(),
+            "counts": self.counts.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ThemeModel":
+        return cls(data["terms"], np.array(data["idf"]), np.array(data["centers"]), np.array(data["counts"]))
+
+
+def _vectorize_fit(answers: Sequence[Any], max_features: int) -> Tuple[sparse.csr_matrix, List[str], np.ndarray]:
+    X, terms = te.count_matrix(answers, n=1)
+    df = np.bincount(X.indices, minlength=X.shape[1])
+    keep = df >= te.default_min_df(X.shape[0])
+    # Terms in most answers (the question's own subject) do not separate themes
+    ubiquitous = df > 0.5 * X.shape[0]
+    if (keep & ~ubiquitous).any():
+        keep &= ~ubiquitous
+    cols = np.flatnonzero(keep)
+    if len(cols) > max_features:
+        cols = np.sort(cols[np.argsort(-df[cols], kind="stable")[:max_features]])
+    X = X[:, cols]
+    idf = te.idf_weights(X)
+    return te.tfidf_matrix(X, idf=idf), [terms[i] for i in cols], idf
+
+
+def choose_k(X: sparse.csr_matrix, max_themes: int, rng: np.random.Generator) -> int:
+    """Best silhouette over k = 2..max_themes, fitted on a row sample; ties go to the smaller k."""
+    k_max = max(2, min(max_themes, int(math.sqrt(X.shape[0] / 2))))
+    sample = X[rng.choice(X.shape[0], size=min(SELECTION_SAMPLE, X.shape[0]), replace=False)]
+    probe = sample[:SILHOUETTE_SAMPLE]
+    best_k, best_score = 2, -np.inf
+    for k in range(2, k_max + 1):
+        centers, _ = _lloyd(sample, _kmeans_pp(sample, k, rng), max_iter=5)
+        labels, _ = _assign(probe, centers)
+        score = _silhouette(probe, labels, k)
+        if score > best_score + 1e-3:
+            best_k, best_score = k, score
+    return best_k
+
+
+def extract_themes(answers: Sequence[Any], max_themes: int = 8, seed: int = 0) -> List[Theme]:
+    """Fit + describe in one call (what the text_themes chart uses); [] when too few answers."""
+    model = ThemeModel.fit(answers, max_themes=max_themes, seed=seed)
+    return model.themes(answers) if model is not None else []
+
+
+def _answer_keys(answers: Sequence[Any]) -> List[str]:
+    return [hashlib.blake2b(te._as_text(a).encode("utf-8"), digest_size=8).hexdigest() for a in answers]
+
+
+def question_themes(
+    question_id: Optional[str],
+    answers: Sequence[Any],
+    max_themes: int = 8,
+    seed: int = 0,
+    model_dir: Path = THEME_MODEL_DIR,
+) -> List[Theme]:
+    """extract_themes() with the fitted model kept per question in model_dir
+    (question_id may carry a suffix, e.g. a segment, to keep separate models).
+
+    Answers not seen by the stored model are folded in with partial_fit(); it
+    is refit when answers were removed or edited, max_themes changed, or the
+    question has grown REFIT_GROWTH-fold since the last fit.
+    """
+    if not question_id:
+        return extract_themes(answers, max_themes=max_themes, seed=seed)
+    keys = _answer_keys(answers)
+    path = model_dir / f"{question_id}.json"
+    try:
+        saved = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        saved = None
+
+    model = None
+    if saved and saved.get("max_themes") == max_themes and saved.get("seed") == seed \
+            and len(keys) <= REFIT_GROWTH * saved["fitted_on"]:
+        unseen = Counter(saved["answers"])
+        added = []
+        for answer, key in zip(answers, keys):
+            if unseen[key] > 0:
+                unseen[key] -= 1
+            else:
+                added.append(answer)
+        if not any(unseen.values()):
+            model, fitted_on = ThemeModel.from_dict(saved["model"]), saved["fitted_on"]
+    if model is None:
+        model = ThemeModel.fit(answers, max_themes=max_themes, seed=seed)
+        if model is None:
+            return []
+        fitted_on, added = len(keys), list(answers)
+    elif added:
+        model.partial_fit(added)
+    if added:
+        _save_model(path, {
+            "max_themes": max_themes,
+            "seed": seed,
+            "fitted_on": fitted_on,
+            "answers": keys,
+            "model": model.to_dict(),
+        })
+    return model.themes(answers)
+
+
+def persisted_render_state(question_ids: Sequence[str], model_dir: Path = THEME_MODEL_DIR) -> Dict[str, Any]:
+    """Stored models of these questions, segments included (part of render_cache's ETag)."""
+    state = {}
+    for qid in question_ids:
+        for path in model_dir.glob(f"{qid}*.json"):
+            stat = path.stat()
+            state[path.name] = [stat.st_size, stat.st_mtime_ns]
+    return state
+
+
+def _save_model(path: Path, data: Dict[str, Any]) -> None:
+    """Atomic replace; a failed write only costs a refit on the next render."""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, path)
+    except OSError as exc:
+        print(f"⚠️ Could not save theme model ({exc})", file=sys.stderr)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    import bento
+
+    p = argparse.ArgumentParser(description="Cluster a form's free-text answers into themes")
+    p.add_argument("--form-id", required=True, help="UUID of the form")
+    p.add_argument("--snapshot", choices=bento.SNAPSHOT_MODES, help="Read answers via the local SQLite snapshot")
+    p.add_argument("--max-themes", type=int, default=8)
+    p.add_argument("--json", action="store_true", help="Print themes as JSON")
+    args = p.parse_args(argv)
+
+    _, _, records = bento.load_grouped_from_retrieve(args.form_id, snapshot=args.snapshot)
+    result = {}
+    for rec in records:
+        if rec.answer_type != "text":
+            continue
+        result[rec.label] = [asdict(t) for t in extract_themes(rec.answers, max_themes=args.max_themes)]
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+    for label, themes in result.items():
+        print(f"📝 {label}")
+        if not themes:
+            print("   (too few answers to cluster)")
+        for t in themes:
+            print(f"   {t['share']:6.1%}  {t['label']}  ({t['size']})")
+            for ex in t["examples"]:
+                print(f"           “{ex}”")
+
+
+if __name__ == "__main__":
+    main()
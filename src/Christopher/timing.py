@@ -0,0 +1,110 @@
+"""Lightweight span timers for the dashboard pipeline.
+
+    with timing.span("supabase.page", table="answer", start=0):
+        ...
+
+Disabled by default: span() then returns one shared no-op context manager, so
+instrumented code pays a global lookup and a call. When enabled, spans are kept
+in memory and can be summarized per stage (for the bento_service payload) or
+written as a Chrome trace (chrome://tracing, Perfetto).
+"""
+
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+_enabled = os.getenv("BENTO_TIMINGS", "0") not in ("0", "false", "False", "")
+_spans: List[Dict[str, Any]] = []
+_origin_ns = time.perf_counter_ns()
+_NULL = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "start_ns")
+
+    def __init__(self, name: str, cat: str, args: Dict[str, Any]):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        end_ns = time.perf_counter_ns()
+        _spans.append({
+            "name": self.name,
+            "cat": self.cat,
+            "start_ns": self.start_ns - _origin_ns,
+            "dur_ns": end_ns - self.start_ns,
+            "tid": threading.get_ident(),
+            "args": self.args,
+        })
+
+
+def enable(on: bool = True) -> None:
+    global _enabled
+    _enabled = on
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    global _origin_ns
+    _spans.clear()
+    _origin_ns = time.perf_counter_ns()
+
+
+def span(name: str, cat: str = "bento", **args: Any):
+    if not _enabled:
+        return _NULL
+    return _Span(name, cat, args)
+
+
+def summary() -> Dict[str, Any]:
+    """Per-stage totals: {"wall_ms", "stages": {name: {count, total_ms, max_ms}}}."""
+    stages: Dict[str, Dict[str, Any]] = {}
+    wall_ns = 0
+    for s in _spans:
+        st = stages.setdefault(s["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        ms = s["dur_ns"] / 1e6
+        st["count"] += 1
+        st["total_ms"] += ms
+        st["max_ms"] = max(st["max_ms"], ms)
+        wall_ns = max(wall_ns, s["start_ns"] + s["dur_ns"])
+    for st in stages.values():
+        st["total_ms"] = round(st["total_ms"], 3)
+        st["max_ms"] = round(st["max_ms"], 3)
+    return {"wall_ms": round(wall_ns / 1e6, 3), "stages": stages}
+
+
+def write_chrome_trace(path: Path, process_name: Optional[str] = None) -> Path:
+    """Complete ("X") events in the Chrome trace-event format; nesting comes from the timestamps."""
+    pid = os.getpid()
+    events: List[Dict[str, Any]] = [
+        {
+            "name": s["name"],
+            "cat": s["cat"],
+            "ph": "X",
+            "ts": s["start_ns"] / 1e3,
+            "dur": s["dur_ns"] / 1e3,
+            "pid": pid,
+            "tid": s["tid"],
+            "args": {k: v if isinstance(v, (int, float, bool)) or v is None else str(v) for k, v in s["args"].items()},
+        }
+        for s in _spans
+    ]
+    if process_name:
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process_name}})
+    path = Path(path)
+    path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+    return path
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Admission control for realtime sessions and LLM-backed endpoints
+
+Sessions: a global cap and a per-client-IP cap on open /ws connections.
+LLM endpoints: a token bucket on the admission rate (429 when empty), a
+per-IP cap on in-flight requests (429), and a fixed number of concurrent
+slots with a bounded wait queue (503 when the queue is full or the wait
+times out). Rejections are immediate, so under overload admitted work keeps
+its latency instead of everything slowing down together.
+"""
+
+import os
+import time
+import math
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from fastapi import HTTPException
+import metrics
+
+MAX_REALTIME_SESSIONS = int(os.getenv("MAX_REALTIME_SESSIONS", 200))
+MAX_SESSIONS_PER_IP = int(os.getenv("MAX_SESSIONS_PER_IP", 5))
+LLM_ADMISSION_RATE = float(os.getenv("LLM_ADMISSION_RATE", 2))  # requests/second refilled into the bucket
+LLM_ADMISSION_BURST = int(os.getenv("LLM_ADMISSION_BURST", 20))  # bucket size
+LLM_MAX_CONCURRENT = int(os.getenv("LLM_MAX_CONCURRENT", 8))
+LLM_MAX_PER_IP = int(os.getenv("LLM_MAX_PER_IP", 4))  # in-flight + queued per client IP
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", 16))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 5))  # seconds a request may wait for a slot
+ADMISSION_TRUST_FORWARDED_FOR = os.getenv("ADMISSION_TRUST_FORWARDED_FOR", "0") in ("1", "true", "True")
+SESSION_DEGRADED_RATIO = 0.8  # /health reports "degraded" above this share of the session cap
+
+admission_rejections = metrics.registry.counter(
+    "admission_rejections_total", "Requests and sessions turned away by admission control", ("kind", "reason")
+)
+llm_queue_wait_seconds = metrics.registry.histogram(
+    "admission_llm_queue_wait_seconds", "Time admitted LLM requests waited for a slot",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10)
+)
+
+def client_ip(connection) -> str:
+    """Client address of a Request or WebSocket (first X-Forwarded-For hop when trusted)"""
+    if ADMISSION_TRUST_FORWARDED_FOR:
+        forwarded = connection.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return connection.client.host if connection.client else "unknown"
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def retry_after(self) -> int:
+        """Whole seconds until the next token"""
+        if self.rate <= 0:
+            return 0
+        self._refill()
+        return max(1, math.ceil((1 - self.tokens) / self.rate))
+
+    def available(self) -> float:
+        self._refill()
+        return round(self.tokens, 2)
+
+class SessionAdmission:
+    """Global and per-IP caps on open realtime sessions"""
+
+    def __init__(self, max_sessions: int = MAX_REALTIME_SESSIONS, max_per_ip: int = MAX_SESSIONS_PER_IP):
+        self.max_sessions = max_sessions
+        self.max_per_ip = max_per_ip
+        self.active = 0
+        self._per_ip: Dict[str, int] = {}
+        self.rejected = 0
+
+    def try_acquire(self, ip: str) -> Optional[str]:
+        """None when admitted, else the rejection reason"""
+        reason = None
+        if self.active >= self.max_sessions:
+            reason = "server_full"
+        elif self._per_ip.get(ip, 0) >= self.max_per_ip:
+            reason = "too_many_sessions_for_client"
+        if reason:
+            self.rejected += 1
+            admission_rejections.inc(kind="session", reason=reason)
+            return reason
+        self.active += 1
+        self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+        return None
+
+    def release(self, ip: str):
+        self.active -= 1
+        left = self._per_ip.get(ip, 1) - 1
+        if left > 0:
+            self._per_ip[ip] = left
+        else:
+            self._per_ip.pop(ip, None)
+
+    @property
+    def accepting(self) -> bool:
+        return self.active < self.max_sessions
+
+class AdmissionTicket:
+    """An admitted LLM request; release() is idempotent"""
+
+    def __init__(self, admission: "LLMAdmission", ip: str):
+        self._admission = admission
+        self.ip = ip
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._admission._release(self.ip)
+
+class LLMAdmission:
+    def __init__(
+        self,
+        rate: float = LLM_ADMISSION_RATE,
+        burst: int = LLM_ADMISSION_BURST,
+        max_concurrent: int = LLM_MAX_CONCURRENT,
+        max_per_ip: int = LLM_MAX_PER_IP,
+        queue_size: int = LLM_QUEUE_SIZE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_per_ip = max_per_ip
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._per_ip: Dict[str, int] = {}
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _reject(self, status: int, reason: str, retry_after: int):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        admission_rejections.inc(kind="llm", reason=reason)
+        raise HTTPException(
+            status_code=status,
+            detail=f"Server busy ({reason.replace('_', ' ')}), retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def acquire(self, ip: str) -> AdmissionTicket:
+        """Admit one request or raise HTTPException 429/503 with Retry-After"""
+        if self._per_ip.get(ip, 0) >= self.max_per_ip:
+            self._reject(429, "too_many_requests_for_client", 1)
+        if self.shedding:
+            self._reject(503, "queue_full", max(1, round(self.queue_timeout)))
+        if not self.bucket.try_take():
+            self._reject(429, "rate_limited", self.bucket.retry_after())
+
+        self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+        self.queued += 1
+        wait_started = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._drop_ip(ip)
+            self._reject(503, "queue_timeout", max(1, round(self.queue_timeout)))
+        except BaseException:
+            self._drop_ip(ip)
+            raise
+        finally:
+            self.queued -= 1
+        llm_queue_wait_seconds.observe(time.perf_counter() - wait_started)
+        self.in_flight += 1
+        return AdmissionTicket(self, ip)
+
+    def _drop_ip(self, ip: str):
+        left = self._per_ip.get(ip, 1) - 1
+        if left > 0:
+            self._per_ip[ip] = left
+        else:
+            self._per_ip.pop(ip, None)
+
+    def _release(self, ip: str):
+        self.in_flight -= 1
+        self._drop_ip(ip)
+        self._slots.release()
+
+    @asynccontextmanager
+    async def admit(self, ip: str):
+        ticket = await self.acquire(ip)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    async def hold(self, ticket: AdmissionTicket, chunks: AsyncIterator) -> AsyncIterator:
+        """Keep the slot while a streamed response is being sent"""
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            ticket.release()
+
+    @property
+    def shedding(self) -> bool:
+        return self._slots.locked() and self.queued >= self.queue_size
+
+session_admission = SessionAdmission()
+llm_admission = LLMAdmission()
+
+metrics.registry.gauge("admission_sessions_active", "Realtime sessions counted by admission control",
+                       callback=lambda: session_admission.active)
+metrics.registry.gauge("admission_llm_in_flight", "Admitted LLM requests holding a slot",
+                       callback=lambda: llm_admission.in_flight)
+metrics.registry.gauge("admission_llm_queued", "LLM requests waiting for a slot",
+                       callback=lambda: llm_admission.queued)
+
+def load_status() -> Dict:
+    """Load-shedding signals for /health"""
+    sessions, llm = session_admission, llm_admission
+    overloaded = not sessions.accepting or llm.shedding
+    degraded = sessions.active >= SESSION_DEGRADED_RATIO * sessions.max_sessions or llm.queued > 0
+    return {
+        "status": "overloaded" if overloaded else "degraded" if degraded else "ok",
+        "accepting_sessions": sessions.accepting,
+        "accepting_llm_requests": not llm.shedding,
+        "sessions": {
+            "active": sessions.active,
+            "max": sessions.max_sessions,
+            "max_per_ip": sessions.max_per_ip,
+            "rejected": sessions.rejected,
+        },
+        "llm": {
+            "in_flight": llm.in_flight,
+            "max_concurrent": llm.max_concurrent,
+            "queued": llm.queued,
+            "queue_size": llm.queue_size,
+            "tokens_available": llm.bucket.available(),
+            "rejected": dict(llm.rejected),
+        },
+    }
@@ -4,17 +4,30 @@ API routes for OpenAI Realtime API proxy
 """
 
 import os
+import copy
+import json
+import time
+import asyncio
 import aiohttp
 from datetime import datetime
 from fastapi import HTTPException
-from prompts import DEFAULT_SESSION_CONFIG, DEFAULT_INSTRUCTIONS, DEFAULT_VOICE
+from prompts import DEFAULT_INSTRUCTIONS, DEFAULT_VOICE
+from session_config_cache import session_config_cache
+from audio_coalescer import coalescer_totals
+from admission import load_status
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_REALTIME_MODEL = "gpt-realtime-2025-08-28"
 
 async def health_check():
-    """Health check endpoint"""
-    return {"status": "ok", "service": "openai-realtime-proxy"}
+    """Health check endpoint; status is "ok", "degraded" or "overloaded" (load shedding)"""
+    load = load_status()
+    return {
+        "status": load["status"],
+        "service": "openai-realtime-proxy",
+        "load": load,
+        "audio_coalescing": coalescer_totals.stats(),
+    }
 
 async def create_session():
     """Create an ephemeral OpenAI Realtime API session"""
@@ -60,7 +73,8 @@ async def get_session_config():
     """Get the current session configuration"""
     try:
         return {
-            "sessionConfig": DEFAULT_SESSION_CONFIG.copy(),
+            # Copy: the cached dict is shared with every later connect
+            "sessionConfig": copy.deepcopy(session_config_cache.get("form_creation").config),
             "model": OPENAI_REALTIME_MODEL,
             "voice": DEFAULT_VOICE,
             "instructions": DEFAULT_INSTRUCTIONS
@@ -71,35 +85,41 @@ async def get_session_config():
             detail=f"Failed to get session config: {str(error)}"
         )
 
+async def wait_for_latest_analysis() -> str:
+    """Wait briefly for the post-conversation analysis and return it (404 if none appears)"""
+    from form_generator import get_latest_analysis
+    
+    # Wait a bit for analysis to be completed after conversation save
+    print(f"   ⏳ WAITING 0.5 SECONDS FOR ANALYSIS TO COMPLETE...")
+    await asyncio.sleep(0.5)
+    
+    # Get the latest analysis with retry mechanism
+    print(f"   🔍 SEARCHING FOR LATEST ANALYSIS...")
+    analysis = await get_latest_analysis()
+    
+    # If no analysis found, wait a bit more and try again
+    if not analysis:
+        print(f"   ⏳ NO ANALYSIS YET, WAITING ADDITIONAL 1 SECOND...")
+        await asyncio.sleep(1.0)
+        analysis = await get_latest_analysis()
+    
+    if not analysis:
+        print(f"   ❌ NO ANALYSIS FOUND AFTER RETRIES")
+        raise HTTPException(
+            status_code=404,
+            detail="No conversation analysis found. Please ensure you had a conversation before generating the form."
+        )
+    return analysis
+
 async def generate_form_from_latest_session():
     """Generate form JSON from the latest conversation analysis"""
     print(f"\n🚀 API CALL: GENERATE FORM FROM LATEST SESSION")
     print(f"   Timestamp: {datetime.now().isoformat()}")
     
     try:
-        from form_generator import get_latest_analysis, generate_form_from_analysis
-        import asyncio
+        from form_generator import generate_form_from_analysis
         
-        # Wait a bit for analysis to be completed after conversation save
-        print(f"   ⏳ WAITING 0.5 SECONDS FOR ANALYSIS TO COMPLETE...")
-        await asyncio.sleep(0.5)
-        
-        # Get the latest analysis with retry mechanism
-        print(f"   🔍 SEARCHING FOR LATEST ANALYSIS...")
-        analysis = await get_latest_analysis()
-        
-        # If no analysis found, wait a bit more and try again
-        if not analysis:
-            print(f"   ⏳ NO ANALYSIS YET, WAITING ADDITIONAL 1 SECOND...")
-            await asyncio.sleep(1.0)
-            analysis = await get_latest_analysis()
-        
-        if not analysis:
-            print(f"   ❌ NO ANALYSIS FOUND AFTER RETRIES")
-            raise HTTPException(
-                status_code=404,
-                detail="No conversation analysis found. Please ensure you had a conversation before generating the form."
-            )
+        analysis = await wait_for_latest_analysis()
         
         print(f"   ✅ ANALYSIS FOUND: {len(analysis)} characters")
         print(f"   🔍 ANALYSIS PREVIEW: {analysis[:200]}...")
@@ -131,10 +151,33 @@ async def generate_form_from_latest_session():
             detail=f"Failed to generate form: {str(error)}"
         )
 
+async def stream_form_from_latest_session():
+    """Find the latest analysis, then return an SSE generator of the streamed form"""
+    print(f"\n🚀 API CALL: STREAM FORM FROM LATEST SESSION")
+    print(f"   Timestamp: {datetime.now().isoformat()}")
+    
+    from form_generator import stream_form_from_analysis
+    
+    # Resolve the analysis up front so a missing one is still a plain 404
+    analysis = await wait_for_latest_analysis()
+    
+    async def sse_events():
+        async for event, data in stream_form_from_analysis(analysis):
+            yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    return sse_events()
+
 async def generate_form_answers_from_session(session_id: str, questions: list):
     """Generate form answers from a specific conversation session"""
     try:
         from form_completion_processor import process_form_completion_session
+        from live_answers import live_answers_for
+        
+        # Answers extracted live during the session, when they cover every turn
+        result = await live_answers_for(session_id, questions)
+        if result is not None:
+            print(f"Returning live answers for session {session_id}")
+            return result
         
         # Process the session to extract answers
         result = await process_form_completion_session(session_id, questions)
@@ -154,3 +197,63 @@ async def generate_form_answers_from_session(session_id: str, questions: list):
             status_code=500,
             detail=f"Failed to generate form answers: {str(error)}"
         )
+
+MAX_BATCH_SESSIONS = int(os.getenv("MAX_BATCH_SESSIONS", 1000))
+
+async def generate_form_answers_batch(session_ids: list, questions: list):
+    """Process many form completion sessions concurrently, yielding NDJSON lines as each finishes"""
+    from form_completion_processor import process_form_completion_session
+    from rate_limiter import openai_rate_limiter
+
+    # Deduplicate while keeping request order
+    unique_ids = list(dict.fromkeys(session_ids))
+    batch_start = time.perf_counter()
+
+    async def run_one(session_id: str) -> dict:
+        queued_at = time.perf_counter()
+        started_at = None
+        try:
+            async with openai_rate_limiter:
+                started_at = time.perf_counter()
+                result = await process_form_completion_session(session_id, questions)
+        except Exception as error:
+            result = {"error": f"Session processing failed: {str(error)}"}
+            if started_at is None:
+                # Failed before leaving the queue
+                started_at = queued_at
+        finished_at = time.perf_counter()
+
+        line = {
+            "type": "result",
+            "session_id": session_id,
+            "status": "error" if "error" in result else "ok",
+            "queued_ms": round((started_at - queued_at) * 1000, 1),
+            "duration_ms": round((finished_at - started_at) * 1000, 1),
+        }
+        if "error" in result:
+            line["error"] = result["error"]
+        else:
+            line["result"] = result
+        return line
+
+    tasks = [asyncio.create_task(run_one(session_id)) for session_id in unique_ids]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            line = await next_done
+            if line["status"] == "ok":
+                succeeded += 1
+            yield json.dumps(line) + "\n"
+
+        yield json.dumps({
+            "type": "summary",
+            "total": len(unique_ids),
+            "succeeded": succeeded,
+            "failed": len(unique_ids) - succeeded,
+            "duration_ms": round((time.perf_counter() - batch_start) * 1000, 1),
+        }) + "\n"
+    finally:
+        # Client went away mid-stream: don't keep burning OpenAI quota
+        for task in tasks:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Coalesces client PCM16 audio frames into larger upstream sends to the Realtime API
+"""
+
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional
+
+AUDIO_COALESCE_MS = int(os.getenv("AUDIO_COALESCE_MS", 100))  # 0 forwards every frame as-is
+AUDIO_FLUSH_DEADLINE_MS = int(os.getenv("AUDIO_FLUSH_DEADLINE_MS", 120))  # max wait of the oldest buffered byte
+AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", 24000))  # Realtime API pcm16 default
+AUDIO_SAMPLE_WIDTH = 2  # bytes per PCM16 sample (mono)
+
+class CoalescerTotals:
+    """Process-wide counters, summed over closed and live sessions"""
+
+    def __init__(self):
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.sends_out = 0
+        self.deadline_flushes = 0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "frames_in": self.frames_in,
+            "bytes_in": self.bytes_in,
+            "sends_out": self.sends_out,
+            "deadline_flushes": self.deadline_flushes,
+            "frame_reduction": round(self.frames_in / self.sends_out, 2) if self.sends_out else 0.0,
+        }
+
+coalescer_totals = CoalescerTotals()
+
+class AudioCoalescer:
+    """Buffers binary audio frames and sends them upstream in chunks of ~target_ms.
+
+    Frames are copied once into a preallocated bytearray and sent as a
+    memoryview slice of it, so there is no per-frame allocation or
+    concatenation. A buffer is flushed when it reaches the target size, when
+    its oldest byte has waited deadline_ms (keeps server VAD latency bounded
+    when the client pauses), and before any text message goes upstream so
+    audio and events such as input_audio_buffer.commit stay in order.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes], Awaitable[None]],
+        target_ms: int = AUDIO_COALESCE_MS,
+        deadline_ms: int = AUDIO_FLUSH_DEADLINE_MS,
+        sample_rate: int = AUDIO_SAMPLE_RATE,
+    ):
+        self._send = send
+        self.sample_rate = sample_rate
+        self.target_bytes = max(0, target_ms) * sample_rate // 1000 * AUDIO_SAMPLE_WIDTH  # whole samples
+        self.deadline = max(0, deadline_ms) / 1000
+        # Headroom for one extra client frame past the target before a flush
+        self._buf = bytearray(self.target_bytes * 2)
+        self._view = memoryview(self._buf)
+        self._fill = 0
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._deadline_task: Optional[asyncio.Task] = None
+        self.frames_in = 0
+        self.bytes_in = 0
+        self.sends_out = 0
+        self.deadline_flushes = 0
+        self.max_wait_ms = 0.0
+        self._first_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.target_bytes > 0
+
+    async def push(self, frame: bytes):
+        """Queue one client frame; sends upstream when the buffer is full"""
+        self.frames_in += 1
+        self.bytes_in += len(frame)
+        coalescer_totals.frames_in += 1
+        coalescer_totals.bytes_in += len(frame)
+        async with self._lock:
+            if not self.enabled:
+                await self._send_upstream(frame)
+                return
+            if len(frame) >= self.target_bytes or self._fill + len(frame) > len(self._buf):
+                # Buffered audio goes first so frames reach upstream in order
+                await self._flush_locked()
+            if len(frame) >= self.target_bytes:
+                # Already big enough (or bigger than the buffer): forward without copying
+                await self._send_upstream(frame)
+                return
+            self._view[self._fill:self._fill + len(frame)] = frame
+            if self._fill == 0:
+                self._first_at = time.monotonic()
+                self._arm_deadline()
+            self._fill += len(frame)
+            if self._fill >= self.target_bytes:
+                await self._flush_locked()
+
+    async def flush(self):
+        """Send whatever is buffered (before text events and on disconnect)"""
+        async with self._lock:
+            await self._flush_locked()
+
+    async def close(self, send_pending: bool = True):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if send_pending:
+            try:
+                await self.flush()
+            except Exception as error:
+                print(f"   ⚠️ COULD NOT FLUSH BUFFERED AUDIO: {error}")
+        self._fill = 0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "target_ms": round(self.target_bytes * 1000 / (self.sample_rate * AUDIO_SAMPLE_WIDTH)),
+            "frames_in": self.frames_in,
+            "bytes_in": self.bytes_in,
+            "sends_out": self.sends_out,
+            "deadline_flushes": self.deadline_flushes,
+            "frame_reduction": round(self.frames_in / self.sends_out, 2) if self.sends_out else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+        }
+
+    def _arm_deadline(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.deadline, self._on_deadline)
+
+    def _on_deadline(self):
+        self._timer = None
+        self._deadline_task = asyncio.ensure_future(self._deadline_flush())
+
+    async def _deadline_flush(self):
+        async with self._lock:
+            if self._fill and time.monotonic() - self._first_at >= self.deadline:
+                self.deadline_flushes += 1
+                coalescer_totals.deadline_flushes += 1
+                try:
+                    await self._flush_locked()
+                except Exception as error:
+                    print(f"   ❌ AUDIO DEADLINE FLUSH FAILED: {error}")
+
+    async def _flush_locked(self):
+        if not self._fill:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.max_wait_ms = max(self.max_wait_ms, (time.monotonic() - self._first_at) * 1000)
+        # The websocket library serializes the frame before send() returns, so
+        # the buffer can be reused as soon as the await completes
+        chunk = self._view[:self._fill]
+        self._fill = 0
+        await self._send_upstream(chunk)
+
+    async def _send_upstream(self, data):
+        self.sends_out += 1
+        coalescer_totals.sends_out += 1
+        await self._send(data)
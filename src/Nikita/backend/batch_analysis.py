@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Offline batch re-analysis of saved conversations via the OpenAI Batch API
+
+Builds a Batch API JSONL input from every transcript in discussions/ and
+discussions_form_completion/, submits it (or runs it through a local stand-in
+with --dry-run), then ingests the results back into the analysis folders.
+
+Progress is checkpointed in <work-dir>/state.json, so re-running the same
+command after an interruption resumes where it stopped. Sessions whose
+analysis file is newer than their transcript are skipped unless --force.
+
+Transcripts too long for one prompt (transcript_chunking.needs_chunking) are
+left out of the batch input and analyzed after ingest with the same
+map-reduce helpers as the live endpoints (analyze_long_transcript,
+analyze_long_form_completion).
+
+Usage:
+  python batch_analysis.py                          # transcripts + form completions
+  python batch_analysis.py --kind transcripts
+  python batch_analysis.py --questions questions.json --kind form_completion
+  python batch_analysis.py --dry-run                # no network, writes under <work-dir>/dry_run/
+"""
+
+import os
+import sys
+import json
+import asyncio
+import argparse
+import aiohttp
+import aiofiles
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from dotenv import load_dotenv
+
+from prompts import TRANSCRIPT_ANALYSIS_PROMPT, FORM_COMPLETION_ANALYSIS_PROMPT
+from conversation_logger import (
+    BACKEND_DIR,
+    DISCUSSIONS_DIR,
+    FORM_COMPLETION_DISCUSSIONS_DIR,
+    ANALYSIS_DIR,
+    FORM_COMPLETION_ANALYSIS_DIR,
+    ConversationLogger,
+    extract_transcript_body,
+)
+from form_completion_processor import format_questions_for_prompt, analyze_long_form_completion
+from chatgpt_parser import analyze_long_transcript
+from transcript_chunking import needs_chunking
+from llm_cache import OpenAIAPIError
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+DEFAULT_WORK_DIR = BACKEND_DIR / 'batch_runs'
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Same request parameters as the synchronous code paths
+KIND_SETTINGS = {
+    "transcripts": {
+        "source_dir": DISCUSSIONS_DIR,
+        "analysis_dir": ANALYSIS_DIR,
+        "analysis_suffix": "_analysis.txt",
+        "max_tokens": 300,
+        "temperature": 0,
+    },
+    "form_completion": {
+        "source_dir": FORM_COMPLETION_DISCUSSIONS_DIR,
+        "analysis_dir": FORM_COMPLETION_ANALYSIS_DIR,
+        "analysis_suffix": "_form_completion_analysis.txt",
+        "max_tokens": 1000,
+        "temperature": 0.1,
+    },
+}
+
+# ============================================================================
+# STATE
+# ============================================================================
+
+class BatchState:
+    """Checkpoint of one batch run, persisted as JSON after every step."""
+
+    def __init__(self, path: Path, data: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.data = data or {
+            "created": datetime.now().isoformat(),
+            "phase": "new",  # new → built → submitted → downloaded → ingested
+            "requests": {},  # custom_id → {kind, session_id, source, source_mtime}
+            "long_requests": {},  # same, for transcripts analyzed by map-reduce instead of the batch
+            "input_file_id": None,
+            "batch_id": None,
+            "ingested": [],
+        }
+
+    @classmethod
+    def load(cls, path: Path) -> "BatchState":
+        if path.exists():
+            return cls(path, json.loads(path.read_text(encoding='utf8')))
+        return cls(path)
+
+    @property
+    def phase(self) -> str:
+        return self.data["phase"]
+
+    def save(self, **updates):
+        self.data.update(updates)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.data, indent=2), encoding='utf8')
+        tmp_path.replace(self.path)
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def read_session_id(transcript_path: Path) -> Optional[str]:
+    """Read the session id from a saved conversation header."""
+    with open(transcript_path, 'r', encoding='utf8') as f:
+        first_line = f.readline().strip()
+    prefix = "Conversation Session: "
+    if first_line.startswith(prefix):
+        return first_line[len(prefix):].strip() or None
+    return None
+
+def latest_transcripts(source_dir: Path) -> Dict[str, Path]:
+    """Map session_id → most recent conversation file in a directory."""
+    latest: Dict[str, Path] = {}
+    for path in source_dir.glob("conversation_*.txt"):
+        session_id = read_session_id(path)
+        if not session_id:
+            continue
+        current = latest.get(session_id)
+        if current is None or path.stat().st_mtime > current.stat().st_mtime:
+            latest[session_id] = path
+    return latest
+
+def is_up_to_date(analysis_path: Path, transcript_path: Path) -> bool:
+    return analysis_path.exists() and analysis_path.stat().st_mtime >= transcript_path.stat().st_mtime
+
+def load_questions(questions_file: Optional[Path]) -> Dict[str, Any]:
+    """Questions file is either one list for every session or {session_id: [...], "*": [...]}."""
+    if not questions_file:
+        return {}
+    data = json.loads(questions_file.read_text(encoding='utf8'))
+    if isinstance(data, list):
+        return {"*": data}
+    if isinstance(data, dict):
+        return data
+    raise ValueError(f"Unsupported questions file format: {questions_file}")
+
+def build_request_line(custom_id: str, kind: str, prompt: str) -> Dict[str, Any]:
+    settings = KIND_SETTINGS[kind]
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": "gpt-4o",
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": settings["max_tokens"],
+            "temperature": settings["temperature"],
+        },
+    }
+
+def build_batch_input(kinds: List[str], questions_by_session: Dict[str, Any], input_path: Path, analysis_dirs: Dict[str, Path], force: bool) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Write the Batch API input JSONL; return the request index and the long transcripts left out of it."""
+    requests_index: Dict[str, Dict[str, Any]] = {}
+    long_requests: Dict[str, Dict[str, Any]] = {}
+    skipped_fresh = 0
+    skipped_no_questions = 0
+
+    with open(input_path, 'w', encoding='utf8') as out:
+        for kind in kinds:
+            settings = KIND_SETTINGS[kind]
+            for session_id, transcript_path in sorted(latest_transcripts(settings["source_dir"]).items()):
+                analysis_path = analysis_dirs[kind] / f"{session_id}{settings['analysis_suffix']}"
+                if not force and is_up_to_date(analysis_path, transcript_path):
+                    skipped_fresh += 1
+                    continue
+
+                content = transcript_path.read_text(encoding='utf8')
+                custom_id = f"{kind}:{session_id}"
+                meta = {
+                    "kind": kind,
+                    "session_id": session_id,
+                    "source": str(transcript_path),
+                    "source_mtime": transcript_path.stat().st_mtime,
+                }
+                if kind == "transcripts":
+                    # Same input as analyze_conversation: the whole saved file
+                    transcript = content
+                    if needs_chunking(transcript):
+                        long_requests[custom_id] = meta
+                        continue
+                    prompt = TRANSCRIPT_ANALYSIS_PROMPT.format(transcript=transcript)
+                else:
+                    questions = questions_by_session.get(session_id) or questions_by_session.get("*")
+                    if not questions:
+                        skipped_no_questions += 1
+                        continue
+                    questions_text = format_questions_for_prompt(questions)
+                    transcript = extract_transcript_body(content)
+                    if needs_chunking(transcript):
+                        long_requests[custom_id] = {**meta, "questions_text": questions_text}
+                        continue
+                    prompt = FORM_COMPLETION_ANALYSIS_PROMPT.format(questions=questions_text, transcript=transcript)
+
+                out.write(json.dumps(build_request_line(custom_id, kind, prompt)) + "\n")
+                requests_index[custom_id] = meta
+
+    print(f"   📝 BATCH INPUT: {len(requests_index)} requests → {input_path}")
+    print(f"   🧩 LONG TRANSCRIPTS: {len(long_requests)} (map-reduce after the batch)")
+    print(f"   ⏭️  SKIPPED: {skipped_fresh} up to date, {skipped_no_questions} without questions")
+    return requests_index, long_requests
+
+# ============================================================================
+# SUBMIT / POLL / DOWNLOAD
+# ============================================================================
+
+class OpenAIBatchClient:
+    """Minimal client for the Files + Batches endpoints."""
+
+    def __init__(self, api_key: str, base_url: str = OPENAI_BASE_URL):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip('/')
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    async def upload(self, session: aiohttp.ClientSession, input_path: Path) -> str:
+        form = aiohttp.FormData()
+        form.add_field("purpose", "batch")
+        form.add_field("file", input_path.read_bytes(), filename=input_path.name, content_type="application/jsonl")
+        async with session.post(f"{self.base_url}/files", headers=self._headers(), data=form) as response:
+            if not response.ok:
+                raise RuntimeError(f"File upload failed ({response.status}): {await response.text()}")
+            return (await response.json())["id"]
+
+    async def create_batch(self, session: aiohttp.ClientSession, input_file_id: str) -> str:
+        async with session.post(
+            f"{self.base_url}/batches",
+            headers=self._headers(),
+            json={"input_file_id": input_file_id, "endpoint": BATCH_ENDPOINT, "completion_window": "24h"}
+        ) as response:
+            if not response.ok:
+                raise RuntimeError(f"Batch creation failed ({response.status}): {await response.text()}")
+            return (await response.json())["id"]
+
+    async def get_batch(self, session: aiohttp.ClientSession, batch_id: str) -> Dict[str, Any]:
+        async with session.get(f"{self.base_url}/batches/{batch_id}", headers=self._headers()) as response:
+            if not response.ok:
+                raise RuntimeError(f"Batch lookup failed ({response.status}): {await response.text()}")
+            return await response.json()
+
+    async def download(self, session: aiohttp.ClientSession, file_id: str, output_path: Path):
+        async with session.get(f"{self.base_url}/files/{file_id}/content", headers=self._headers()) as response:
+            if not response.ok:
+                raise RuntimeError(f"Download failed ({response.status}): {await response.text()}")
+            async with aiofiles.open(output_path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    await f.write(chunk)
+
+async def run_remote_batch(state: BatchState, input_path: Path, output_path: Path, poll_interval: float):
+    load_dotenv()
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY not found")
+    client = OpenAIBatchClient(api_key)
+
+    async with aiohttp.ClientSession() as session:
+        if state.phase == "built":
+            input_file_id = state.data["input_file_id"] or await client.upload(session, input_path)
+            state.save(input_file_id=input_file_id)
+            batch_id = await client.create_batch(session, input_file_id)
+            state.save(batch_id=batch_id, phase="submitted")
+            print(f"   🚀 BATCH SUBMITTED: {batch_id}")
+
+        batch_id = state.data["batch_id"]
+        while True:
+            batch = await client.get_batch(session, batch_id)
+            status = batch.get("status")
+            counts = batch.get("request_counts") or {}
+            print(f"   ⏳ BATCH {batch_id}: {status} ({counts.get('completed', 0)}/{counts.get('total', 0)})")
+            if status in TERMINAL_BATCH_STATUSES:
+                break
+            await asyncio.sleep(poll_interval)
+
+        if not batch.get("output_file_id"):
+            raise RuntimeError(f"Batch {batch_id} ended as '{status}' without output")
+        await client.download(session, batch["output_file_id"], output_path)
+        if batch.get("error_file_id"):
+            await client.download(session, batch["error_file_id"], output_path.with_name("errors.jsonl"))
+    state.save(phase="downloaded")
+
+STAND_IN_ANALYSIS = {
+    "transcripts": "1. User's main intent/goal:\n[dry run] stand-in analysis\n\n2. Key requests or needs mentioned:\n-\n\n3. Any specific actions they want taken:\n-",
+    "form_completion": "1. User's responses to each question:\n[dry run] stand-in analysis",
+}
+
+def run_local_stand_in(state: BatchState, input_path: Path, output_path: Path):
+    """Answer every request locally, in the Batch API output format."""
+    with open(input_path, 'r', encoding='utf8') as src, open(output_path, 'w', encoding='utf8') as out:
+        for i, line in enumerate(src):
+            request = json.loads(line)
+            meta = state.data["requests"][request["custom_id"]]
+            content = STAND_IN_ANALYSIS[meta["kind"]]
+            out.write(json.dumps({
+                "id": f"batch_req_dryrun_{i}",
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "request_id": f"dryrun_{i}",
+                    "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": content}}]},
+                },
+                "error": None,
+            }) + "\n")
+    state.save(phase="downloaded", batch_id="dry-run")
+
+# ============================================================================
+# INGEST
+# ============================================================================
+
+async def save_analysis(logger: ConversationLogger, custom_id: str, meta: Dict[str, Any], analysis: str, analysis_dirs: Dict[str, Path]) -> bool:
+    try:
+        if meta["kind"] == "transcripts":
+            await logger.save_transcript_analysis(meta["session_id"], analysis, analysis_dirs["transcripts"])
+            return True
+        return await logger.save_form_completion_analysis(meta["session_id"], analysis, analysis_dirs["form_completion"])
+    except OSError as error:
+        print(f"   ❌ {custom_id}: {error}")
+        return False
+
+async def ingest_results(state: BatchState, output_path: Path, analysis_dirs: Dict[str, Path]) -> Dict[str, int]:
+    logger = ConversationLogger()
+    ingested = set(state.data["ingested"])
+    counts = {"saved": 0, "failed": 0, "already_ingested": 0, "stale": 0}
+
+    with open(output_path, 'r', encoding='utf8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            custom_id = result.get("custom_id")
+            meta = state.data["requests"].get(custom_id)
+            if meta is None:
+                continue
+            if custom_id in ingested:
+                counts["already_ingested"] += 1
+                continue
+
+            response = result.get("response") or {}
+            if result.get("error") or response.get("status_code") != 200:
+                print(f"   ❌ {custom_id}: {result.get('error') or response.get('status_code')}")
+                counts["failed"] += 1
+                continue
+
+            # Don't overwrite with an analysis of an older transcript
+            source = Path(meta["source"])
+            if source.exists() and source.stat().st_mtime > meta["source_mtime"]:
+                counts["stale"] += 1
+                continue
+
+            analysis = response["body"]["choices"][0]["message"]["content"]
+            if not await save_analysis(logger, custom_id, meta, analysis, analysis_dirs):
+                # Not marked ingested; the analysis stays missing or old, so the next run requests it again
+                counts["failed"] += 1
+                continue
+
+            ingested.add(custom_id)
+            counts["saved"] += 1
+            # Checkpoint periodically so a crash mid-ingest doesn't redo everything
+            if counts["saved"] % 100 == 0:
+                state.save(ingested=sorted(ingested))
+
+    state.save(ingested=sorted(ingested))
+    return counts
+
+async def analyze_long_sessions(state: BatchState, analysis_dirs: Dict[str, Path], dry_run: bool) -> Dict[str, int]:
+    """Map-reduce the transcripts left out of the batch, one session at a time."""
+    logger = ConversationLogger()
+    ingested = set(state.data["ingested"])
+    counts = {"saved": 0, "failed": 0}
+    pending = {cid: meta for cid, meta in (state.data.get("long_requests") or {}).items() if cid not in ingested}
+    if not pending:
+        return counts
+
+    api_key = None
+    if not dry_run:
+        load_dotenv()
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY not found")
+
+    for custom_id, meta in sorted(pending.items()):
+        print(f"   🧩 MAP-REDUCE: {custom_id}")
+        content = Path(meta["source"]).read_text(encoding='utf8')
+        try:
+            if dry_run:
+                analysis = STAND_IN_ANALYSIS[meta["kind"]]
+            elif meta["kind"] == "transcripts":
+                analysis = await analyze_long_transcript(api_key, content)
+            else:
+                analysis = await analyze_long_form_completion(api_key, meta["questions_text"], extract_transcript_body(content))
+        except OpenAIAPIError as error:
+            print(f"   ❌ {custom_id}: {error.status} - {error.text}")
+            counts["failed"] += 1
+            continue
+        if not await save_analysis(logger, custom_id, meta, analysis, analysis_dirs):
+            counts["failed"] += 1
+            continue
+        ingested.add(custom_id)
+        counts["saved"] += 1
+        state.save(ingested=sorted(ingested))
+    return counts
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+async def run(args) -> int:
+    work_dir: Path = args.work_dir
+    work_dir.mkdir(parents=True, exist_ok=True)
+    state_path = work_dir / "state.json"
+    input_path = work_dir / "input.jsonl"
+    output_path = work_dir / "output.jsonl"
+
+    if args.dry_run:
+        dry_dir = work_dir / "dry_run"
+        analysis_dirs = {"transcripts": dry_dir / "analysis", "form_completion": dry_dir / "analysis_form_completion"}
+        for directory in analysis_dirs.values():
+            directory.mkdir(parents=True, exist_ok=True)
+    else:
+        analysis_dirs = {kind: settings["analysis_dir"] for kind, settings in KIND_SETTINGS.items()}
+
+    state = BatchState.load(state_path)
+    if state.phase == "ingested":
+        state = BatchState(state_path)
+    elif state.phase != "new":
+        print(f"   🔁 RESUMING BATCH RUN FROM PHASE '{state.phase}'")
+        if state.data.get("dry_run", False) != args.dry_run:
+            raise SystemExit("Interrupted run used a different --dry-run setting; rerun with the same flags or delete state.json")
+
+    if state.phase == "new":
+        kinds = list(KIND_SETTINGS) if args.kind == "all" else [args.kind]
+        requests_index, long_requests = build_batch_input(kinds, load_questions(args.questions), input_path, analysis_dirs, args.force)
+        if not requests_index and not long_requests:
+            print("   ✅ NOTHING TO DO: all analyses are up to date")
+            return 0
+        state.save(requests=requests_index, long_requests=long_requests, phase="built", dry_run=args.dry_run)
+
+    failed = 0
+    if state.data["requests"]:
+        if state.phase in ("built", "submitted"):
+            if args.dry_run:
+                run_local_stand_in(state, input_path, output_path)
+            else:
+                await run_remote_batch(state, input_path, output_path, args.poll_interval)
+
+        counts = await ingest_results(state, output_path, analysis_dirs)
+        print(f"   ✅ INGESTED: {counts}")
+        failed += counts["failed"]
+
+    long_counts = await analyze_long_sessions(state, analysis_dirs, args.dry_run)
+    if state.data.get("long_requests"):
+        print(f"   ✅ MAP-REDUCED: {long_counts}")
+    failed += long_counts["failed"]
+    state.save(phase="ingested")
+    return 1 if failed else 0
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Re-analyze saved conversations with the OpenAI Batch API")
+    parser.add_argument("--kind", choices=["all", *KIND_SETTINGS], default="all", help="Which transcripts to analyze")
+    parser.add_argument("--questions", type=Path, help="JSON questions for form completion sessions (list, or {session_id: list, '*': list})")
+    parser.add_argument("--work-dir", type=Path, default=DEFAULT_WORK_DIR, help="Where input/output files and state.json live")
+    parser.add_argument("--dry-run", action="store_true", help="Use a local stand-in instead of OpenAI; results go under <work-dir>/dry_run/")
+    parser.add_argument("--force", action="store_true", help="Re-analyze sessions even if their analysis is up to date")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between batch status checks")
+    args = parser.parse_args(argv)
+
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,34 @@ Minimal ChatGPT-4o parser for conversation transcripts
 """
 
 import os
-import aiohttp
-from prompts import TRANSCRIPT_ANALYSIS_PROMPT
+from typing import List
+from prompts import TRANSCRIPT_ANALYSIS_PROMPT, TRANSCRIPT_CHUNK_ANALYSIS_PROMPT, TRANSCRIPT_REDUCE_PROMPT
+from llm_cache import cached_chat_completion, OpenAIAPIError
+from transcript_chunking import needs_chunking, map_reduce_analysis, format_partials
+
+async def analyze_long_transcript(api_key: str, transcript_text: str) -> str:
+    """Map-reduce variant of the transcript analysis, same output format"""
+    async def analyze_window(window: str, part: int, total: int) -> str:
+        return await cached_chat_completion(
+            api_key,
+            TRANSCRIPT_CHUNK_ANALYSIS_PROMPT,
+            TRANSCRIPT_CHUNK_ANALYSIS_PROMPT.format(transcript=window, part=part, total=total),
+            max_tokens=300,
+            temperature=0,
+            prompt_name="transcript_analysis_chunk"
+        )
+
+    async def merge(partials: List[str]) -> str:
+        return await cached_chat_completion(
+            api_key,
+            TRANSCRIPT_REDUCE_PROMPT,
+            TRANSCRIPT_REDUCE_PROMPT.format(partials=format_partials(partials)),
+            max_tokens=300,
+            temperature=0,
+            prompt_name="transcript_analysis_reduce"
+        )
+
+    return await map_reduce_analysis(transcript_text, analyze_window, merge)
 
 async def parse_transcript_with_chatgpt(transcript_text: str) -> str:
     """Parse transcript using ChatGPT-4o to extract user intent."""
@@ -20,35 +46,36 @@ async def parse_transcript_with_chatgpt(transcript_text: str) -> str:
             return "Error: OPENAI_API_KEY not found"
         
         print(f"   ✅ OPENAI_API_KEY FOUND")
+        if needs_chunking(transcript_text):
+            print(f"   🚀 TRANSCRIPT OVER ONE PROMPT, ANALYZING IN WINDOWS...")
+            try:
+                analysis_result = await analyze_long_transcript(api_key, transcript_text)
+            except OpenAIAPIError as error:
+                print(f"   ❌ OPENAI API FAILED: {error.status} - {error.text}")
+                return f"Error: ChatGPT API failed ({error.status}): {error.text}"
+            print(f"   ✅ ANALYSIS RECEIVED: {len(analysis_result)} characters")
+            return analysis_result
+
         prompt = TRANSCRIPT_ANALYSIS_PROMPT.format(transcript=transcript_text)
         print(f"   📝 PROMPT CREATED: {len(prompt)} characters")
         
         print(f"   🚀 CALLING OPENAI API FOR TRANSCRIPT ANALYSIS...")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 300,
-                    "temperature": 0
-                }
-            ) as response:
-                print(f"   📨 OPENAI RESPONSE STATUS: {response.status}")
-                if response.ok:
-                    data = await response.json()
-                    analysis_result = data["choices"][0]["message"]["content"]
-                    print(f"   ✅ ANALYSIS RECEIVED: {len(analysis_result)} characters")
-                    print(f"   🔍 ANALYSIS PREVIEW: {analysis_result[:200]}...")
-                    return analysis_result
-                else:
-                    error_text = await response.text()
-                    print(f"   ❌ OPENAI API FAILED: {response.status} - {error_text}")
-                    return f"Error: ChatGPT API failed ({response.status}): {error_text}"
+        try:
+            analysis_result = await cached_chat_completion(
+                api_key,
+                TRANSCRIPT_ANALYSIS_PROMPT,
+                prompt,
+                max_tokens=300,
+                temperature=0,
+                prompt_name="transcript_analysis"
+            )
+        except OpenAIAPIError as error:
+            print(f"   ❌ OPENAI API FAILED: {error.status} - {error.text}")
+            return f"Error: ChatGPT API failed ({error.status}): {error.text}"
+        
+        print(f"   ✅ ANALYSIS RECEIVED: {len(analysis_result)} characters")
+        print(f"   🔍 ANALYSIS PREVIEW: {analysis_result[:200]}...")
+        return analysis_result
     
     except Exception as error:
         print(f"   ❌ TRANSCRIPT PARSING EXCEPTION: {error}")
@@ -10,6 +10,7 @@ from pathlib import Path
 from typing import Dict, List, Optional
 import random
 import string
+import metrics
 
 # Storage configuration
 BACKEND_DIR = Path(__file__).parent
@@ -24,6 +25,16 @@ FORM_COMPLETION_DISCUSSIONS_DIR.mkdir(exist_ok=True)
 ANALYSIS_DIR.mkdir(exist_ok=True)
 FORM_COMPLETION_ANALYSIS_DIR.mkdir(exist_ok=True)
 
+def extract_transcript_body(content: str) -> str:
+    """Strip the saved conversation header, keeping only the dialogue."""
+    lines = content.split('\n')
+    start_index = 0
+    for i, line in enumerate(lines):
+        if line.startswith('=' * 80):
+            start_index = i + 1
+            break
+    return '\n'.join(lines[start_index:]).strip()
+
 class ConversationItem:
     def __init__(self, speaker: str, content: str, timestamp: datetime, is_delta: bool = False):
         self.speaker = speaker
@@ -40,8 +51,9 @@ class DiscussionSession:
         self.is_saved = False  # Track if conversation has been saved
 
 class ConversationLogger:
-    def __init__(self):
+    def __init__(self, analyze_on_save: bool = True):
         self.active_discussions: Dict[str, DiscussionSession] = {}
+        self.analyze_on_save = analyze_on_save  # replays turn this off to stay offline
     
     def generate_session_id(self) -> str:
         """Generate a unique session ID"""
@@ -192,14 +204,17 @@ class ConversationLogger:
             formatted_content = self.format_conversation(discussion.conversation)
             content += formatted_content
             
-            async with aiofiles.open(filepath, 'w', encoding='utf8') as f:
-                await f.write(content)
+            with metrics.file_operation_seconds.time(operation="save_conversation"):
+                async with aiofiles.open(filepath, 'w', encoding='utf8') as f:
+                    await f.write(content)
             print(f"   ✅ CONVERSATION FILE SAVED: {filepath}")
             
             # Analyze with ChatGPT-4o
-            print(f"   🤖 STARTING CONVERSATION ANALYSIS...")
-            await self.analyze_conversation(filepath, session_id)
-            print(f"   ✅ CONVERSATION ANALYSIS COMPLETED")
+            if self.analyze_on_save:
+                print(f"   🤖 STARTING CONVERSATION ANALYSIS...")
+                with metrics.conversation_analysis_seconds.time():
+                    await self.analyze_conversation(filepath, session_id)
+                print(f"   ✅ CONVERSATION ANALYSIS COMPLETED")
             
             # Safe session cleanup
             try:
@@ -238,13 +253,8 @@ class ConversationLogger:
             print(f"   ✅ ANALYSIS RECEIVED: {len(analysis)} characters")
             
             # Save analysis in dedicated folder
-            analysis_filename = f"{session_id}_analysis.txt"
-            analysis_path = ANALYSIS_DIR / analysis_filename
-            print(f"   💾 SAVING ANALYSIS: {analysis_path}")
-            
-            async with aiofiles.open(analysis_path, 'w', encoding='utf8') as f:
-                await f.write(f"USER INTENT ANALYSIS\n{'='*20}\n\n{analysis}")
-            print(f"   ✅ ANALYSIS SAVED: {analysis_filename}")
+            analysis_path = await self.save_transcript_analysis(session_id, analysis)
+            print(f"   ✅ ANALYSIS SAVED: {analysis_path.name}")
             
         except Exception as error:
             print(f"   ❌ ANALYSIS FAILED: {error}")
@@ -359,14 +369,7 @@ class ConversationLogger:
             print(f"File content length: {len(content)}")
             
             # Extract just the conversation part (after the header)
-            lines = content.split('\n')
-            start_index = 0
-            for i, line in enumerate(lines):
-                if line.startswith('=' * 80):
-                    start_index = i + 1
-                    break
-            
-            transcript = '\n'.join(lines[start_index:]).strip()
+            transcript = extract_transcript_body(content)
             print(f"Extracted transcript length: {len(transcript)}")
             
             return transcript
@@ -377,11 +380,19 @@ class ConversationLogger:
             traceback.print_exc()
             return None
     
-    async def save_form_completion_analysis(self, session_id: str, analysis: str):
-        """Save form completion analysis to a dedicated file."""
+    async def save_transcript_analysis(self, session_id: str, analysis: str, analysis_dir: Path = ANALYSIS_DIR) -> Path:
+        """Save a user intent analysis next to the other transcript analyses."""
+        analysis_path = analysis_dir / f"{session_id}_analysis.txt"
+        with metrics.file_operation_seconds.time(operation="save_transcript_analysis"):
+            async with aiofiles.open(analysis_path, 'w', encoding='utf8') as f:
+                await f.write(f"USER INTENT ANALYSIS\n{'='*20}\n\n{analysis}")
+        return analysis_path
+    
+    async def save_form_completion_analysis(self, session_id: str, analysis: str, analysis_dir: Path = FORM_COMPLETION_ANALYSIS_DIR) -> bool:
+        """Save form completion analysis to a dedicated file; False if the write failed."""
         try:
             analysis_filename = f"{session_id}_form_completion_analysis.txt"
-            analysis_path = FORM_COMPLETION_ANALYSIS_DIR / analysis_filename
+            analysis_path = analysis_dir / analysis_filename
             
             timestamp = datetime.now().isoformat()
             content = f"FORM COMPLETION ANALYSIS\n{'='*25}\n"
@@ -389,9 +400,11 @@ class ConversationLogger:
             content += f"Analyzed: {timestamp}\n\n"
             content += analysis
             
-            async with aiofiles.open(analysis_path, 'w', encoding='utf8') as f:
-                await f.write(content)
+            with metrics.file_operation_seconds.time(operation="save_form_completion_analysis"):
+                async with aiofiles.open(analysis_path, 'w', encoding='utf8') as f:
+                    await f.write(content)
+            return True
                 
         except Exception as error:
             print(f"Error saving form completion analysis: {error}")
-            pass
\ No newline at end of file
+            return False
\ No newline at end of file
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Recording of Realtime event streams passing through the proxy (see replay_realtime.py)
+"""
+
+import os
+import json
+import gzip
+import time
+import base64
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+# Directory for recordings; recording is off when unset
+REALTIME_RECORD_DIR = os.getenv("REALTIME_RECORD_DIR")
+RECORDING_VERSION = 1
+
+# Event directions, as seen from the proxy
+CLIENT_TO_UPSTREAM = "c2s"
+UPSTREAM_TO_CLIENT = "s2c"
+
+class RecordedEvent:
+    def __init__(self, t: float, direction: str, data: Union[str, bytes]):
+        self.t = t  # seconds since the recording started
+        self.direction = direction
+        self.data = data
+
+class Recording:
+    def __init__(self, header: Dict, events: List[RecordedEvent]):
+        self.header = header
+        self.events = events
+
+    @property
+    def duration(self) -> float:
+        return self.events[-1].t if self.events else 0.0
+
+    def direction(self, direction: str) -> List[RecordedEvent]:
+        return [e for e in self.events if e.direction == direction]
+
+class EventRecorder:
+    """Appends every relayed event to a gzipped JSONL file.
+
+    The first line is a header (session id, mode, questions); each following
+    line is {"t": seconds, "d": "c2s" | "s2c", "text": ...} or, for binary
+    frames such as client audio, {"t", "d", "b64": ...}. Writes go through
+    the gzip stream's buffer, so the event loop only touches the disk when a
+    compressed block is full. The client's ephemeral token is never written.
+    """
+
+    def __init__(self, path: Path, session_id: str, mode: str, questions: Optional[List[Dict]] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.path, "wt", encoding="utf8", compresslevel=1)
+        self._start = time.monotonic()
+        self.events = 0
+        self.closed = False
+        self._write({
+            "version": RECORDING_VERSION,
+            "session_id": session_id,
+            "mode": mode,
+            "questions": questions or [],
+            "started": datetime.now().isoformat(),
+        })
+
+    def _write(self, obj: Dict):
+        self._file.write(json.dumps(obj, separators=(",", ":"), ensure_ascii=False))
+        self._file.write("\n")
+
+    def record(self, direction: str, data: Union[str, bytes, bytearray, memoryview], t: Optional[float] = None):
+        """Append one event; t defaults to the time since the recorder opened"""
+        if self.closed:
+            return
+        t = round(time.monotonic() - self._start if t is None else t, 6)
+        if isinstance(data, str):
+            if direction == CLIENT_TO_UPSTREAM and '"ephemeralToken"' in data:
+                data = redact_token(data)
+            self._write({"t": t, "d": direction, "text": data})
+        else:
+            self._write({"t": t, "d": direction, "b64": base64.b64encode(data).decode("ascii")})
+        self.events += 1
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._file.close()
+
+def redact_token(text: str) -> str:
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return text
+    if isinstance(data, dict) and "ephemeralToken" in data:
+        data["ephemeralToken"] = "<redacted>"
+        return json.dumps(data)
+    return text
+
+def open_recorder(session_id: str, mode: str, questions: Optional[List[Dict]] = None) -> Optional[EventRecorder]:
+    """A recorder for this session when REALTIME_RECORD_DIR is set, else None"""
+    if not REALTIME_RECORD_DIR:
+        return None
+    timestamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    path = Path(REALTIME_RECORD_DIR) / f"realtime_{session_id}_{timestamp}.jsonl.gz"
+    try:
+        recorder = EventRecorder(path, session_id, mode, questions)
+    except OSError as error:
+        print(f"   ⚠️ RECORDING DISABLED FOR SESSION: {error}")
+        return None
+    print(f"   🎬 RECORDING EVENTS: {path}")
+    return recorder
+
+def iter_lines(path: Path) -> Iterator[str]:
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "rt", encoding="utf8") as f:
+        yield from f
+
+def load_recording(path: Path) -> Recording:
+    lines = iter_lines(Path(path))
+    header = json.loads(next(lines))
+    if header.get("version") != RECORDING_VERSION:
+        raise ValueError(f"Unsupported recording version: {header.get('version')}")
+    events = []
+    for line in lines:
+        if not line.strip():
+            continue
+        obj = json.loads(line)
+        data = obj["text"] if "text" in obj else base64.b64decode(obj["b64"])
+        events.append(RecordedEvent(obj["t"], obj["d"], data))
+    return Recording(header, events)
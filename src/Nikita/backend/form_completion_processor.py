@@ -5,10 +5,18 @@ Form completion processor for converting voice conversation transcripts to form
 
 import os
 import json
-import aiohttp
-from prompts import FORM_COMPLETION_ANALYSIS_PROMPT, FORM_ANSWERS_GENERATION_PROMPT
+from prompts import FORM_COMPLETION_ANALYSIS_PROMPT, FORM_ANSWERS_GENERATION_PROMPT, FORM_COMPLETION_CHUNK_PROMPT, FORM_COMPLETION_REDUCE_PROMPT
+from llm_cache import cached_chat_completion, OpenAIAPIError, strip_json_fences, is_json_response
+from transcript_chunking import needs_chunking, map_reduce_analysis, format_partials
 from typing import Dict, List, Any
 
+def format_questions_for_prompt(questions: List[Dict]) -> str:
+    """Format form questions for the completion analysis/answers prompts."""
+    return "\n".join([
+        f"Question ID: {q.get('question_id', q.get('id', 'unknown'))} | Question: {q.get('question', '')} | Type: {q.get('type_answer', q.get('type', 'text'))}"
+        for q in questions
+    ])
+
 async def generate_answers_from_analysis(questions: List[Dict], analysis_text: str) -> Dict[str, Any]:
     """Generate structured form answers from conversation analysis."""
     try:
@@ -17,53 +25,62 @@ async def generate_answers_from_analysis(questions: List[Dict], analysis_text: s
             return {"error": "OPENAI_API_KEY not found"}
         
         # Format questions for the prompt
-        questions_text = "\n".join([
-            f"Question ID: {q.get('question_id', q.get('id', 'unknown'))} | Question: {q.get('question', '')} | Type: {q.get('type_answer', q.get('type', 'text'))}"
-            for q in questions
-        ])
+        questions_text = format_questions_for_prompt(questions)
         
         prompt = FORM_ANSWERS_GENERATION_PROMPT.format(
             questions=questions_text,
             analysis=analysis_text
         )
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 1500,
-                    "temperature": 0.1
-                }
-            ) as response:
-                if response.ok:
-                    data = await response.json()
-                    json_response = data["choices"][0]["message"]["content"]
-                    
-                    # Clean up the response and parse JSON
-                    json_response = json_response.strip()
-                    if json_response.startswith("```json"):
-                        json_response = json_response[7:]
-                    if json_response.endswith("```"):
-                        json_response = json_response[:-3]
-                    json_response = json_response.strip()
-                    
-                    try:
-                        answers_data = json.loads(json_response)
-                        return answers_data
-                    except json.JSONDecodeError:
-                        return {"error": f"Invalid JSON response: {json_response}"}
-                else:
-                    return {"error": f"OpenAI API failed ({response.status})"}
+        try:
+            json_response = await cached_chat_completion(
+                api_key,
+                FORM_ANSWERS_GENERATION_PROMPT,
+                prompt,
+                max_tokens=1500,
+                temperature=0.1,
+                validate=is_json_response,
+                prompt_name="answer_extraction"
+            )
+        except OpenAIAPIError as error:
+            return {"error": f"OpenAI API failed ({error.status})"}
+        
+        # Clean up the response and parse JSON
+        json_response = strip_json_fences(json_response)
+        
+        try:
+            answers_data = json.loads(json_response)
+            return answers_data
+        except json.JSONDecodeError:
+            return {"error": f"Invalid JSON response: {json_response}"}
     
     except Exception as error:
         return {"error": f"Answer generation failed: {str(error)}"}
 
+async def analyze_long_form_completion(api_key: str, questions_text: str, transcript: str) -> str:
+    """Map-reduce variant of the form completion analysis, same output format"""
+    async def analyze_window(window: str, part: int, total: int) -> str:
+        return await cached_chat_completion(
+            api_key,
+            FORM_COMPLETION_CHUNK_PROMPT,
+            FORM_COMPLETION_CHUNK_PROMPT.format(questions=questions_text, transcript=window, part=part, total=total),
+            max_tokens=1000,
+            temperature=0.1,
+            prompt_name="completion_analysis_chunk"
+        )
+
+    async def merge(partials: List[str]) -> str:
+        return await cached_chat_completion(
+            api_key,
+            FORM_COMPLETION_REDUCE_PROMPT,
+            FORM_COMPLETION_REDUCE_PROMPT.format(questions=questions_text, partials=format_partials(partials)),
+            max_tokens=1000,
+            temperature=0.1,
+            prompt_name="completion_analysis_reduce"
+        )
+
+    return await map_reduce_analysis(transcript, analyze_window, merge)
+
 async def analyze_form_completion_transcript(questions: List[Dict], transcript: str) -> str:
     """Analyze a form completion conversation transcript."""
     try:
@@ -72,35 +89,30 @@ async def analyze_form_completion_transcript(questions: List[Dict], transcript:
             return "Error: OPENAI_API_KEY not found"
         
         # Format questions for the prompt
-        questions_text = "\n".join([
-            f"Question ID: {q.get('question_id', q.get('id', 'unknown'))} | Question: {q.get('question', '')} | Type: {q.get('type_answer', q.get('type', 'text'))}"
-            for q in questions
-        ])
+        questions_text = format_questions_for_prompt(questions)
+        
+        if needs_chunking(transcript):
+            try:
+                return await analyze_long_form_completion(api_key, questions_text, transcript)
+            except OpenAIAPIError as error:
+                return f"Error: OpenAI API failed ({error.status})"
         
         prompt = FORM_COMPLETION_ANALYSIS_PROMPT.format(
             questions=questions_text,
             transcript=transcript
         )
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 1000,
-                    "temperature": 0.1
-                }
-            ) as response:
-                if response.ok:
-                    data = await response.json()
-                    return data["choices"][0]["message"]["content"]
-                else:
-                    return f"Error: OpenAI API failed ({response.status})"
+        try:
+            return await cached_chat_completion(
+                api_key,
+                FORM_COMPLETION_ANALYSIS_PROMPT,
+                prompt,
+                max_tokens=1000,
+                temperature=0.1,
+                prompt_name="completion_analysis"
+            )
+        except OpenAIAPIError as error:
+            return f"Error: OpenAI API failed ({error.status})"
     
     except Exception as error:
         return f"Error: Analysis failed: {str(error)}"
@@ -5,9 +5,17 @@ Form generator for converting analysis to form JSON structure
 
 import os
 import json
-import aiohttp
 from datetime import datetime
 from prompts import FORM_GENERATION_PROMPT
+from llm_cache import cached_chat_completion, stream_chat_completion, get_llm_cache, make_cache_key, LLM_CACHE_ENABLED, OpenAIAPIError, strip_json_fences, is_json_response
+from incremental_json import IncrementalFormParser
+
+def assign_question_id(index: int, question: dict) -> bool:
+    """Give a question a q_{i}_{hash} ID if the model left it empty. Returns True if one was added."""
+    if "id" not in question or not question["id"]:
+        question["id"] = f"q_{index+1}_{hash(question.get('question', '')) % 10000}"
+        return True
+    return False
 
 async def generate_form_from_analysis(analysis_text: str) -> dict:
     """Generate form JSON structure from conversation analysis."""
@@ -26,59 +34,45 @@ async def generate_form_from_analysis(analysis_text: str) -> dict:
         print(f"   📝 PROMPT CREATED: {len(prompt)} characters")
         
         print(f"   🚀 CALLING OPENAI API...")
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": "gpt-4o",
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 1500,
-                    "temperature": 0.1
-                }
-            ) as response:
-                print(f"   📨 OPENAI RESPONSE STATUS: {response.status}")
-                if response.ok:
-                    data = await response.json()
-                    json_response = data["choices"][0]["message"]["content"]
-                    print(f"   ✅ OPENAI RESPONSE RECEIVED: {len(json_response)} characters")
-                    print(f"   🔍 RESPONSE PREVIEW: {json_response[:200]}...")
-                    
-                    # Clean up the response and parse JSON
-                    json_response = json_response.strip()
-                    if json_response.startswith("```json"):
-                        json_response = json_response[7:]
-                    if json_response.endswith("```"):
-                        json_response = json_response[:-3]
-                    json_response = json_response.strip()
-                    
-                    try:
-                        print(f"   🔄 PARSING JSON RESPONSE...")
-                        form_data = json.loads(json_response)
-                        print(f"   ✅ JSON PARSED SUCCESSFULLY")
-                        print(f"   📝 FORM DATA: {form_data}")
-                        
-                        # Add unique IDs if not present
-                        if "questions" in form_data:
-                            print(f"   🏷️ ADDING UNIQUE IDs TO {len(form_data['questions'])} QUESTIONS")
-                            for i, question in enumerate(form_data["questions"]):
-                                if "id" not in question or not question["id"]:
-                                    question["id"] = f"q_{i+1}_{hash(question['question']) % 10000}"
-                                    print(f"     Question {i+1} ID: {question['id']}")
-                        
-                        print(f"   ✅ FORM GENERATION COMPLETED")
-                        return form_data
-                    except json.JSONDecodeError as e:
-                        print(f"   ❌ JSON DECODE ERROR: {e}")
-                        print(f"   🔍 RAW RESPONSE: {json_response}")
-                        return {"error": f"Invalid JSON response: {json_response}"}
-                else:
-                    error_text = await response.text()
-                    print(f"   ❌ OPENAI API FAILED: {response.status} - {error_text}")
-                    return {"error": f"OpenAI API failed ({response.status}): {error_text}"}
+        try:
+            json_response = await cached_chat_completion(
+                api_key,
+                FORM_GENERATION_PROMPT,
+                prompt,
+                max_tokens=1500,
+                temperature=0.1,
+                validate=is_json_response,
+                prompt_name="form_generation"
+            )
+        except OpenAIAPIError as error:
+            print(f"   ❌ OPENAI API FAILED: {error.status} - {error.text}")
+            return {"error": f"OpenAI API failed ({error.status}): {error.text}"}
+        
+        print(f"   ✅ OPENAI RESPONSE RECEIVED: {len(json_response)} characters")
+        print(f"   🔍 RESPONSE PREVIEW: {json_response[:200]}...")
+        
+        # Clean up the response and parse JSON
+        json_response = strip_json_fences(json_response)
+        
+        try:
+            print(f"   🔄 PARSING JSON RESPONSE...")
+            form_data = json.loads(json_response)
+            print(f"   ✅ JSON PARSED SUCCESSFULLY")
+            print(f"   📝 FORM DATA: {form_data}")
+            
+            # Add unique IDs if not present
+            if "questions" in form_data:
+                print(f"   🏷️ ADDING UNIQUE IDs TO {len(form_data['questions'])} QUESTIONS")
+                for i, question in enumerate(form_data["questions"]):
+                    if assign_question_id(i, question):
+                        print(f"     Question {i+1} ID: {question['id']}")
+            
+            print(f"   ✅ FORM GENERATION COMPLETED")
+            return form_data
+        except json.JSONDecodeError as e:
+            print(f"   ❌ JSON DECODE ERROR: {e}")
+            print(f"   🔍 RAW RESPONSE: {json_response}")
+            return {"error": f"Invalid JSON response: {json_response}"}
     
     except Exception as error:
         print(f"   ❌ FORM GENERATION EXCEPTION: {error}")
@@ -86,6 +80,72 @@ async def generate_form_from_analysis(analysis_text: str) -> dict:
         traceback.print_exc()
         return {"error": f"Form generation failed: {str(error)}"}
 
+async def _replay(text: str):
+    yield text
+
+async def stream_form_from_analysis(analysis_text: str):
+    """Generate a form with a streamed completion, yielding (event, data) as parts complete.
+
+    Events: "field" {"key", "value"} for title/description, "question" for each
+    complete question (ID already attached), then "done" with the full form or "error".
+    """
+    print(f"\n🤖 STREAMING FORM FROM ANALYSIS:")
+    print(f"   Analysis length: {len(analysis_text)} characters")
+    
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        yield "error", {"error": "OPENAI_API_KEY not found"}
+        return
+    
+    prompt = FORM_GENERATION_PROMPT.format(analysis=analysis_text)
+    params = {"max_tokens": 1500, "temperature": 0.1}
+    cache_key = make_cache_key("gpt-4o", FORM_GENERATION_PROMPT, prompt, params)
+    parser = IncrementalFormParser("questions")
+    
+    try:
+        cached = await get_llm_cache().lookup(cache_key) if LLM_CACHE_ENABLED else None
+        if cached is not None:
+            print(f"   ✅ SERVING FROM CACHE")
+            chunks = _replay(cached)
+        else:
+            print(f"   🚀 CALLING OPENAI API (STREAMING)...")
+            chunks = stream_chat_completion(api_key, prompt, model="gpt-4o", prompt_name="form_generation", **params)
+        
+        question_index = 0
+        async for chunk in chunks:
+            for kind, payload in parser.feed(chunk):
+                if kind == "field":
+                    key, value = payload
+                    yield "field", {"key": key, "value": value}
+                else:
+                    assign_question_id(question_index, payload)
+                    yield "question", {"index": question_index, "question": payload}
+                    question_index += 1
+    except OpenAIAPIError as error:
+        print(f"   ❌ OPENAI API FAILED: {error.status} - {error.text}")
+        yield "error", {"error": f"OpenAI API failed ({error.status}): {error.text}"}
+        return
+    except Exception as error:
+        print(f"   ❌ FORM STREAMING EXCEPTION: {error}")
+        yield "error", {"error": f"Form generation failed: {str(error)}"}
+        return
+    
+    json_response = strip_json_fences(parser.buffer)
+    try:
+        form_data = json.loads(json_response)
+    except json.JSONDecodeError:
+        yield "error", {"error": f"Invalid JSON response: {json_response}"}
+        return
+    
+    if cached is None and LLM_CACHE_ENABLED:
+        await get_llm_cache().store(cache_key, parser.buffer)
+    
+    # Same IDs as the streamed questions (same index and text)
+    for i, question in enumerate(form_data.get("questions", [])):
+        assign_question_id(i, question)
+    print(f"   ✅ FORM STREAM COMPLETED: {question_index} questions streamed")
+    yield "done", form_data
+
 async def get_latest_analysis() -> str:
     """Get the most recent analysis file content."""
     print(f"\n🔍 SEARCHING FOR LATEST ANALYSIS:")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Incremental parser for streamed form JSON
+
+Fed the model output chunk by chunk, it reports the top-level string fields
+(title, description) and every object of the top-level "questions" array as
+soon as each one is complete, without waiting for the closing brace of the form.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Top-level string fields worth surfacing before the form is complete
+STREAMED_FIELDS = ("title", "description")
+
+class _Frame:
+    __slots__ = ("kind", "start", "key", "expect_key")
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind  # '{' or '['
+        self.start = start
+        self.key: Optional[str] = None
+        self.expect_key = kind == '{'
+
+class IncrementalFormParser:
+    def __init__(self, array_key: str = "questions"):
+        self.array_key = array_key
+        self.buffer = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self.item_count = 0
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume a chunk and return newly completed events.
+
+        Events are ("field", (key, value)) for top-level string fields and
+        ("item", obj) for each completed object in the array_key array.
+        """
+        self.buffer += chunk
+        events: List[Tuple[str, Any]] = []
+        buf = self.buffer
+        i = self._pos
+
+        while i < len(buf):
+            ch = buf[i]
+
+            if not self._started:
+                # Skip code fences or any preamble before the JSON object
+                if ch == '{':
+                    self._started = True
+                    self._stack.append(_Frame('{', i))
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._on_string(buf[self._string_start:i + 1], events)
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in '{[':
+                self._stack.append(_Frame(ch, i))
+            elif ch in '}]':
+                if self._stack:
+                    frame = self._stack.pop()
+                    self._on_close(frame, i, events)
+            elif ch == ',':
+                if self._stack and self._stack[-1].kind == '{':
+                    self._stack[-1].expect_key = True
+            elif ch == ':':
+                if self._stack and self._stack[-1].kind == '{':
+                    self._stack[-1].expect_key = False
+            i += 1
+
+        self._pos = i
+        return events
+
+    @property
+    def done(self) -> bool:
+        return self._started and not self._stack
+
+    def _on_string(self, raw: str, events: List[Tuple[str, Any]]):
+        if not self._stack or self._stack[-1].kind != '{':
+            return
+        frame = self._stack[-1]
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            return
+        if frame.expect_key:
+            frame.key = value
+        elif len(self._stack) == 1 and frame.key in STREAMED_FIELDS:
+            events.append(("field", (frame.key, value)))
+
+    def _on_close(self, frame: _Frame, end: int, events: List[Tuple[str, Any]]):
+        # An object directly inside the top-level array_key array
+        if (
+            frame.kind == '{'
+            and len(self._stack) == 2
+            and self._stack[1].kind == '['
+            and self._stack[0].key == self.array_key
+        ):
+            try:
+                item: Dict[str, Any] = json.loads(self.buffer[frame.start:end + 1])
+            except json.JSONDecodeError:
+                return
+            events.append(("item", item))
+            self.item_count += 1
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Live answer extraction for form_completion sessions
+
+Each completed user transcription is sent, with the assistant's preceding
+question and the answers so far, to a small extraction prompt. The returned
+updates are merged into a per-session answer state and pushed to the client
+as `answers.partial` events on /ws. When the session ends,
+/api/generate-form-answers returns the accumulated state instead of
+re-analyzing the whole transcript.
+"""
+
+import os
+import json
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from prompts import LIVE_ANSWER_EXTRACTION_PROMPT
+from llm_cache import cached_chat_completion, OpenAIAPIError, strip_json_fences, is_json_response
+from rate_limiter import openai_rate_limiter
+from form_completion_processor import format_questions_for_prompt
+
+LIVE_ANSWERS_ENABLED = os.getenv("LIVE_ANSWERS_ENABLED", "1") not in ("0", "false", "False")
+LIVE_ANSWERS_MODEL = os.getenv("LIVE_ANSWERS_MODEL", "gpt-4o-mini")
+LIVE_ANSWERS_TTL = float(os.getenv("LIVE_ANSWERS_TTL", 600))  # seconds a finished session's answers are kept
+LIVE_ANSWERS_FINISH_TIMEOUT = float(os.getenv("LIVE_ANSWERS_FINISH_TIMEOUT", 5))  # max wait for in-flight extraction
+
+USER_TURN_EVENT = 'conversation.item.input_audio_transcription.completed'
+USER_TURN_FAILED_EVENT = 'conversation.item.input_audio_transcription.failed'
+USER_COMMIT_EVENT = 'input_audio_buffer.committed'
+ASSISTANT_TURN_EVENTS = {'response.audio_transcript.done': 'transcript', 'response.text.done': 'text'}
+
+def question_id(question: Dict) -> str:
+    return str(question.get('question_id', question.get('id', 'unknown')))
+
+class LiveAnswerState:
+    """Answers extracted so far for one session.
+
+    Turns are processed one extraction at a time; turns that arrive while an
+    extraction is running are sent together in the next one, so a burst of
+    short utterances costs one call rather than one per utterance.
+    """
+
+    def __init__(self, session_id: str, questions: List[Dict], send: Optional[Callable[[Dict], Awaitable[None]]] = None):
+        self.session_id = session_id
+        self.questions = questions
+        self.question_ids = [question_id(q) for q in questions]
+        self.questions_text = format_questions_for_prompt(questions)
+        self.answers: Dict[str, Any] = {}
+        self.notes: List[str] = []
+        self._send = send
+        self._last_assistant = ""
+        self._question_for_item: Dict[str, str] = {}  # user item_id -> assistant text when its audio was committed
+        self._pending: List[Tuple[str, str]] = []  # (assistant question, user answer)
+        self._task: Optional[asyncio.Task] = None
+        self.turns = 0
+        self.extractions = 0
+        self.errors = 0
+        self.ended_at: Optional[float] = None
+
+    def observe(self, event: Dict):
+        """Feed one upstream Realtime event"""
+        event_type = event.get('type')
+        if event_type in ASSISTANT_TURN_EVENTS:
+            self._last_assistant = event.get(ASSISTANT_TURN_EVENTS[event_type]) or self._last_assistant
+        elif event_type == USER_COMMIT_EVENT:
+            # The transcription arrives asynchronously, often after the assistant's
+            # next turn; the question being answered is the one heard before the commit
+            if event.get('item_id'):
+                self._question_for_item[event['item_id']] = self._last_assistant
+        elif event_type == USER_TURN_FAILED_EVENT:
+            self._question_for_item.pop(event.get('item_id'), None)
+        elif event_type == USER_TURN_EVENT:
+            question = self._question_for_item.pop(event.get('item_id'), self._last_assistant)
+            transcript = (event.get('transcript') or '').strip()
+            if transcript:
+                self.turns += 1
+                self._pending.append((question, transcript))
+                if self._task is None or self._task.done():
+                    self._task = asyncio.create_task(self._run())
+
+    @property
+    def missing_answers(self) -> List[str]:
+        return [qid for qid in self.question_ids if qid not in self.answers]
+
+    @property
+    def complete(self) -> bool:
+        """Every turn heard so far went through a successful extraction"""
+        return self.turns > 0 and self.errors == 0 and not self._pending and (self._task is None or self._task.done())
+
+    def end(self):
+        """Client disconnected: stop pushing events, keep the state for the answers call"""
+        self._send = None
+        self.ended_at = time.monotonic()
+
+    async def finish(self, timeout: float = LIVE_ANSWERS_FINISH_TIMEOUT) -> bool:
+        """Wait for in-flight extraction; True when the state covers every turn"""
+        deadline = time.monotonic() + timeout
+        while self._task is not None and not self._task.done():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(asyncio.shield(self._task), remaining)
+            except asyncio.TimeoutError:
+                return False
+        return self.complete
+
+    def result(self) -> Dict[str, Any]:
+        """Same shape as generate_answers_from_analysis()"""
+        missing = self.missing_answers
+        if not missing:
+            confidence = "high"
+        elif len(missing) * 2 <= len(self.question_ids):
+            confidence = "medium"
+        else:
+            confidence = "low"
+        return {
+            "answers": dict(self.answers),
+            "confidence": confidence,
+            "missing_answers": missing,
+            "notes": " ".join(self.notes),
+            "source": "live",
+        }
+
+    async def _run(self):
+        while self._pending:
+            turns, self._pending = self._pending, []
+            try:
+                updated = await self._extract(turns)
+            except Exception as error:
+                self.errors += 1
+                print(f"   ⚠️ LIVE ANSWER EXTRACTION FAILED ({self.session_id}): {error}")
+                continue
+            self.extractions += 1
+            if updated:
+                await self._push(updated)
+
+    async def _extract(self, turns: List[Tuple[str, str]]) -> List[str]:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise RuntimeError("OPENAI_API_KEY not found")
+        exchange = "\n\n".join(
+            (f"Assistant: {assistant}\n" if assistant else "") + f"User: {user}" for assistant, user in turns
+        )
+        prompt = LIVE_ANSWER_EXTRACTION_PROMPT.format(
+            questions=self.questions_text,
+            current_answers=json.dumps(self.answers, ensure_ascii=False),
+            exchange=exchange,
+        )
+        try:
+            async with openai_rate_limiter:
+                response = await cached_chat_completion(
+                    api_key,
+                    LIVE_ANSWER_EXTRACTION_PROMPT,
+                    prompt,
+                    model=LIVE_ANSWERS_MODEL,
+                    max_tokens=400,
+                    temperature=0,
+                    validate=is_json_response,
+                    prompt_name="live_answer_extraction"
+                )
+        except OpenAIAPIError as error:
+            raise RuntimeError(f"OpenAI API failed ({error.status})")
+        data = json.loads(strip_json_fences(response))
+
+        updated = []
+        for qid, value in (data.get("answers") or {}).items():
+            qid = str(qid)
+            if qid in self.question_ids and value not in (None, "") and self.answers.get(qid) != value:
+                self.answers[qid] = value
+                updated.append(qid)
+        if data.get("notes"):
+            self.notes.append(str(data["notes"]))
+        return updated
+
+    async def _push(self, updated: List[str]):
+        if self._send is None:
+            return
+        try:
+            await self._send({
+                'type': 'answers.partial',
+                'session_id': self.session_id,
+                'answers': dict(self.answers),
+                'updated': updated,
+                'missing_answers': self.missing_answers,
+                'turns': self.turns,
+            })
+        except Exception as error:
+            print(f"   ⚠️ COULD NOT SEND answers.partial: {error}")
+            self._send = None
+
+class LiveAnswerRegistry:
+    """Live answer states by session id, kept LIVE_ANSWERS_TTL after the session ends"""
+
+    def __init__(self, enabled: bool = LIVE_ANSWERS_ENABLED, ttl: float = LIVE_ANSWERS_TTL):
+        self.enabled = enabled
+        self.ttl = ttl
+        self._states: Dict[str, LiveAnswerState] = {}
+
+    def start(self, session_id: str, questions: List[Dict], send: Callable[[Dict], Awaitable[None]]) -> Optional[LiveAnswerState]:
+        self._prune()
+        if not self.enabled or not questions:
+            return None
+        state = LiveAnswerState(session_id, questions, send)
+        self._states[session_id] = state
+        print(f"   🧾 LIVE ANSWER EXTRACTION ON: {len(questions)} questions")
+        return state
+
+    def observe(self, session_id: str, event: Dict):
+        state = self._states.get(session_id)
+        if state is not None and state.ended_at is None:
+            state.observe(event)
+
+    def end(self, session_id: str):
+        state = self._states.get(session_id)
+        if state is not None:
+            state.end()
+
+    def get(self, session_id: str) -> Optional[LiveAnswerState]:
+        return self._states.get(session_id)
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [sid for sid, s in self._states.items() if s.ended_at is not None and now - s.ended_at > self.ttl]
+        for sid in expired:
+            del self._states[sid]
+
+live_answers = LiveAnswerRegistry()
+
+async def live_answers_for(session_id: str, questions: List[Dict]) -> Optional[Dict[str, Any]]:
+    """Accumulated answers for a session, or None when a full analysis is needed
+    (no live state, different questions, or an extraction failed / is still running)"""
+    state = live_answers.get(session_id)
+    if state is None or sorted(state.question_ids) != sorted(question_id(q) for q in questions):
+        return None
+    if not await state.finish():
+        return None
+    return state.result()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Shared response cache for deterministic gpt-4o calls
+
+Responses are keyed by (model, prompt template version, rendered prompt hash,
+params). Lookups go through an in-memory LRU, then an on-disk SQLite tier with
+TTL. Concurrent identical requests share a single upstream call.
+"""
+
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import aiohttp
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+import metrics
+
+BACKEND_DIR = Path(__file__).parent
+OPENAI_CHAT_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") not in ("0", "false", "False")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 24 * 3600))
+LLM_CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", str(BACKEND_DIR / 'llm_cache.sqlite3')))
+
+class OpenAIAPIError(Exception):
+    """Non-2xx response from the OpenAI API"""
+
+    def __init__(self, status: int, text: str):
+        super().__init__(f"OpenAI API failed ({status}): {text}")
+        self.status = status
+        self.text = text
+
+def template_version(template: str) -> str:
+    """Short content hash of a prompt template; changes whenever the template is edited"""
+    return hashlib.sha256(template.encode("utf8")).hexdigest()[:12]
+
+def make_cache_key(model: str, template: str, prompt: str, params: Dict[str, Any]) -> str:
+    prompt_hash = hashlib.sha256(prompt.encode("utf8")).hexdigest()
+    raw = json.dumps([model, template_version(template), prompt_hash, params], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf8")).hexdigest()
+
+class SQLiteResponseStore:
+    """On-disk tier: key → response text with an expiry timestamp"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, expires REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM responses WHERE key = ? AND expires > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, response: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, expires) VALUES (?, ?, ?, ?)",
+                (key, response, now, now + ttl)
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires <= ?", (now,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+class LLMResponseCache:
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl: float = LLM_CACHE_TTL_SECONDS, db_path: Optional[Path] = LLM_CACHE_PATH):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key → (expires, response)
+        self._store = SQLiteResponseStore(db_path) if db_path else None
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "shared": 0}
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        expires, response = entry
+        if expires <= time.time():
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        return response
+
+    def _memory_put(self, key: str, response: str, expires: float):
+        self._memory[key] = (expires, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[str]], validate: Optional[Callable[[str], bool]] = None) -> str:
+        """Return the cached response for key, or run fetch once for all concurrent callers.
+
+        Only responses accepted by validate (default: any) are stored.
+        """
+        response = self._memory_get(key)
+        if response is not None:
+            self.stats["memory_hits"] += 1
+            return response
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats["shared"] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._load(key, fetch, validate))
+        self._in_flight[key] = task
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shield so a cancelled caller doesn't cancel the call other waiters share
+        return await asyncio.shield(task)
+
+    async def _load(self, key: str, fetch: Callable[[], Awaitable[str]], validate: Optional[Callable[[str], bool]]) -> str:
+        if self._store is not None:
+            response = await asyncio.to_thread(self._store.get, key)
+            if response is not None:
+                self.stats["disk_hits"] += 1
+                self._memory_put(key, response, time.time() + self.ttl)
+                return response
+
+        self.stats["misses"] += 1
+        response = await fetch()
+        if validate is None or validate(response):
+            self._memory_put(key, response, time.time() + self.ttl)
+            if self._store is not None:
+                await asyncio.to_thread(self._store.put, key, response, self.ttl)
+        return response
+
+    async def lookup(self, key: str) -> Optional[str]:
+        """Cached response for key from either tier, without fetching"""
+        response = self._memory_get(key)
+        if response is not None:
+            self.stats["memory_hits"] += 1
+            return response
+        if self._store is not None:
+            response = await asyncio.to_thread(self._store.get, key)
+            if response is not None:
+                self.stats["disk_hits"] += 1
+                self._memory_put(key, response, time.time() + self.ttl)
+        return response
+
+    async def store(self, key: str, response: str):
+        """Store a response obtained outside get_or_fetch (e.g. a streamed completion)"""
+        self._memory_put(key, response, time.time() + self.ttl)
+        if self._store is not None:
+            await asyncio.to_thread(self._store.put, key, response, self.ttl)
+
+    def clear(self):
+        self._memory.clear()
+        if self._store is not None:
+            self._store.clear()
+
+_cache: Optional[LLMResponseCache] = None
+
+def get_llm_cache() -> LLMResponseCache:
+    """Process-wide cache, created on first use"""
+    global _cache
+    if _cache is None:
+        _cache = LLMResponseCache()
+    return _cache
+
+@asynccontextmanager
+async def _observe_openai_call(prompt_name: str):
+    """Latency histogram and error counter for one upstream chat completion"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as error:
+        status = error.status if isinstance(error, OpenAIAPIError) else "exception"
+        metrics.openai_request_errors.inc(prompt=prompt_name, status=status)
+        metrics.openai_request_seconds.observe(time.perf_counter() - start, prompt=prompt_name, outcome="error")
+        raise
+    metrics.openai_request_seconds.observe(time.perf_counter() - start, prompt=prompt_name, outcome="ok")
+
+async def request_chat_completion(api_key: str, prompt: str, *, model: str, max_tokens: int, temperature: float, prompt_name: str = "other") -> str:
+    """Single uncached chat completion call; raises OpenAIAPIError on non-2xx"""
+    async with _observe_openai_call(prompt_name), aiohttp.ClientSession() as session:
+        async with session.post(
+            OPENAI_CHAT_COMPLETIONS_URL,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+        ) as response:
+            if not response.ok:
+                raise OpenAIAPIError(response.status, await response.text())
+            data = await response.json()
+            return data["choices"][0]["message"]["content"]
+
+async def stream_chat_completion(api_key: str, prompt: str, *, model: str, max_tokens: int, temperature: float, prompt_name: str = "other") -> AsyncIterator[str]:
+    """Streamed chat completion; yields content deltas as they arrive"""
+    async with _observe_openai_call(prompt_name), aiohttp.ClientSession() as session:
+        async with session.post(
+            OPENAI_CHAT_COMPLETIONS_URL,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": model,
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": max_tokens,
+                "temperature": temperature,
+                "stream": True
+            }
+        ) as response:
+            if not response.ok:
+                raise OpenAIAPIError(response.status, await response.text())
+            async for raw_line in response.content:
+                line = raw_line.decode("utf8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                if choices:
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        yield delta
+
+async def cached_chat_completion(
+    api_key: str,
+    template: str,
+    prompt: str,
+    *,
+    model: str = "gpt-4o",
+    max_tokens: int,
+    temperature: float,
+    validate: Optional[Callable[[str], bool]] = None,
+    prompt_name: str = "other",
+) -> str:
+    """Chat completion for a prompt rendered from a prompts.py template, served from cache when possible
+
+    prompt_name labels the call in /metrics (transcript_analysis, form_generation, ...).
+    """
+    async def fetch() -> str:
+        return await request_chat_completion(
+            api_key, prompt, model=model, max_tokens=max_tokens, temperature=temperature, prompt_name=prompt_name
+        )
+
+    if not LLM_CACHE_ENABLED:
+        return await fetch()
+
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    key = make_cache_key(model, template, prompt, params)
+    return await get_llm_cache().get_or_fetch(key, fetch, validate)
+
+def strip_json_fences(text: str) -> str:
+    """Remove ```json fences the model sometimes wraps around JSON output"""
+    text = text.strip()
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+def is_json_response(text: str) -> bool:
+    try:
+        json.loads(strip_json_fences(text))
+        return True
+    except json.JSONDecodeError:
+        return False
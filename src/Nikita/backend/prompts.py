@@ -45,6 +45,30 @@ Please provide:
 
 Keep your response concise and focused on the user's will/intent."""
 
+# Map-reduce prompts for transcripts too long for one call (see transcript_chunking.py)
+TRANSCRIPT_CHUNK_ANALYSIS_PROMPT = """This is part {part} of {total} of a conversation transcript. Analyze it and note what the user wants or is trying to achieve in this part.
+
+Transcript (part {part} of {total}):
+{transcript}
+
+Please provide:
+1. User's main intent/goal:
+2. Key requests or needs mentioned:
+3. Any specific actions they want taken:
+
+Only report what appears in this part. Keep your response concise and focused on the user's will/intent."""
+
+TRANSCRIPT_REDUCE_PROMPT = """Below are analyses of consecutive parts of one conversation, in order. Merge them into a single analysis of the whole conversation.
+
+{partials}
+
+Respond using exactly these headings:
+1. User's main intent/goal:
+2. Key requests or needs mentioned:
+3. Any specific actions they want taken:
+
+Combine duplicates, and when parts disagree prefer the later part (the user may have changed their mind). Keep your response concise and focused on the user's will/intent."""
+
 # Form generation prompt for converting analysis to JSON
 FORM_GENERATION_PROMPT = """Based on the following conversation analysis, create a form structure in JSON format.
 
@@ -110,6 +134,35 @@ Please extract the user's answers and provide:
 
 Keep your response structured and focused on extracting the actual answers provided."""
 
+FORM_COMPLETION_CHUNK_PROMPT = """This is part {part} of {total} of a conversation transcript where a user was answering form questions via voice.
+
+Form Questions:
+{questions}
+
+Conversation Transcript (part {part} of {total}):
+{transcript}
+
+Please extract the answers given in this part and provide:
+1. User's responses to each question (be specific about which question each answer addresses)
+2. Any clarifications or additional context provided
+3. Questions that may not have been fully answered
+
+Only report what appears in this part. Keep your response structured and focused on extracting the actual answers provided."""
+
+FORM_COMPLETION_REDUCE_PROMPT = """Below are analyses of consecutive parts of one conversation where a user was answering form questions via voice, in order. Merge them into a single analysis of the whole conversation.
+
+Form Questions:
+{questions}
+
+{partials}
+
+Please provide:
+1. User's responses to each question (be specific about which question each answer addresses)
+2. Any clarifications or additional context provided
+3. Questions that may not have been fully answered
+
+When parts give different answers to the same question, keep the later one (the user corrected it). A question is only unanswered if no part answers it. Keep your response structured and focused on extracting the actual answers provided."""
+
 # Form answers generation prompt for converting analysis to structured answers
 FORM_ANSWERS_GENERATION_PROMPT = """Based on the following conversation analysis, extract and format the user's answers to the form questions.
 
@@ -140,4 +193,33 @@ Instructions:
 - Set confidence based on how clear and complete the answers were
 - Only include question IDs that have actual answers
 
-Return only valid JSON, no additional text or explanation."""
\ No newline at end of file
+Return only valid JSON, no additional text or explanation."""
+
+# Live answer extraction, run after each user turn during form completion (see live_answers.py)
+LIVE_ANSWER_EXTRACTION_PROMPT = """A user is answering form questions in a voice conversation. Update their answers from the latest exchange.
+
+Form Questions:
+{questions}
+
+Answers so far (JSON):
+{current_answers}
+
+Latest exchange:
+{exchange}
+
+Generate a JSON response with only the answers given or changed in the latest exchange:
+{{
+  "answers": {{
+    "question_id": "user's answer"
+  }},
+  "notes": "Optional short clarification, or empty"
+}}
+
+Instructions:
+- Use the assistant's question to tell which form question the user is answering
+- For multiple choice questions (radio), provide the exact choice selected
+- For checkboxes, provide true/false
+- For text fields, provide the user's response as given
+- If the user corrects an earlier answer, return the new answer
+- Return {{"answers": {{}}, "notes": ""}} when the exchange answers nothing
+Return only valid JSON, no additional text or explanation."""
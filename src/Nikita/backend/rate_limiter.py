@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Process-wide rate limiting for OpenAI-backed work
+"""
+
+import os
+import time
+import asyncio
+
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 8))
+OPENAI_REQUESTS_PER_SECOND = float(os.getenv("OPENAI_REQUESTS_PER_SECOND", 4))
+
+class AsyncRateLimiter:
+    """Caps concurrent holders and spaces out acquisitions to a steady rate.
+
+    Use as ``async with limiter: ...``. A rate of 0 disables the spacing and
+    only the concurrency cap applies.
+    """
+
+    def __init__(self, max_concurrency: int, requests_per_second: float = 0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_second = requests_per_second
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+        self.in_flight = 0
+
+    async def _wait_for_slot(self):
+        if not self._interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self._interval
+        delay = slot - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        try:
+            await self._wait_for_slot()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self.in_flight += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore.release()
+        return False
+
+# Shared limiter for all OpenAI chat completion work in this process
+openai_rate_limiter = AsyncRateLimiter(OPENAI_MAX_CONCURRENCY, OPENAI_REQUESTS_PER_SECOND)
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Replay recorded Realtime sessions through the proxy without touching OpenAI
+
+Recordings come from the proxy itself (set REALTIME_RECORD_DIR, see
+event_recorder.py) or from --synthesize. Two drivers:
+
+- socket (default): starts server.app in-process on a local port, with its
+  upstream pointed at a fake Realtime server that plays back the recorded
+  upstream events, and a client that sends the recorded client events
+  (audio included). Covers the relay, audio coalescing, logging and the
+  transcript save. Reports relay latency and upstream send counts.
+- direct: feeds the same events straight into WebSocketHandler /
+  ConversationLogger, no sockets; isolates the logging and transcript
+  formatting cost.
+
+Both sides are paced independently from their own start, so at --speed 0
+(as fast as possible) upstream events don't wait for the client's audio.
+
+Usage:
+  python replay_realtime.py --synthesize /tmp/session.jsonl.gz --seconds 120
+  python replay_realtime.py /tmp/session.jsonl.gz                # 1x
+  python replay_realtime.py /tmp/session.jsonl.gz --speed 0      # as fast as possible
+  python replay_realtime.py recordings/*.jsonl.gz --speed 0 --driver direct
+"""
+
+import os
+import json
+import time
+import base64
+import random
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from event_recorder import (
+    CLIENT_TO_UPSTREAM, UPSTREAM_TO_CLIENT, EventRecorder, Recording, load_recording
+)
+
+REPLAY_TOKEN = "replay-token"
+AUDIO_FRAME_MS = 20
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def pace(start: float, t: float, speed: float):
+    """Sleep until recorded time t (seconds) at the given speed; 0 means no waiting"""
+    if speed > 0:
+        delay = start + t / speed - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+# ============================================================================
+# SYNTHETIC RECORDINGS
+# ============================================================================
+
+def synthesize_recording(path: Path, seconds: float = 60, seed: int = 7):
+    """A plausible form-creation session: 20ms client audio frames plus turns of
+    transcripts, assistant transcript deltas and audio deltas from upstream"""
+    rng = random.Random(seed)
+    words = "we need a short survey about customer onboarding and the support experience".split()
+    events = []  # (t, direction, data)
+    events.append((0.0, CLIENT_TO_UPSTREAM, json.dumps({"type": "connect", "ephemeralToken": "<redacted>", "mode": "form_creation"})))
+    events.append((0.05, UPSTREAM_TO_CLIENT, json.dumps({"type": "session.created", "session": {"id": "sess_replay"}})))
+    frame = AUDIO_FRAME_MS / 1000
+    n_frames = int(seconds / frame)
+    for i in range(n_frames):
+        events.append((0.1 + i * frame, CLIENT_TO_UPSTREAM, rng.randbytes(24000 * 2 * AUDIO_FRAME_MS // 1000)))
+    t = 2.0
+    turn = 0
+    while t < seconds:
+        turn += 1
+        events.append((t, UPSTREAM_TO_CLIENT, json.dumps({
+            "type": "conversation.item.input_audio_transcription.completed",
+            "item_id": f"item_{turn}",
+            "transcript": " ".join(rng.choice(words) for _ in range(rng.randint(5, 20))),
+        })))
+        for k in range(rng.randint(20, 60)):
+            t += 0.04
+            events.append((t, UPSTREAM_TO_CLIENT, json.dumps({
+                "type": "response.audio_transcript.delta", "response_id": f"resp_{turn}", "delta": rng.choice(words) + " ",
+            })))
+            events.append((t, UPSTREAM_TO_CLIENT, json.dumps({
+                "type": "response.audio.delta", "response_id": f"resp_{turn}",
+                "delta": base64.b64encode(rng.randbytes(2400)).decode("ascii"),
+            })))
+        events.append((t, UPSTREAM_TO_CLIENT, json.dumps({"type": "response.done", "response": {"id": f"resp_{turn}"}})))
+        t += rng.uniform(3, 8)
+    events.sort(key=lambda e: e[0])
+
+    recorder = EventRecorder(path, "session_replay_synthetic", "form_creation")
+    for t, direction, data in events:
+        recorder.record(direction, data, t=t)
+    recorder.close()
+    return len(events)
+
+# ============================================================================
+# DIRECT DRIVER (no sockets)
+# ============================================================================
+
+class NullClientSocket:
+    """Stands in for the client WebSocket; counts what the handler forwards"""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    async def send_text(self, text: str):
+        self.messages += 1
+        self.bytes += len(text)
+
+    async def send_bytes(self, data: bytes):
+        self.messages += 1
+        self.bytes += len(data)
+
+    async def send_json(self, data: Dict):
+        await self.send_text(json.dumps(data))
+
+async def replay_direct(recording: Recording, output_dir: Path) -> Dict:
+    import conversation_logger as cl
+    from websocket_handler import WebSocketHandler
+
+    cl.DISCUSSIONS_DIR = cl.FORM_COMPLETION_DISCUSSIONS_DIR = output_dir
+    logger = cl.ConversationLogger(analyze_on_save=False)
+    handler = WebSocketHandler(logger)
+    client = NullClientSocket()
+    session_id = logger.start_session(mode=recording.header.get("mode", "form_creation"))
+
+    start = time.perf_counter()
+    for event in recording.events:
+        if event.direction == UPSTREAM_TO_CLIENT:
+            if isinstance(event.data, str):
+                await handler.handle_openai_message(event.data, session_id, client)
+            else:
+                await client.send_bytes(event.data)
+        elif isinstance(event.data, str):
+            logger.log_client_message(session_id, json.loads(event.data))
+    relay_s = time.perf_counter() - start
+
+    conversation = logger.active_discussions[session_id].conversation
+    t0 = time.perf_counter()
+    transcript = logger.format_conversation(conversation)
+    format_s = time.perf_counter() - t0
+    await logger.save_conversation(session_id)
+    return {
+        "events": len(recording.events),
+        "relay_s": round(relay_s, 4),
+        "events_per_s": round(len(recording.events) / relay_s) if relay_s else 0,
+        "forwarded_to_client": client.messages,
+        "conversation_items": len(conversation),
+        "format_ms": round(format_s * 1000, 2),
+        "transcript_chars": len(transcript),
+    }
+
+# ============================================================================
+# SOCKET DRIVER (server.app in-process, fake upstream)
+# ============================================================================
+
+class FakeUpstream:
+    """Local stand-in for the Realtime API that plays back recorded upstream events"""
+
+    def __init__(self, recording: Recording, speed: float):
+        self.events = recording.direction(UPSTREAM_TO_CLIENT)
+        self.speed = speed
+        self.sent_at: Dict = defaultdict(deque)  # payload -> send times, to match client receipts
+        self.received_messages = 0
+        self.received_audio_bytes = 0
+        self.received_frames = 0
+        self.session_update = None
+
+    async def handler(self, ws):
+        self.session_update = await ws.recv()
+        receiver = asyncio.create_task(self._receive(ws))
+        start = time.perf_counter()
+        try:
+            for event in self.events:
+                await pace(start, event.t, self.speed)
+                self.sent_at[event.data].append(time.perf_counter())
+                await ws.send(event.data)
+            await receiver
+        finally:
+            receiver.cancel()
+
+    async def _receive(self, ws):
+        import websockets
+        try:
+            async for message in ws:
+                self.received_messages += 1
+                if isinstance(message, bytes):
+                    self.received_frames += 1
+                    self.received_audio_bytes += len(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+async def run_client(url: str, recording: Recording, upstream: FakeUpstream, speed: float, timeout: float) -> Dict:
+    import websockets
+
+    client_events = recording.direction(CLIENT_TO_UPSTREAM)
+    connect = next((e for e in client_events if isinstance(e.data, str) and '"connect"' in e.data), None)
+    if connect is None:
+        raise ValueError("Recording has no client connect event")
+    connect_msg = json.loads(connect.data)
+    connect_msg["ephemeralToken"] = REPLAY_TOKEN
+    expected = len(upstream.events)
+    latencies: List[float] = []
+    received = 0
+    audio_bytes_sent = 0
+
+    async with websockets.connect(url, max_size=None) as ws:
+        await ws.send(json.dumps(connect_msg))
+        start = time.perf_counter()
+
+        async def send_all():
+            nonlocal audio_bytes_sent
+            for event in client_events:
+                if event is connect:
+                    continue
+                await pace(start, event.t - connect.t, speed)
+                if isinstance(event.data, bytes):
+                    audio_bytes_sent += len(event.data)
+                await ws.send(event.data)
+
+        async def receive_all():
+            nonlocal received
+            while received < expected:
+                message = await ws.recv()
+                now = time.perf_counter()
+                pending = upstream.sent_at.get(message)
+                if pending:
+                    latencies.append((now - pending.popleft()) * 1000)
+                    received += 1
+
+        sender = asyncio.create_task(send_all())
+        try:
+            await asyncio.wait_for(asyncio.gather(sender, receive_all()), timeout)
+        except asyncio.TimeoutError:
+            sender.cancel()
+        wall_s = time.perf_counter() - start
+
+    client_frames = sum(1 for e in client_events if isinstance(e.data, bytes))
+    return {
+        "wall_s": round(wall_s, 3),
+        "recorded_s": round(recording.duration, 3),
+        "upstream_events_relayed": f"{received}/{expected}",
+        "relay_p50_ms": round(percentile(latencies, 0.5), 3),
+        "relay_p95_ms": round(percentile(latencies, 0.95), 3),
+        "relay_max_ms": round(max(latencies, default=0.0), 3),
+        "client_audio_frames": client_frames,
+        "client_audio_bytes": audio_bytes_sent,
+        "upstream_audio_sends": upstream.received_frames,
+        "upstream_audio_bytes": upstream.received_audio_bytes,
+    }
+
+async def replay_socket(recording: Recording, speed: float, timeout: float, output_dir: Path) -> Dict:
+    import websockets
+    import uvicorn
+
+    upstream = FakeUpstream(recording, speed)
+    async with websockets.serve(upstream.handler, "127.0.0.1", 0, max_size=None) as fake:
+        port = fake.sockets[0].getsockname()[1]
+        # websocket_handler reads the upstream URL at import time
+        os.environ["OPENAI_REALTIME_WSS_URL"] = f"ws://127.0.0.1:{port}"
+        os.environ.pop("REALTIME_RECORD_DIR", None)
+        import conversation_logger as cl
+        cl.DISCUSSIONS_DIR = cl.FORM_COMPLETION_DISCUSSIONS_DIR = output_dir
+        import websocket_handler
+        websocket_handler.OPENAI_WSS_URL = os.environ["OPENAI_REALTIME_WSS_URL"]
+        import server
+        server.conversation_logger.analyze_on_save = False
+        server.live_answers.enabled = False
+
+        proxy = uvicorn.Server(uvicorn.Config(server.app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+        proxy_task = asyncio.create_task(proxy.serve())
+        while not proxy.started:
+            await asyncio.sleep(0.01)
+        proxy_port = proxy.servers[0].sockets[0].getsockname()[1]
+        try:
+            report = await run_client(f"ws://127.0.0.1:{proxy_port}/ws", recording, upstream, speed, timeout)
+            # Let the proxy finish the disconnect (transcript save) before stopping it
+            for _ in range(200):
+                if not server.conversation_logger.active_discussions:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            proxy.should_exit = True
+            await proxy_task
+
+    frames, sends = report["client_audio_frames"], report["upstream_audio_sends"]
+    report["audio_send_reduction"] = round(frames / sends, 2) if sends else 0.0
+    report["transcripts_saved"] = len(list(output_dir.glob("conversation_*.txt")))
+    return report
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay recorded Realtime sessions through the proxy")
+    parser.add_argument("recordings", nargs="*", type=Path, help="Recordings (.jsonl or .jsonl.gz)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Playback speed; 0 = as fast as possible")
+    parser.add_argument("--driver", choices=("socket", "direct"), default="socket")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Per recording, seconds")
+    parser.add_argument("--output-dir", type=Path, help="Keep saved transcripts here (default: temp dir)")
+    parser.add_argument("--verbose", action="store_true", help="Show the proxy's own logging")
+    parser.add_argument("--synthesize", type=Path, help="Write a synthetic recording to this path and exit")
+    parser.add_argument("--seconds", type=float, default=60.0, help="Length of the synthetic recording")
+    args = parser.parse_args(argv)
+
+    if args.synthesize:
+        count = synthesize_recording(args.synthesize, args.seconds)
+        print(f"✅ Wrote {count} events ({args.seconds:.0f}s) to {args.synthesize}")
+        return
+    if not args.recordings:
+        parser.error("give at least one recording, or --synthesize PATH")
+
+    output_dir = args.output_dir or Path(tempfile.mkdtemp(prefix="realtime_replay_"))
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for path in args.recordings:
+        recording = load_recording(path)
+        print(f"🎬 {path.name}: {len(recording.events)} events, {recording.duration:.1f}s, "
+              f"mode={recording.header.get('mode')}, driver={args.driver}, speed={args.speed or 'max'}")
+        # The proxy logs every event; keep that cost but not the noise
+        with open(os.devnull, "w") as devnull, contextlib.ExitStack() as stack:
+            if not args.verbose:
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+            if args.driver == "direct":
+                report = asyncio.run(replay_direct(recording, output_dir))
+            else:
+                report = asyncio.run(replay_socket(recording, args.speed, args.timeout, output_dir))
+        for key, value in report.items():
+            print(f"   {key}: {value}")
+    print(f"📁 Transcripts: {output_dir}")
+
+if __name__ == "__main__":
+    main()
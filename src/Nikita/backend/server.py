@@ -8,16 +8,24 @@ A lightweight proxy server between clients and OpenAI's Realtime API.
 import os
 import json
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
 import uvicorn
 from dotenv import load_dotenv
 
 # Local imports
-from api_routes import health_check, create_session, get_session_config, generate_form_from_latest_session, generate_form_answers_from_session
+from api_routes import health_check, create_session, get_session_config, generate_form_from_latest_session, generate_form_answers_from_session, generate_form_answers_batch, MAX_BATCH_SESSIONS, stream_form_from_latest_session
 from websocket_handler import WebSocketHandler
 from conversation_logger import ConversationLogger
+from audio_coalescer import AudioCoalescer, coalescer_totals
+import metrics
+from event_recorder import open_recorder, CLIENT_TO_UPSTREAM
+from admission import session_admission, llm_admission, client_ip
+from live_answers import live_answers
 
 # ============================================================================
 # SETUP
@@ -25,7 +33,15 @@ from conversation_logger import ConversationLogger
 
 load_dotenv()
 
-app = FastAPI(title="OpenAI Realtime Proxy Server", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag())
+    try:
+        yield
+    finally:
+        lag_monitor.cancel()
+
+app = FastAPI(title="OpenAI Realtime Proxy Server", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -41,6 +57,16 @@ PORT = int(os.getenv("PORT", 3001))
 conversation_logger = ConversationLogger()
 websocket_handler = WebSocketHandler(conversation_logger)
 
+# Scrape-time metrics read from existing state
+metrics.registry.gauge(
+    "conversation_active_discussions", "Sessions held in ConversationLogger.active_discussions",
+    callback=lambda: len(conversation_logger.active_discussions)
+)
+metrics.registry.register(metrics.CallbackCounter(
+    "realtime_upstream_audio_sends_total", "Coalesced audio sends to the Realtime API",
+    callback=lambda: coalescer_totals.sends_out
+))
+
 # ============================================================================
 # API ROUTES
 # ============================================================================
@@ -49,6 +75,11 @@ websocket_handler = WebSocketHandler(conversation_logger)
 async def health():
     return await health_check()
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/session")
 async def session():
     return await create_session()
@@ -58,12 +89,31 @@ async def session_config():
     return await get_session_config()
 
 @app.get("/api/generate-form")
-async def generate_form():
+async def generate_form(request: Request):
     """Generate form JSON from the latest conversation analysis"""
-    return await generate_form_from_latest_session()
+    async with llm_admission.admit(client_ip(request)):
+        return await generate_form_from_latest_session()
+
+@app.get("/api/generate-form/stream")
+async def generate_form_stream(request: Request):
+    """Stream the generated form as SSE, one question at a time"""
+    ticket = await llm_admission.acquire(client_ip(request))
+    try:
+        events = await stream_form_from_latest_session()
+    except BaseException:
+        ticket.release()
+        raise
+    # The slot is held until the stream ends; the background task covers
+    # clients that disconnect before the first chunk
+    return StreamingResponse(
+        llm_admission.hold(ticket, events),
+        background=BackgroundTask(ticket.release),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/api/generate-form-answers")
-async def generate_form_answers(request_data: dict):
+async def generate_form_answers(request_data: dict, request: Request):
     """Generate form answers from a conversation session"""
     print(f"Received request data: {request_data}")
     
@@ -78,7 +128,32 @@ async def generate_form_answers(request_data: dict):
     if not questions:
         raise HTTPException(status_code=400, detail="questions are required")
     
-    return await generate_form_answers_from_session(session_id, questions)
+    async with llm_admission.admit(client_ip(request)):
+        return await generate_form_answers_from_session(session_id, questions)
+
+@app.post("/api/generate-form-answers/batch")
+async def generate_form_answers_batch_route(request_data: dict, request: Request):
+    """Generate form answers for many sessions sharing one question set (NDJSON stream)"""
+    session_ids = request_data.get('session_ids', [])
+    questions = request_data.get('questions', [])
+    
+    if not session_ids or not isinstance(session_ids, list):
+        raise HTTPException(status_code=400, detail="session_ids must be a non-empty list")
+    if not all(isinstance(s, str) and s for s in session_ids):
+        raise HTTPException(status_code=400, detail="session_ids must be non-empty strings")
+    if len(session_ids) > MAX_BATCH_SESSIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SESSIONS} session_ids per batch")
+    if not questions:
+        raise HTTPException(status_code=400, detail="questions are required")
+    
+    # One admission per batch; calls inside it are paced by openai_rate_limiter
+    ticket = await llm_admission.acquire(client_ip(request))
+    print(f"Batch form answers: {len(session_ids)} sessions, {len(questions)} questions")
+    return StreamingResponse(
+        llm_admission.hold(ticket, generate_form_answers_batch(session_ids, questions)),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(ticket.release)
+    )
 
 # ============================================================================
 # WEBSOCKET ENDPOINT
@@ -92,8 +167,18 @@ async def websocket_endpoint(websocket: WebSocket):
     print("="*80)
     
     await websocket.accept()
+    ip = client_ip(websocket)
+    rejection = session_admission.try_acquire(ip)
+    if rejection:
+        print(f"   🚫 SESSION REJECTED ({rejection}): {ip}")
+        await websocket.send_json({'type': 'error', 'error': 'Server busy, try again later', 'reason': rejection})
+        await websocket.close(code=1013)  # Try Again Later
+        return
+    metrics.active_sessions.inc()
     
     openai_ws = None
+    audio = None  # AudioCoalescer for the current upstream connection
+    recorder = None  # EventRecorder when REALTIME_RECORD_DIR is set
     is_connected = False
     session_mode = 'form_creation'  # Default mode
     session_id = conversation_logger.start_session(mode=session_mode)
@@ -115,12 +200,20 @@ async def websocket_endpoint(websocket: WebSocket):
             if message.get("type") == "websocket.receive":
                 if "bytes" in message:
                     # Handle binary messages (audio data)
-                    if openai_ws and is_connected:
-                        await openai_ws.send(message["bytes"])
+                    metrics.relay_frames.inc(direction="client_to_upstream", kind="binary")
+                    metrics.relay_bytes.inc(len(message["bytes"]), direction="client_to_upstream")
+                    if recorder:
+                        recorder.record(CLIENT_TO_UPSTREAM, message["bytes"])
+                    if audio and is_connected:
+                        await audio.push(message["bytes"])
                 elif "text" in message:
                     # Handle JSON messages
+                    metrics.relay_frames.inc(direction="client_to_upstream", kind="text")
+                    metrics.relay_bytes.inc(len(message["text"]), direction="client_to_upstream")
                     try:
                         data = json.loads(message["text"])
+                        if recorder:
+                            recorder.record(CLIENT_TO_UPSTREAM, message["text"])
                         
                         # Log client message
                         conversation_logger.log_client_message(session_id, data)
@@ -144,24 +237,35 @@ async def websocket_endpoint(websocket: WebSocket):
                                 session_id = conversation_logger.start_session(mode=session_mode)
                                 print(f"   📝 NEW SESSION CREATED: {old_session_id} → {session_id}")
                             
+                            if audio:
+                                await audio.close()
+                            if recorder:
+                                recorder.close()
+                            recorder = open_recorder(session_id, mode, questions)
+                            if recorder:
+                                recorder.record(CLIENT_TO_UPSTREAM, message["text"])
                             print(f"   🚀 ESTABLISHING OPENAI CONNECTION...")
                             openai_ws = await websocket_handler.establish_openai_connection(
                                 data['ephemeralToken'], session_id, websocket, mode, questions
                             )
+                            audio = AudioCoalescer(openai_ws.send)
                             is_connected = True
+                            if mode == 'form_completion':
+                                live_answers.start(session_id, questions, websocket.send_json)
                             print(f"   ✅ OPENAI CONNECTION ESTABLISHED")
                             
                             # Start listening to OpenAI messages
                             print(f"   👂 STARTING OPENAI MESSAGE LISTENER")
                             asyncio.create_task(
-                                websocket_handler.listen_to_openai(openai_ws, session_id, websocket)
+                                websocket_handler.listen_to_openai(openai_ws, session_id, websocket, recorder)
                             )
                         elif openai_ws and is_connected:
                             # Block session.update from frontend
                             if data.get('type') == 'session.update':
                                 continue
                             
-                            # Forward other messages to OpenAI
+                            # Forward other messages to OpenAI, after any buffered audio
+                            await audio.flush()
                             await openai_ws.send(message["text"])
                             
                     except json.JSONDecodeError as error:
@@ -180,9 +284,19 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as error:
         pass
     finally:
+        session_admission.release(ip)
+        metrics.active_sessions.dec()
+        live_answers.end(session_id)
         print(f"\n🔌 WEBSOCKET DISCONNECTION:")
         print(f"   Session ID: {session_id}")
         print(f"   Connected: {is_connected}")
+        if audio:
+            # Upstream is closing too, so buffered audio is dropped
+            await audio.close(send_pending=False)
+            print(f"   🎙️ Audio frames: {audio.stats()}")
+        if recorder:
+            recorder.close()
+            print(f"   🎬 RECORDED {recorder.events} EVENTS: {recorder.path}")
         print(f"   Timestamp: {datetime.now().isoformat()}")
         await websocket_handler.handle_client_disconnect(session_id, openai_ws)
         print(f"   ✅ CLEANUP COMPLETED")
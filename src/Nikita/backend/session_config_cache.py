@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Cache of precompiled session.update payloads for the OpenAI Realtime API
+"""
+
+import os
+import copy
+import json
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from prompts import DEFAULT_SESSION_CONFIG, FORM_COMPLETION_INSTRUCTIONS
+
+SESSION_CONFIG_CACHE_SIZE = int(os.getenv("SESSION_CONFIG_CACHE_SIZE", 256))
+
+def format_questions_for_instructions(questions: List[Dict]) -> str:
+    """Format form questions the way FORM_COMPLETION_INSTRUCTIONS expects them"""
+    return "\n".join([
+        f"- {q.get('question', '')} (Type: {q.get('type_answer', q.get('type', 'text'))})"
+        for q in questions
+    ])
+
+class CompiledSessionConfig:
+    def __init__(self, config: Dict, payload: str):
+        self.config = config  # session config dict, shared: hand out copy.deepcopy(config)
+        self.payload = payload  # serialized session.update message, ready to send
+
+class SessionConfigCache:
+    """LRU cache of session configs keyed by (mode, hash of questions)"""
+
+    def __init__(self, max_entries: int = SESSION_CONFIG_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[Tuple[str, Optional[str]], CompiledSessionConfig]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _resolve(self, mode: str, questions: Optional[List[Dict]]) -> Tuple[str, Optional[str]]:
+        """Return the cache key: a hash of the fields the instructions use, not the formatted text"""
+        if mode == "form_completion" and questions:
+            fields = [[q.get('question', ''), q.get('type_answer', q.get('type', 'text'))] for q in questions]
+            digest = hashlib.sha256(json.dumps(fields, default=str).encode("utf8")).hexdigest()
+            return ("form_completion", digest)
+        # Every other mode uses the default instructions
+        return ("form_creation", None)
+
+    def get(self, mode: str = "form_creation", questions: Optional[List[Dict]] = None) -> CompiledSessionConfig:
+        """Get (or build) the compiled session config for a mode and question set"""
+        key = self._resolve(mode, questions)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        session_config = copy.deepcopy(DEFAULT_SESSION_CONFIG)
+        if key[1] is not None:
+            session_config['instructions'] = FORM_COMPLETION_INSTRUCTIONS.format(
+                questions=format_questions_for_instructions(questions)
+            )
+
+        payload = json.dumps({
+            'type': 'session.update',
+            'session': session_config
+        })
+        entry = CompiledSessionConfig(session_config, payload)
+        self._entries[key] = entry
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def get_payload(self, mode: str = "form_creation", questions: Optional[List[Dict]] = None) -> str:
+        """Serialized session.update message for a mode and question set"""
+        return self.get(mode, questions).payload
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+# Shared instance used by the WebSocket handler and the session config route
+session_config_cache = SessionConfigCache()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Map-reduce analysis for transcripts that do not fit one prompt
+
+A transcript is split on turn boundaries ("User: ..." / "Assistant: ...")
+into windows of at most ANALYSIS_CHUNK_TOKENS. Windows are analyzed
+concurrently (map), and the partial analyses are merged (reduce), in rounds
+of groups that fit ANALYSIS_REDUCE_TOKENS, until one analysis is left. Wall
+time grows with the number of reduce rounds, not with transcript length.
+"""
+
+import os
+import re
+import asyncio
+from typing import Awaitable, Callable, List
+
+ANALYSIS_CHUNK_TOKENS = int(os.getenv("ANALYSIS_CHUNK_TOKENS", 6000))  # transcript tokens per map window
+ANALYSIS_REDUCE_TOKENS = int(os.getenv("ANALYSIS_REDUCE_TOKENS", 6000))  # partial analyses per reduce call
+ANALYSIS_OVERLAP_TURNS = int(os.getenv("ANALYSIS_OVERLAP_TURNS", 1))  # turns repeated at the start of the next window
+ANALYSIS_MAP_CONCURRENCY = int(os.getenv("ANALYSIS_MAP_CONCURRENCY", 8))  # concurrent calls per analysis
+CHARS_PER_TOKEN = 4  # rough average for English text with gpt-4o tokenizers
+
+TURN_BOUNDARY = re.compile(r"\n\s*\n(?=(?:User|Assistant): )")
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def needs_chunking(transcript: str, budget: int = ANALYSIS_CHUNK_TOKENS) -> bool:
+    return budget > 0 and estimate_tokens(transcript) > budget
+
+def split_turns(transcript: str) -> List[str]:
+    """Speaker turns of a formatted transcript, in order"""
+    return [turn.strip() for turn in TURN_BOUNDARY.split(transcript.strip()) if turn.strip()]
+
+def _split_long_turn(turn: str, budget: int) -> List[str]:
+    """Cut a single oversized turn on sentence (or, failing that, word) boundaries"""
+    max_chars = budget * CHARS_PER_TOKEN
+    pieces, current = [], ""
+    for sentence in re.split(r"(?<=[.!?])\s+", turn):
+        while len(sentence) > max_chars:
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_transcript(transcript: str, budget: int = ANALYSIS_CHUNK_TOKENS, overlap_turns: int = ANALYSIS_OVERLAP_TURNS) -> List[str]:
+    """Windows of whole turns, each within `budget` estimated tokens.
+
+    The last `overlap_turns` turns of a window are repeated at the start of
+    the next one so an answer split from its question keeps its context.
+    """
+    turns = []
+    for turn in split_turns(transcript):
+        turns.extend(_split_long_turn(turn, budget) if estimate_tokens(turn) > budget else [turn])
+
+    windows: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for turn in turns:
+        cost = estimate_tokens(turn)
+        if current and size + cost > budget:
+            windows.append(current)
+            carried = current[-overlap_turns:] if overlap_turns > 0 else []
+            # Overlap only when it still leaves room for the new turn
+            while carried and sum(estimate_tokens(t) for t in carried) + cost > budget:
+                carried = carried[1:]
+            current = list(carried)
+            size = sum(estimate_tokens(t) for t in current)
+        current.append(turn)
+        size += cost
+    if current:
+        windows.append(current)
+    return ["\n\n".join(window) for window in windows]
+
+def group_for_reduce(partials: List[str], budget: int = ANALYSIS_REDUCE_TOKENS) -> List[List[str]]:
+    """Consecutive groups of partial analyses, each within `budget` (at least two per group)"""
+    groups: List[List[str]] = []
+    current: List[str] = []
+    size = 0
+    for partial in partials:
+        cost = estimate_tokens(partial)
+        if len(current) >= 2 and size + cost > budget:
+            groups.append(current)
+            current, size = [], 0
+        current.append(partial)
+        size += cost
+    if current:
+        groups.append(current)
+    return groups
+
+def format_partials(partials: List[str], first_part: int = 1) -> str:
+    return "\n\n".join(f"--- Part {first_part + i} ---\n{p.strip()}" for i, p in enumerate(partials))
+
+async def map_reduce_analysis(
+    transcript: str,
+    map_call: Callable[[str, int, int], Awaitable[str]],
+    reduce_call: Callable[[List[str]], Awaitable[str]],
+    chunk_tokens: int = ANALYSIS_CHUNK_TOKENS,
+    reduce_tokens: int = ANALYSIS_REDUCE_TOKENS,
+) -> str:
+    """Analyze a long transcript window by window, then merge the results.
+
+    map_call(window, part, total) analyzes one window; reduce_call(partials)
+    merges consecutive partial analyses into the final output format (its
+    output may be reduced again for very long transcripts). At most ANALYSIS_MAP_CONCURRENCY calls
+    run at once. This does not take openai_rate_limiter: batch processing
+    already holds a slot of it per session, and nesting would deadlock. An
+    OpenAIAPIError from any call propagates.
+    """
+    windows = chunk_transcript(transcript, chunk_tokens)
+    print(f"   ✂️ MAP-REDUCE ANALYSIS: {len(windows)} windows of ≤{chunk_tokens} tokens")
+
+    semaphore = asyncio.Semaphore(max(1, ANALYSIS_MAP_CONCURRENCY))
+
+    async def limited(call: Awaitable[str]) -> str:
+        async with semaphore:
+            return await call
+
+    partials = await asyncio.gather(*[
+        limited(map_call(window, part, len(windows))) for part, window in enumerate(windows, start=1)
+    ])
+    rounds = 0
+    while True:
+        groups = group_for_reduce(list(partials), reduce_tokens)
+        rounds += 1
+        if len(groups) == 1:
+            print(f"   🧩 REDUCING {len(partials)} PARTIAL ANALYSES (round {rounds}, final)")
+            return await limited(reduce_call(groups[0]))
+        print(f"   🧩 REDUCING {len(partials)} PARTIAL ANALYSES IN {len(groups)} GROUPS (round {rounds})")
+        partials = await asyncio.gather(*[limited(reduce_call(group)) for group in groups])
@@ -3,14 +3,23 @@
 WebSocket handler for OpenAI Realtime API proxy
 """
 
+import os
 import json
+import time
 import asyncio
 import websockets
 from fastapi import WebSocket, WebSocketDisconnect
-from prompts import DEFAULT_SESSION_CONFIG, FORM_COMPLETION_INSTRUCTIONS
+from session_config_cache import session_config_cache
 from conversation_logger import ConversationLogger
+from event_recorder import EventRecorder, UPSTREAM_TO_CLIENT
+from live_answers import live_answers
+import metrics
 
-OPENAI_WSS_URL = 'wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-12-17'
+# Overridable so recorded sessions can be replayed against a local fake upstream
+OPENAI_WSS_URL = os.getenv(
+    "OPENAI_REALTIME_WSS_URL",
+    'wss://api.openai.com/v1/realtime?model=gpt-4o-realtime-preview-2024-12-17'
+)
 
 class WebSocketHandler:
     def __init__(self, conversation_logger: ConversationLogger = None):
@@ -24,6 +33,7 @@ class WebSocketHandler:
         print(f"   Questions: {len(questions) if questions else 0}")
         print(f"   URL: {OPENAI_WSS_URL}")
         
+        connect_started = time.perf_counter()
         try:
             openai_ws = await websockets.connect(
                 OPENAI_WSS_URL,
@@ -37,31 +47,22 @@ class WebSocketHandler:
             await client_ws.send_json({'type': 'connected', 'session_id': session_id})
             print(f"   📨 SENT CONNECTION CONFIRMATION TO CLIENT")
             
-            # Configure session with backend settings
-            session_config = DEFAULT_SESSION_CONFIG.copy()
+            # Configure session with backend settings (precompiled per mode/question set)
             print(f"   ⚙️ CONFIGURING SESSION...")
-            
-            # Customize instructions based on mode
             if mode == "form_completion" and questions:
-                questions_text = "\n".join([
-                    f"- {q.get('question', '')} (Type: {q.get('type_answer', q.get('type', 'text'))})"
-                    for q in questions
-                ])
-                session_config['instructions'] = FORM_COMPLETION_INSTRUCTIONS.format(questions=questions_text)
                 print(f"   📝 FORM COMPLETION MODE: {len(questions)} questions configured")
             else:
                 print(f"   📝 FORM CREATION MODE: Using default instructions")
+            session_update_payload = session_config_cache.get_payload(mode, questions)
             
-            session_update_message = {
-                'type': 'session.update',
-                'session': session_config
-            }
             print(f"   📤 SENDING SESSION CONFIG TO OPENAI")
-            await openai_ws.send(json.dumps(session_update_message))
+            await openai_ws.send(session_update_payload)
             print(f"   ✅ SESSION CONFIGURATION SENT")
+            metrics.upstream_connect_seconds.observe(time.perf_counter() - connect_started)
             
             return openai_ws
         except Exception as error:
+            metrics.upstream_connect_errors.inc()
             print(f"   ❌ OPENAI CONNECTION FAILED: {error}")
             await client_ws.send_json({'type': 'error', 'error': str(error)})
             raise
@@ -94,6 +95,7 @@ class WebSocketHandler:
                         print(f"      Assistant delta: {delta}")
                 
                 self.conversation_logger.log_openai_message(session_id, openai_data)
+                live_answers.observe(session_id, openai_data)
             except Exception as error:
                 print(f"   ❌ ERROR LOGGING OPENAI MESSAGE: {error}")
         
@@ -125,10 +127,14 @@ class WebSocketHandler:
             await openai_ws.close()
             print(f"   ✅ OPENAI CONNECTION CLOSED")
 
-    async def listen_to_openai(self, openai_ws, session_id: str, client_ws: WebSocket):
+    async def listen_to_openai(self, openai_ws, session_id: str, client_ws: WebSocket, recorder: EventRecorder = None):
         """Listen to messages from OpenAI WebSocket and forward them to client"""
         try:
             async for message in openai_ws:
+                if recorder:
+                    recorder.record(UPSTREAM_TO_CLIENT, message)
+                metrics.relay_frames.inc(direction="upstream_to_client", kind="text" if isinstance(message, str) else "binary")
+                metrics.relay_bytes.inc(len(message), direction="upstream_to_client")
                 if isinstance(message, str):
                     await self.handle_openai_message(message, session_id, client_ws)
                 elif isinstance(message, bytes):
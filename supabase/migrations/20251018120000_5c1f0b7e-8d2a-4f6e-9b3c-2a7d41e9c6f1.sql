@@ -0,0 +1,281 @@
+-- Push-down aggregation for Bento dashboards: return per-question counts,
+-- histograms, percentiles and top-k values instead of every raw answer row.
+-- Called via PostgREST RPC: POST /rest/v1/rpc/form_dashboard_aggregates
+
+-- Normalize a raw answer to its response text (mirrors retrieve_supabase2._parse_answer_payload)
+CREATE OR REPLACE FUNCTION public.answer_response_text(raw text)
+RETURNS text
+LANGUAGE plpgsql
+IMMUTABLE
+SET search_path = public
+AS $$
+DECLARE
+  s text := btrim(raw);
+  j jsonb;
+BEGIN
+  IF s IS NULL OR s = '' THEN
+    RETURN NULL;
+  END IF;
+  IF left(s, 1) IN ('{', '"') THEN
+    BEGIN
+      j := s::jsonb;
+    EXCEPTION WHEN others THEN
+      RETURN s;
+    END;
+    IF jsonb_typeof(j) = 'object' THEN
+      RETURN btrim(j ->> 'response');
+    ELSIF jsonb_typeof(j) = 'string' THEN
+      RETURN btrim(j #>> '{}');
+    END IF;
+  END IF;
+  RETURN s;
+END;
+$$;
+
+-- Split a multi-choice response into options: JSON array or comma separated
+CREATE OR REPLACE FUNCTION public.answer_multi_items(resp text)
+RETURNS text[]
+LANGUAGE plpgsql
+IMMUTABLE
+SET search_path = public
+AS $$
+BEGIN
+  IF left(resp, 1) = '[' THEN
+    BEGIN
+      RETURN ARRAY(SELECT jsonb_array_elements_text(resp::jsonb));
+    EXCEPTION WHEN others THEN
+      -- not JSON after all: fall through to comma splitting
+    END;
+  END IF;
+  RETURN string_to_array(resp, ',');
+END;
+$$;
+
+-- Cast a numeric-looking response like Python's float() followed by the client's
+-- finiteness filter: overflow (e.g. 1e999) gives NULL, underflow gives 0
+CREATE OR REPLACE FUNCTION public.answer_float(resp text)
+RETURNS double precision
+LANGUAGE plpgsql
+IMMUTABLE
+SET search_path = public
+AS $$
+BEGIN
+  RETURN resp::double precision;
+EXCEPTION WHEN numeric_value_out_of_range THEN
+  BEGIN
+    RETURN CASE WHEN abs(resp::numeric) < 1 THEN 0 END;
+  EXCEPTION WHEN others THEN
+    RETURN CASE WHEN resp ~ '[eE]-' THEN 0 END;
+  END;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.form_dashboard_aggregates(
+  p_form_id uuid,
+  p_bins integer DEFAULT 20,
+  p_top_k integer DEFAULT 50,
+  p_ngrams boolean DEFAULT true
+)
+RETURNS jsonb
+LANGUAGE sql
+STABLE
+SET search_path = public
+AS $$
+WITH q AS (
+  SELECT question_id, question, type_answer,
+         lower(btrim(coalesce(type_answer, ''))) IN ('checkbox', 'multi_choice', 'multichoice', 'multi-select') AS is_multi
+  FROM question
+  WHERE form_id = p_form_id
+),
+r AS (
+  SELECT a.question_id, a.answer_id, answer_response_text(a.answer) AS resp
+  FROM answer a
+  JOIN q USING (question_id)
+),
+parsed AS (
+  SELECT question_id, answer_id, resp,
+         resp ~ '^[-+]?([0-9]+(\.[0-9]*)?|\.[0-9]+)([eE][-+]?[0-9]+)?$' AS is_num
+  FROM r
+  WHERE resp IS NOT NULL AND resp <> ''
+),
+-- num: finite values only (what the charts use); is_num also counts 1e999 for type detection
+v AS (
+  SELECT question_id, answer_id, resp, is_num,
+         CASE WHEN is_num THEN answer_float(resp) END AS num
+  FROM parsed
+),
+totals AS (
+  SELECT question_id, count(*) AS total
+  FROM r
+  GROUP BY question_id
+),
+counts AS (
+  SELECT question_id,
+         count(*) AS nonempty,
+         count(*) FILTER (WHERE is_num) AS numeric_count,
+         count(DISTINCT lower(resp)) AS distinct_count,
+         bool_and(lower(resp) IN ('true', 'false', 'yes', 'no', '1', '0', 'y', 'n')) AS all_boolean
+  FROM v
+  GROUP BY question_id
+),
+-- Numeric summaries: moments, quartiles, Tukey fences, outliers, histogram
+moments AS (
+  SELECT question_id,
+         count(num) AS n,
+         avg(num) AS mean,
+         stddev_pop(num) AS stdev,
+         min(num) AS min,
+         max(num) AS max,
+         percentile_cont(0.25) WITHIN GROUP (ORDER BY num) AS q1,
+         percentile_cont(0.5) WITHIN GROUP (ORDER BY num) AS median,
+         percentile_cont(0.75) WITHIN GROUP (ORDER BY num) AS q3
+  FROM v
+  WHERE num IS NOT NULL
+  GROUP BY question_id
+),
+classified AS (
+  SELECT v.question_id, v.num, m.median,
+         v.num < m.q1 - 1.5 * (m.q3 - m.q1) OR v.num > m.q3 + 1.5 * (m.q3 - m.q1) AS is_outlier,
+         CASE WHEN m.max > m.min
+              THEN least(width_bucket(v.num, m.min, m.max, p_bins), p_bins)
+              ELSE 1 END AS bucket
+  FROM v
+  JOIN moments m USING (question_id)
+  WHERE v.num IS NOT NULL
+),
+fences AS (
+  SELECT question_id,
+         min(num) FILTER (WHERE NOT is_outlier) AS lowerfence,
+         max(num) FILTER (WHERE NOT is_outlier) AS upperfence
+  FROM classified
+  GROUP BY question_id
+),
+outliers AS (
+  SELECT question_id, jsonb_agg(num ORDER BY num) AS outliers
+  FROM (
+    SELECT question_id, num,
+           row_number() OVER (PARTITION BY question_id ORDER BY abs(num - median) DESC) AS rn
+    FROM (SELECT DISTINCT question_id, num, median FROM classified WHERE is_outlier) d
+  ) o
+  WHERE rn <= 100
+  GROUP BY question_id
+),
+hist AS (
+  SELECT question_id, jsonb_agg(jsonb_build_array(bucket, cnt) ORDER BY bucket) AS buckets
+  FROM (
+    SELECT question_id, bucket, count(*) AS cnt
+    FROM classified
+    GROUP BY question_id, bucket
+  ) b
+  GROUP BY question_id
+),
+-- Categorical / multi-choice top-k (exact, case-sensitive like categorical_counts)
+items AS (
+  SELECT v.question_id, btrim(x.item) AS item
+  FROM v
+  JOIN q USING (question_id)
+  CROSS JOIN LATERAL unnest(
+    CASE WHEN q.is_multi THEN answer_multi_items(v.resp) ELSE ARRAY[v.resp] END
+  ) AS x(item)
+),
+ranked_items AS (
+  SELECT question_id, item, count(*) AS cnt,
+         row_number() OVER (PARTITION BY question_id ORDER BY count(*) DESC, item) AS rn
+  FROM items
+  WHERE item <> ''
+  GROUP BY question_id, item
+),
+top_values AS (
+  SELECT question_id,
+         jsonb_agg(jsonb_build_array(item, cnt) ORDER BY rn) FILTER (WHERE rn <= p_top_k) AS top,
+         sum(cnt) AS item_total,
+         count(*) AS item_distinct
+  FROM ranked_items
+  GROUP BY question_id
+),
+-- Unigrams and bigrams for text-like questions (skipped for numeric ones)
+tokens AS (
+  SELECT v.question_id, v.answer_id, t.ord, t.m[1] AS tok
+  FROM v
+  JOIN counts c USING (question_id)
+  -- Same word characters as text_engine (Latin-1 letters, digits, apostrophe), whatever the database locale
+  CROSS JOIN LATERAL regexp_matches(lower(v.resp), '[A-Za-z0-9À-ÖØ-öø-ÿ'']+', 'g') WITH ORDINALITY AS t(m, ord)
+  WHERE p_ngrams
+    AND c.numeric_count < greatest(3, floor(0.6 * c.nonempty))
+),
+grams AS (
+  SELECT question_id, 1 AS n, tok AS gram FROM tokens
+  UNION ALL
+  SELECT question_id, 2 AS n, gram
+  FROM (
+    SELECT question_id,
+           tok || ' ' || lead(tok) OVER (PARTITION BY question_id, answer_id ORDER BY ord) AS gram
+    FROM tokens
+  ) b
+  WHERE gram IS NOT NULL
+),
+ranked_grams AS (
+  SELECT question_id, n, gram, count(*) AS cnt,
+         row_number() OVER (PARTITION BY question_id, n ORDER BY count(*) DESC, gram) AS rn
+  FROM grams
+  GROUP BY question_id, n, gram
+),
+ngram_top AS (
+  SELECT question_id, jsonb_object_agg(n::text, top) AS ngrams
+  FROM (
+    SELECT question_id, n, jsonb_agg(jsonb_build_array(gram, cnt) ORDER BY rn) AS top
+    FROM ranked_grams
+    WHERE rn <= p_top_k
+    GROUP BY question_id, n
+  ) g
+  GROUP BY question_id
+)
+SELECT coalesce(jsonb_agg(jsonb_build_object(
+  'question_id', q.question_id,
+  'question', q.question,
+  'type_answer', q.type_answer,
+  'is_multi', q.is_multi,
+  'total', coalesce(t.total, 0),
+  'nonempty', coalesce(c.nonempty, 0),
+  'numeric_count', coalesce(c.numeric_count, 0),
+  'distinct_count', coalesce(c.distinct_count, 0),
+  'all_boolean', coalesce(c.all_boolean, false),
+  'numeric', CASE WHEN m.n > 0 THEN jsonb_build_object(
+    'count', m.n,
+    'mean', m.mean,
+    'stdev', m.stdev,
+    'min', m.min,
+    'max', m.max,
+    'q1', m.q1,
+    'median', m.median,
+    'q3', m.q3,
+    'lowerfence', f.lowerfence,
+    'upperfence', f.upperfence,
+    'outliers', coalesce(o.outliers, '[]'::jsonb),
+    'bins', p_bins,
+    'histogram', h.buckets
+  ) END,
+  'top_values', coalesce(tv.top, '[]'::jsonb),
+  'item_total', coalesce(tv.item_total, 0),
+  'item_distinct', coalesce(tv.item_distinct, 0),
+  'ngrams', coalesce(ng.ngrams, '{}'::jsonb)
+) ORDER BY q.question_id), '[]'::jsonb)
+FROM q
+LEFT JOIN totals t ON t.question_id = q.question_id
+LEFT JOIN counts c ON c.question_id = q.question_id
+LEFT JOIN moments m ON m.question_id = q.question_id
+LEFT JOIN fences f ON f.question_id = q.question_id
+LEFT JOIN outliers o ON o.question_id = q.question_id
+LEFT JOIN hist h ON h.question_id = q.question_id
+LEFT JOIN top_values tv ON tv.question_id = q.question_id
+LEFT JOIN ngram_top ng ON ng.question_id = q.question_id;
+$$;
+
+-- SECURITY INVOKER (default): the existing RLS policies on form/question/answer still apply
+GRANT EXECUTE ON FUNCTION public.answer_response_text(text) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION public.answer_multi_items(text) TO anon, authenticated, service_role;
+GRANT EXECUTE ON FUNCTION public.form_dashboard_aggregates(uuid, integer, integer, boolean) TO anon, authenticated, service_role;
+
+-- Aggregation scans answers per question
+CREATE INDEX IF NOT EXISTS idx_answer_question_id ON public.answer(question_id);
+CREATE INDEX IF NOT EXISTS idx_question_form_id ON public.question(form_id);